@@ -144,6 +144,40 @@ EMAIL_HOST_PASSWORD = 'noeonquznfzqugae'
 DEFAULT_FROM_EMAIL = 'Construction Supervision <danieldukov2002@gmail.com>'
 SERVER_EMAIL = 'danieldukov2002@gmail.com'
 
+# DOCX rendering: 'dom' builds the python-docx object model, 'stream' rewrites
+# the template XML incrementally (see core.utils.document_generator).
+DOCUMENT_RENDER_MODE = os.environ.get('DOCUMENT_RENDER_MODE', 'dom')
+
+# Parallel jobs for `manage.py run_generation_worker`
+GENERATION_WORKER_CONCURRENCY = int(os.environ.get('GENERATION_WORKER_CONCURRENCY', '2'))
+
+# Rendering processes for batch act generation (defaults to the CPU count); one
+# pool of this size is shared by all batch requests of a web worker process
+GENERATION_PROCESSES = int(os.environ.get('GENERATION_PROCESSES', '0')) or None
+
+# DOCX -> PDF conversion backend: 'auto', 'docx2pdf', 'libreoffice' or 'python'
+# (see core.utils.pdf_export). The LibreOffice pool keeps PDF_CONVERTER_POOL_SIZE
+# unoserver processes warm per process; at most PDF_CONVERTER_QUEUE_SIZE
+# conversions wait for a free one.
+PDF_CONVERTER = os.environ.get('PDF_CONVERTER', 'auto')
+PDF_CONVERTER_COMMAND = os.environ.get('PDF_CONVERTER_COMMAND', 'unoserver')
+PDF_CONVERTER_POOL_SIZE = int(os.environ.get('PDF_CONVERTER_POOL_SIZE', '2'))
+PDF_CONVERTER_QUEUE_SIZE = int(os.environ.get('PDF_CONVERTER_QUEUE_SIZE', '8'))
+PDF_CONVERTER_TIMEOUT = int(os.environ.get('PDF_CONVERTER_TIMEOUT', '120'))
+PDF_CONVERTER_QUEUE_TIMEOUT = int(os.environ.get('PDF_CONVERTER_QUEUE_TIMEOUT', '60'))
+
+# Act types whose PDF is laid out directly with ReportLab (core.utils.act_pdf)
+# instead of converting the DOCX; their DOCX is rendered on first download.
+NATIVE_ACT_PDF_TYPES = [t for t in os.environ.get('NATIVE_ACT_PDF_TYPES', '').split(',') if t]
+
+# Seconds an acts/preview/ rendering is kept in the cache for an identical payload
+ACT_PREVIEW_CACHE_SECONDS = int(os.environ.get('ACT_PREVIEW_CACHE_SECONDS', '300'))
+
+# Age after which analytics/dashboard/ flags the snapshot written by
+# `refresh_dashboard` as stale (it is still served); the Procfile `dashboard`
+# process refreshes it every 60 seconds
+ANALYTICS_DASHBOARD_MAX_AGE_SECONDS = int(os.environ.get('ANALYTICS_DASHBOARD_MAX_AGE_SECONDS', '300'))
+
 # Frontend URL for password reset links
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
 
@@ -7,3 +7,4 @@ class CoreConfig(AppConfig):
     
     def ready(self):
         import core.signals  # noqa
+        import core.checks  # noqa
@@ -0,0 +1,16 @@
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.templates)
+def check_field_mappings(app_configs, **kwargs):
+    """Compile every `*_fields.json` in media/templates so a broken mapping fails `check`/startup."""
+    from .utils.document_generator import TEMPLATE_DIR
+    from .utils.field_mapping import MappingError, find_mapping_files, get_compiled_mapping
+
+    errors = []
+    for path in find_mapping_files(TEMPLATE_DIR):
+        try:
+            get_compiled_mapping(path)
+        except (MappingError, OSError) as e:
+            errors.append(Error(str(e), id='core.E001'))
+    return errors
@@ -0,0 +1,95 @@
+import os
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.utils.benchmark import ACT_TYPES, CASES, CONTEXT_SIZES, run_benchmarks, compare_reports
+
+
+class Command(BaseCommand):
+    help = 'Benchmark act rendering (DOCX, native PDF, PDF overlay, ZIP) with synthetic contexts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed runs per case'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=1,
+            help='Untimed runs per case before timing'
+        )
+        parser.add_argument(
+            '--acts',
+            nargs='+',
+            choices=ACT_TYPES,
+            default=list(ACT_TYPES),
+            help='Act types to render'
+        )
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            choices=list(CONTEXT_SIZES),
+            default=list(CONTEXT_SIZES),
+            help='Synthetic context sizes'
+        )
+        parser.add_argument(
+            '--cases',
+            nargs='+',
+            choices=CASES,
+            default=list(CASES),
+            help='Rendering paths to measure'
+        )
+        parser.add_argument(
+            '--output',
+            help='JSON file for the results (default: benchmarks/generation_<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier results file to compare p50 latency against'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        def progress(result):
+            self.stdout.write(
+                f"{result['case']:<12} {result['act_type']:<6} {result['size']:<7} "
+                f"{result['ops_per_sec']:>9} ops/s  p50 {result['p50_ms']:>9.2f} ms  "
+                f"p95 {result['p95_ms']:>9.2f} ms  alloc {result['peak_alloc_mb']:>7.2f} MiB"
+            )
+
+        report = run_benchmarks(
+            act_types=options['acts'],
+            sizes=options['sizes'],
+            cases=options['cases'],
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            progress=progress,
+        )
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f'generation_{timezone.now():%Y%m%d%H%M%S}.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if previous is not None:
+            for case, act_type, size, before, after, change in compare_reports(previous, report):
+                line = f'{case:<12} {act_type:<6} {size:<7} p50 {before:.2f} -> {after:.2f} ms ({change:+.1f}%)'
+                self.stdout.write(self.style.WARNING(line) if change > 10 else line)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(report["results"])} results to {output}'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from core.models import GeneratedArtifact
+
+
+class Command(BaseCommand):
+    help = 'Recount references on generated artifacts and delete unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would change'
+        )
+
+    def handle(self, *args, **options):
+        fixed = 0
+        deleted = 0
+        artifacts = GeneratedArtifact.objects.annotate(
+            act_refs=Count('acts', distinct=True),
+            document_refs=Count('documents', distinct=True)
+        )
+        for artifact in artifacts:
+            refs = artifact.act_refs + artifact.document_refs
+            if refs == 0:
+                deleted += 1
+                if not options['dry_run']:
+                    artifact.delete_files()
+                    artifact.delete()
+            elif refs != artifact.ref_count:
+                fixed += 1
+                if not options['dry_run']:
+                    GeneratedArtifact.objects.filter(pk=artifact.pk).update(ref_count=refs)
+
+        prefix = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {fixed} reference counts, {deleted} unreferenced artifacts'
+        ))
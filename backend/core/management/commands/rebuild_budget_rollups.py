@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import BudgetRollup
+from core.utils.dashboard import refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-category budget rollups from the expenses, or check them with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget',
+            type=int,
+            action='append',
+            dest='budgets',
+            help='Only this budget id (may be repeated)'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report rollups that differ from the expenses without changing them'
+        )
+
+    def handle(self, *args, **options):
+        budget_ids = options['budgets']
+
+        if not options['verify']:
+            count = BudgetRollup.rebuild(budget_ids)
+            refresh_dashboard()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} budget rollups'))
+            return
+
+        expected = BudgetRollup.expected(budget_ids)
+        stored = BudgetRollup.objects.all()
+        if budget_ids:
+            stored = stored.filter(budget_id__in=budget_ids)
+        actual = {(r.budget_id, r.category, r.currency, r.period): (r.total, r.count) for r in stored}
+
+        mismatches = 0
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key) != actual.get(key):
+                mismatches += 1
+                budget_id, category, currency, period = key
+                self.stdout.write(
+                    f'Budget {budget_id} {category} {currency} from {period}: '
+                    f'rollup {actual.get(key)}, expenses {expected.get(key)}'
+                )
+        if mismatches:
+            raise CommandError(f'{mismatches} budget rollups are out of date; run rebuild_budget_rollups')
+        self.stdout.write(self.style.SUCCESS(f'All {len(expected)} budget rollups match the expenses'))
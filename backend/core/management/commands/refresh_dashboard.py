@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from core.utils.dashboard import refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute the analytics dashboard snapshot (once, e.g. from cron, or every --interval seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep running and refresh the snapshot every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive')
+
+        while True:
+            snapshot = refresh_dashboard()
+            self.stdout.write(self.style.SUCCESS(
+                f'Dashboard snapshot refreshed at {snapshot.generated_at:%Y-%m-%d %H:%M:%S} '
+                f'in {snapshot.duration_ms:.1f} ms'
+            ))
+            if interval is None:
+                return
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping...')
+                return
+            close_old_connections()
@@ -0,0 +1,107 @@
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from core.models import GenerationJob
+from core.utils.generation import process_job
+from core.utils.pdf_export import get_converter
+
+
+class Command(BaseCommand):
+    help = 'Process queued act/document generation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'GENERATION_WORKER_CONCURRENCY', 2),
+            help='Number of jobs rendered in parallel'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait before checking an empty queue again'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit as soon as the queue is empty'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=30,
+            help='Requeue jobs left running for this many minutes by a dead worker'
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        self.processed = 0
+        self.counter_lock = threading.Lock()
+        stop = threading.Event()
+
+        stale = GenerationJob.objects.filter(
+            status='running',
+            started_at__lt=timezone.now() - timedelta(minutes=options['stale_after'])
+        ).update(status='queued', started_at=None)
+        if stale:
+            self.stdout.write(f'Requeued {stale} stale jobs')
+
+        converter = get_converter()
+        converter.warm()
+        self.stdout.write(f'Generation worker started (concurrency {concurrency}, {converter.name} PDF converter)')
+        if concurrency == 1:
+            try:
+                self._work(stop, options['once'], options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping...')
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [
+                    pool.submit(self._work_in_thread, stop, options['once'], options['poll_interval'])
+                    for _ in range(concurrency)
+                ]
+                try:
+                    while not all(f.done() for f in futures):
+                        time.sleep(0.5)
+                except KeyboardInterrupt:
+                    stop.set()
+                    self.stdout.write('Stopping after current jobs...')
+            for f in futures:
+                f.result()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} jobs'))
+
+    def _work_in_thread(self, stop, once, poll_interval):
+        try:
+            self._work(stop, once, poll_interval)
+        finally:
+            connection.close()
+
+    def _work(self, stop, once, poll_interval):
+        while not stop.is_set():
+            job = self._next_job()
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll_interval)
+                continue
+            process_job(job)
+            with self.counter_lock:
+                self.processed += 1
+            self.stdout.write(f'Job #{job.pk} ({job.kind}) {job.status}')
+
+    def _next_job(self):
+        """Claim the oldest queued job, skipping ones taken by other workers."""
+        candidates = GenerationJob.objects.filter(status='queued').select_related(
+            'act__project', 'document', 'created_by'
+        ).order_by('created_at')[:10]
+        for job in candidates:
+            if job.claim():
+                return job
+        return None
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='Content Hash')),
+                ('template_name', models.CharField(max_length=255, verbose_name='Template Name')),
+                ('docx_file', models.FileField(blank=True, max_length=255, null=True, upload_to='')),
+                ('pdf_file', models.FileField(blank=True, max_length=255, null=True, upload_to='')),
+                ('zip_file', models.FileField(blank=True, max_length=255, null=True, upload_to='')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Reference Count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Last Used At')),
+            ],
+            options={
+                'verbose_name': 'Generated Artifact',
+                'verbose_name_plural': 'Generated Artifacts',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='act',
+            name='artifact',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='acts', to='core.generatedartifact'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='artifact',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documents', to='core.generatedartifact'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_generatedartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttemplate',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, help_text='{{keys}}, numeric markers and their locations in the template file', verbose_name='Placeholders'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_documenttemplate_placeholders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('act', 'Act'), ('document', 'Document')], max_length=20, verbose_name='Kind')),
+                ('template_name', models.CharField(db_index=True, max_length=255, verbose_name='Template Name')),
+                ('renderer', models.CharField(blank=True, max_length=20, verbose_name='Renderer')),
+                ('reused', models.BooleanField(default=False, help_text='The files were taken from a stored artifact instead of rendered', verbose_name='Reused Artifact')),
+                ('total_ms', models.FloatField(verbose_name='Total (ms)')),
+                ('stages', models.JSONField(blank=True, default=dict, verbose_name='Stages (ms)')),
+                ('sizes', models.JSONField(blank=True, default=dict, verbose_name='Output Sizes (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Created At')),
+                ('act', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_metrics', to='core.act')),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_metrics', to='core.document')),
+            ],
+            options={
+                'verbose_name': 'Generation Metric',
+                'verbose_name_plural': 'Generation Metrics',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
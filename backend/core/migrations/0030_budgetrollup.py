@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:01
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    BudgetExpense = apps.get_model('core', 'BudgetExpense')
+    BudgetRollup = apps.get_model('core', 'BudgetRollup')
+    rows = BudgetExpense.objects.order_by().values('budget_id', 'category', 'expense_currency').annotate(
+        total=Sum('amount'), count=Count('id')
+    )
+    BudgetRollup.objects.bulk_create([
+        BudgetRollup(budget_id=row['budget_id'], category=row['category'], currency=row['expense_currency'],
+                     total=row['total'], count=row['count'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_generationmetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50, verbose_name='Category')),
+                ('currency', models.CharField(max_length=3, verbose_name='Currency')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14, verbose_name='Total')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.projectbudget')),
+            ],
+            options={
+                'verbose_name': 'Budget Rollup',
+                'verbose_name_plural': 'Budget Rollups',
+                'constraints': [models.UniqueConstraint(fields=('budget', 'category', 'currency'), name='unique_budget_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
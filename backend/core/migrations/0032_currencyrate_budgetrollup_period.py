@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:09
+
+import datetime
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+# core.models.currency.FIRST_RATE_PERIOD
+FIRST_RATE_PERIOD = datetime.date(1900, 1, 1)
+
+
+def seed_rates(apps, schema_editor):
+    # the rate previously hard-coded for budget conversions
+    CurrencyRate = apps.get_model('core', 'CurrencyRate')
+    CurrencyRate.objects.create(currency='EUR', rate=Decimal('1.96'), date=datetime.date(1999, 1, 1))
+
+
+def group_rollups_by_period(apps, schema_editor):
+    CurrencyRate = apps.get_model('core', 'CurrencyRate')
+    BudgetExpense = apps.get_model('core', 'BudgetExpense')
+    BudgetRollup = apps.get_model('core', 'BudgetRollup')
+    changes = CurrencyRate.objects.filter(date__lte=OuterRef('date')).order_by('-date').values('date')
+    rows = BudgetExpense.objects.order_by().annotate(
+        period=Coalesce(Subquery(changes[:1]), Value(FIRST_RATE_PERIOD), output_field=models.DateField())
+    ).values('budget_id', 'category', 'expense_currency', 'period').annotate(total=Sum('amount'), count=Count('id'))
+    BudgetRollup.objects.all().delete()
+    BudgetRollup.objects.bulk_create([
+        BudgetRollup(budget_id=row['budget_id'], category=row['category'], currency=row['expense_currency'],
+                     period=row['period'], total=row['total'], count=row['count'])
+        for row in rows
+    ])
+
+
+def merge_rollup_periods(apps, schema_editor):
+    # back to one row per (budget, category, currency) before the old constraint returns
+    BudgetRollup = apps.get_model('core', 'BudgetRollup')
+    rows = list(BudgetRollup.objects.order_by().values('budget_id', 'category', 'currency').annotate(
+        sum_total=Sum('total'), sum_count=Sum('count')
+    ))
+    BudgetRollup.objects.all().delete()
+    BudgetRollup.objects.bulk_create([
+        BudgetRollup(budget_id=row['budget_id'], category=row['category'], currency=row['currency'],
+                     period=FIRST_RATE_PERIOD, total=row['sum_total'], count=row['sum_count'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_dashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Currency')),
+                ('rate', models.DecimalField(decimal_places=6, help_text='Value of one unit in BGN', max_digits=14, verbose_name='Rate')),
+                ('date', models.DateField(verbose_name='Valid From')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Currency Rate',
+                'verbose_name_plural': 'Currency Rates',
+                'ordering': ['currency', '-date'],
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='unique_currency_rate')],
+            },
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='budgetrollup',
+            name='unique_budget_rollup',
+        ),
+        migrations.AddField(
+            model_name='budgetrollup',
+            name='period',
+            field=models.DateField(default=FIRST_RATE_PERIOD, verbose_name='Rate Period'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(group_rollups_by_period, merge_rollup_periods),
+        migrations.AddConstraint(
+            model_name='budgetrollup',
+            constraint=models.UniqueConstraint(fields=('budget', 'category', 'currency', 'period'), name='unique_budget_rollup'),
+        ),
+    ]
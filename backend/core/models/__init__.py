@@ -5,11 +5,16 @@ from .act import Act
 from .user_profile import UserProfile
 from .push import PushSubscription
 from .activity_log import ActivityLog
-from .budget import ProjectBudget, BudgetExpense
+from .budget import ProjectBudget, BudgetExpense, BudgetRollup
 from .template import DocumentTemplate, TextSnippet
 from .weather import WeatherLog
 from .reminder import Reminder
 from .password_reset import PasswordResetToken
+from .generation_job import GenerationJob
+from .artifact import GeneratedArtifact
+from .generation_metric import GenerationMetric
+from .dashboard import DashboardSnapshot
+from .currency import CurrencyRate
 import pymysql
 pymysql.install_as_MySQLdb()
 
@@ -17,8 +22,14 @@ __all__ = [
     'Act',
     'ActivityLog',
     'BudgetExpense',
+    'BudgetRollup',
+    'CurrencyRate',
+    'DashboardSnapshot',
     'Document',
     'DocumentTemplate',
+    'GeneratedArtifact',
+    'GenerationJob',
+    'GenerationMetric',
     'PasswordResetToken',
     'Project',
     'ProjectBudget',
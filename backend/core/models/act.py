@@ -53,6 +53,13 @@ class Act(models.Model):
     docx_file = models.FileField(upload_to='acts/%Y/%m/%d/', blank=True, null=True)
     pdf_file = models.FileField(upload_to='acts/%Y/%m/%d/', blank=True, null=True)
     zip_file = models.FileField(upload_to='acts/%Y/%m/%d/', blank=True, null=True)
+    artifact = models.ForeignKey(
+        'GeneratedArtifact',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='acts'
+    )
     
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
@@ -0,0 +1,101 @@
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
+
+
+ARTIFACT_FIELDS = ('docx_file', 'pdf_file', 'zip_file')
+
+
+def _owner_fields(owner):
+    """Map artifact file fields to the file fields of an Act or Document."""
+    if hasattr(owner, 'file_docx'):
+        return {'docx_file': 'file_docx', 'pdf_file': 'file_pdf', 'zip_file': 'zip_file'}
+    return {name: name for name in ARTIFACT_FIELDS}
+
+
+class GeneratedArtifact(models.Model):
+    """
+    Rendered DOCX/PDF/ZIP files shared by every Act or Document generated from
+    the same template and context. `content_hash` is computed by
+    `core.utils.artifacts.compute_artifact_key`; `ref_count` is the number of
+    rows pointing at the files, which are deleted when it drops to zero.
+    """
+    content_hash = models.CharField(_('Content Hash'), max_length=64, unique=True)
+    template_name = models.CharField(_('Template Name'), max_length=255)
+    docx_file = models.FileField(max_length=255, blank=True, null=True)
+    pdf_file = models.FileField(max_length=255, blank=True, null=True)
+    zip_file = models.FileField(max_length=255, blank=True, null=True)
+    ref_count = models.PositiveIntegerField(_('Reference Count'), default=0)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    last_used_at = models.DateTimeField(_('Last Used At'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Generated Artifact')
+        verbose_name_plural = _('Generated Artifacts')
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f"{self.template_name} {self.content_hash[:12]} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, content_hash):
+        """Take a reference on the artifact for `content_hash`, or return None on a miss."""
+        # Locked like release(), so the row cannot be deleted between the check and the increment
+        with transaction.atomic():
+            artifact = cls.objects.select_for_update().filter(content_hash=content_hash).first()
+            if artifact is None:
+                return None
+            cls.objects.filter(pk=artifact.pk).update(ref_count=F('ref_count') + 1, last_used_at=timezone.now())
+            artifact.refresh_from_db(fields=['ref_count', 'last_used_at'])
+            return artifact
+
+    @classmethod
+    def register(cls, content_hash, template_name, owner):
+        """
+        Record the files just rendered for `owner` as the artifact for
+        `content_hash`, holding one reference for it. Returns None if another
+        request registered the same hash first; `owner` then keeps its own files.
+        """
+        fields = _owner_fields(owner)
+        files = {name: getattr(owner, owner_name).name or None for name, owner_name in fields.items()}
+        try:
+            with transaction.atomic():
+                artifact = cls.objects.create(
+                    content_hash=content_hash,
+                    template_name=template_name,
+                    ref_count=1,
+                    **files
+                )
+        except IntegrityError:
+            return None
+        owner.artifact = artifact
+        owner.save(update_fields=['artifact'])
+        return artifact
+
+    def attach_to(self, owner):
+        """Point `owner`'s file fields at this artifact's files (reference already taken)."""
+        for name, owner_name in _owner_fields(owner).items():
+            getattr(owner, owner_name).name = getattr(self, name).name or None
+        owner.artifact = self
+        owner.save()
+        return owner
+
+    @classmethod
+    def release(cls, pk):
+        """Drop one reference; delete the files and the row when none are left."""
+        with transaction.atomic():
+            artifact = cls.objects.select_for_update().filter(pk=pk).first()
+            if artifact is None:
+                return
+            if artifact.ref_count > 1:
+                cls.objects.filter(pk=pk).update(ref_count=F('ref_count') - 1)
+                return
+            artifact.delete_files()
+            artifact.delete()
+
+    def delete_files(self):
+        for name in ARTIFACT_FIELDS:
+            field = getattr(self, name)
+            if field:
+                field.storage.delete(field.name)
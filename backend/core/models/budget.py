@@ -1,8 +1,39 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from decimal import Decimal
+from .currency import (
+    AMOUNT_FIELD, FIRST_RATE_PERIOD, CurrencyRate, converted_amount, rate_period_expression, rate_periods_around
+)
+
+
+def converted_expense_amount(target_currency, prefix=''):
+    """
+    `converted_amount` for expense rows, at the rates of each expense's
+    date. `prefix` is the path from the queried model to the expense: ''
+    on BudgetExpense, 'expenses__' on ProjectBudget.
+    """
+    return converted_amount(F(f'{prefix}amount'), F(f'{prefix}expense_currency'), target_currency,
+                            F(f'{prefix}date'))
+
+
+def converted_rollup_total(target_currency, prefix=''):
+    """`converted_amount` for BudgetRollup rows at their rate period ('rollups__' from ProjectBudget)."""
+    return converted_amount(F(f'{prefix}total'), F(f'{prefix}currency'), target_currency, F(f'{prefix}period'))
+
+
+class ProjectBudgetQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate `total_expenses` (in each budget's currency) from the rollups, in the same query."""
+        return self.annotate(total_expenses=Coalesce(
+            Sum(converted_rollup_total(F('currency'), prefix='rollups__')),
+            Value(Decimal('0')),
+            output_field=AMOUNT_FIELD,
+        ))
 
 
 class ProjectBudget(models.Model):
@@ -27,6 +58,8 @@ class ProjectBudget(models.Model):
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
 
+    objects = ProjectBudgetQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Project Budget')
         verbose_name_plural = _('Project Budgets')
@@ -34,25 +67,26 @@ class ProjectBudget(models.Model):
     def __str__(self):
         return f"{self.project.name} - {self.initial_budget} {self.currency}"
 
-    @property
+    @cached_property
     def total_expenses(self):
-        """Calculate total expenses converted into the budget's currency"""
-        rate = Decimal('1.96')  # 1 EUR = 1.96 BGN
-        total = Decimal('0')
-        for exp in self.expenses.all():
-            amt = Decimal(exp.amount)
-            if exp.expense_currency == self.currency:
-                total += amt
-            else:
-                # Convert between BGN and EUR based on budget currency target
-                if self.currency == 'BGN' and exp.expense_currency == 'EUR':
-                    total += (amt * rate)
-                elif self.currency == 'EUR' and exp.expense_currency == 'BGN':
-                    total += (amt / rate)
-                else:
-                    # Fallback: treat as same if unknown currency
-                    total += amt
-        return total
+        """
+        Total expenses converted into the budget's currency, summed from
+        the BudgetRollup rows (one per category, currency and rate period,
+        so their number grows with the rate changes the expenses span, not
+        with the expenses) and kept for the life of this instance. The last
+        rate of a currency in use cannot be removed through the API (see
+        `is_last_rate_in_use`). Querysets built with
+        `with_totals()` already carry it; call `refresh_totals()` after
+        changing expenses through this instance.
+        """
+        total = self.rollups.aggregate(
+            total=Sum(converted_rollup_total(Value(self.currency)))
+        )['total']
+        return total if total is not None else Decimal('0')
+
+    def refresh_totals(self):
+        """Forget the memoized total so the next access queries it again."""
+        self.__dict__.pop('total_expenses', None)
 
     @property
     def remaining_budget(self):
@@ -72,6 +106,28 @@ class ProjectBudget(models.Model):
         return self.total_expenses > self.initial_budget
 
 
+def is_last_rate_in_use(rate):
+    """
+    True if `rate` is the only CurrencyRate of a currency that budgets or
+    expenses are kept in; without it their amounts could not be converted.
+    """
+    if CurrencyRate.objects.filter(currency=rate.currency).exclude(pk=rate.pk).exists():
+        return False
+    return (ProjectBudget.objects.filter(currency=rate.currency).exists()
+            or BudgetExpense.objects.filter(expense_currency=rate.currency).exists())
+
+
+def lock_budgets(budget_ids=None):
+    """
+    Row-lock `budget_ids` (all budgets when None) until the end of the
+    transaction, so rollup updates and rebuilds of a budget run one at a time.
+    """
+    budgets = ProjectBudget.objects.select_for_update().order_by('pk')
+    if budget_ids is not None:
+        budgets = budgets.filter(pk__in=budget_ids)
+    list(budgets.values_list('pk', flat=True))
+
+
 class BudgetExpense(models.Model):
     """Individual expense items for a project budget"""
     CATEGORY_CHOICES = [
@@ -138,3 +194,116 @@ class BudgetExpense(models.Model):
 
     def __str__(self):
         return f"{self.category} - {self.amount} {self.expense_currency} - {self.description}"
+
+    def save(self, *args, **kwargs):
+        # One transaction with the BudgetRollup update made by core.signals
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class BudgetRollup(models.Model):
+    """
+    Sum and count of a budget's expenses per category, currency and rate
+    period (see `core.models.currency.rate_period`), kept up to date by the
+    BudgetExpense signals in core.signals so budget totals do not scan
+    expenses. Rates do not change within a period, so converting a row at
+    its period's rates equals converting each expense at its own date, and
+    the table only grows when a rate changes. `manage.py
+    rebuild_budget_rollups` recomputes them (e.g. after bulk updates, which
+    send no signals); adding, moving or removing a rate regroups the
+    periods around its date.
+    """
+    budget = models.ForeignKey(
+        ProjectBudget,
+        on_delete=models.CASCADE,
+        related_name='rollups'
+    )
+    category = models.CharField(_('Category'), max_length=50)
+    currency = models.CharField(_('Currency'), max_length=3)
+    period = models.DateField(_('Rate Period'))
+    total = models.DecimalField(_('Total'), max_digits=14, decimal_places=2, default=Decimal('0'))
+    count = models.PositiveIntegerField(_('Count'), default=0)
+
+    class Meta:
+        verbose_name = _('Budget Rollup')
+        verbose_name_plural = _('Budget Rollups')
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'category', 'currency', 'period'], name='unique_budget_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_id} {self.category} {self.currency} {self.period}: {self.total} ({self.count})"
+
+    @classmethod
+    def apply(cls, budget_id, category, currency, period, amount, count):
+        """
+        Add `amount` and `count` (negative to subtract) to one rollup row.
+        Subtractions only touch an existing row, so expenses removed while
+        their budget is being deleted do not recreate it; a row whose last
+        expense is removed is deleted.
+        """
+        rollup = cls.objects.filter(budget_id=budget_id, category=category, currency=currency, period=period)
+        with transaction.atomic():
+            lock_budgets([budget_id])
+            if amount > 0 or count > 0:
+                cls.objects.get_or_create(budget_id=budget_id, category=category, currency=currency, period=period)
+            rollup.update(total=F('total') + amount, count=F('count') + count)
+            if count < 0:
+                rollup.filter(count__lte=0).delete()
+
+    @classmethod
+    def expected(cls, budget_ids=None, periods=None):
+        """
+        {(budget_id, category, currency, period): (total, count)} computed
+        from the expenses; `periods` is an optional (start, end) range as
+        returned by `rate_periods_around`.
+        """
+        expenses = BudgetExpense.objects.order_by()
+        if budget_ids is not None:
+            expenses = expenses.filter(budget_id__in=budget_ids)
+        if periods is not None:
+            start, end = periods
+            if start > FIRST_RATE_PERIOD:
+                expenses = expenses.filter(date__gte=start)
+            if end is not None:
+                expenses = expenses.filter(date__lt=end)
+        rows = expenses.annotate(period=rate_period_expression(F('date'))).values(
+            'budget_id', 'category', 'expense_currency', 'period'
+        ).annotate(total=Sum('amount'), count=Count('id'))
+        return {
+            (row['budget_id'], row['category'], row['expense_currency'], row['period']):
+                (row['total'], row['count'])
+            for row in rows
+        }
+
+    @classmethod
+    def rebuild(cls, budget_ids=None, periods=None):
+        """
+        Replace the rollups of `budget_ids` (all budgets when None), limited
+        to the (start, end) `periods` range when given, with freshly computed
+        ones. The budgets are locked first so concurrent `apply` calls are
+        neither lost nor counted twice.
+        """
+        with transaction.atomic():
+            lock_budgets(budget_ids)
+            expected = cls.expected(budget_ids, periods)
+            stale = cls.objects.all()
+            if budget_ids is not None:
+                stale = stale.filter(budget_id__in=budget_ids)
+            if periods is not None:
+                start, end = periods
+                stale = stale.filter(period__gte=start)
+                if end is not None:
+                    stale = stale.filter(period__lt=end)
+            stale.delete()
+            cls.objects.bulk_create([
+                cls(budget_id=budget_id, category=category, currency=currency, period=period, total=total, count=count)
+                for (budget_id, category, currency, period), (total, count) in expected.items()
+            ])
+        return len(expected)
+
+    @classmethod
+    def regroup(cls, dates):
+        """Rebuild only the rate periods around rate changes on `dates` (see `rate_periods_around`)."""
+        for date in sorted(set(dates)):
+            cls.rebuild(periods=rate_periods_around(date))
@@ -0,0 +1,181 @@
+import logging
+import datetime
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from django.db import models
+from django.db.models import Case, F, Max, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+logger = logging.getLogger(__name__)
+
+# Every rate is the price of one unit of a currency in BASE_CURRENCY
+BASE_CURRENCY = 'BGN'
+
+# Start of the rate period of dates before any recorded rate
+FIRST_RATE_PERIOD = datetime.date(1900, 1, 1)
+
+# Precision kept for rates, converted amounts and their sums
+RATE_FIELD = models.DecimalField(max_digits=14, decimal_places=6)
+AMOUNT_FIELD = models.DecimalField(max_digits=20, decimal_places=6)
+
+
+class CurrencyRate(models.Model):
+    """
+    Value of one unit of `currency` in BASE_CURRENCY, valid from `date`
+    until the currency's next rate. Dates before a currency's first rate
+    use that first rate. Currencies without any rate cannot be converted:
+    RateTable raises MissingRateError and SQL conversions yield NULL (see
+    `missing_rates`).
+    """
+    currency = models.CharField(_('Currency'), max_length=3)
+    rate = models.DecimalField(
+        _('Rate'),
+        max_digits=14,
+        decimal_places=6,
+        help_text=_('Value of one unit in BGN')
+    )
+    date = models.DateField(_('Valid From'))
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Currency Rate')
+        verbose_name_plural = _('Currency Rates')
+        ordering = ['currency', '-date']
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_currency_rate'),
+        ]
+
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} {BASE_CURRENCY} from {self.date}"
+
+    @classmethod
+    def table(cls, currencies=None):
+        """A RateTable with every rate of `currencies` (all when None), loaded in one query."""
+        rates = cls.objects.order_by('currency', 'date')
+        if currencies is not None:
+            rates = rates.filter(currency__in=set(currencies))
+        return RateTable(rates.values_list('currency', 'date', 'rate'))
+
+
+class MissingRateError(LookupError):
+    """A currency other than BASE_CURRENCY has no CurrencyRate."""
+
+
+class RateTable:
+    """
+    In-memory rates for converting many amounts without a query per amount;
+    follows the same rules as `converted_amount`.
+    """
+
+    def __init__(self, rows=()):
+        self._dates = defaultdict(list)
+        self._rates = defaultdict(list)
+        for currency, date, rate in rows:
+            self._dates[currency].append(date)
+            self._rates[currency].append(rate)
+
+    def rate(self, currency, date=None):
+        """Value of one `currency` in BASE_CURRENCY on `date` (today when None)."""
+        if currency == BASE_CURRENCY:
+            return Decimal('1')
+        dates = self._dates.get(currency)
+        if not dates:
+            raise MissingRateError(f'No exchange rate for {currency}')
+        index = bisect_right(dates, date or timezone.localdate())
+        return self._rates[currency][max(index - 1, 0)]
+
+    def convert(self, amount, currency, target_currency, date=None):
+        """`amount` in `currency` expressed in `target_currency` at the rates of `date`."""
+        if currency == target_currency:
+            return amount
+        return amount * self.rate(currency, date) / self.rate(target_currency, date)
+
+    def convert_many(self, items, target_currency):
+        """`convert` for an iterable of (amount, currency, date) tuples; returns a list."""
+        return [self.convert(amount, currency, target_currency, date) for amount, currency, date in items]
+
+
+def _outer(expression):
+    """`expression` as seen from a rate subquery: field references point to the outer query."""
+    if isinstance(expression, F) and not isinstance(expression, OuterRef):
+        return OuterRef(expression.name)
+    return expression
+
+
+def rate_on(currency, date=None):
+    """
+    SQL expression for the value of one `currency` in BASE_CURRENCY on
+    `date` (expressions, e.g. F('currency') or Value('EUR'); today when
+    `date` is None), looked up in CurrencyRate. NULL for a currency
+    without rates, so its amounts drop out of sums instead of being
+    counted at parity.
+    """
+    if date is None:
+        date = Value(timezone.localdate())
+    rates = CurrencyRate.objects.filter(currency=_outer(currency)).values('rate')
+    return Case(
+        When(Exact(currency, Value(BASE_CURRENCY)), then=Value(Decimal('1'))),
+        default=Coalesce(
+            Subquery(rates.filter(date__lte=_outer(date)).order_by('-date')[:1]),
+            Subquery(rates.order_by('date')[:1]),
+            output_field=RATE_FIELD,
+        ),
+        output_field=RATE_FIELD,
+    )
+
+
+def converted_amount(amount, currency, target_currency, date=None):
+    """
+    SQL expression for `amount` in `currency` converted into
+    `target_currency` at the rates of `date` (all expressions; today's
+    rates when `date` is None). Usable in annotate() and aggregate();
+    NULL when either currency has no rate.
+    """
+    return Case(
+        When(Exact(currency, target_currency), then=amount),
+        default=amount * rate_on(currency, date) / rate_on(target_currency, date),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def rate_period(date):
+    """
+    Start of the rate period containing `date`: the latest rate change of
+    any currency on or before it. Every rate is constant within a period,
+    so amounts of one period can be summed first and converted once.
+    """
+    latest = CurrencyRate.objects.filter(date__lte=date).aggregate(latest=Max('date'))['latest']
+    return latest or FIRST_RATE_PERIOD
+
+
+def rate_periods_around(date):
+    """
+    (start, end) of the rate periods a rate change on `date` can split or
+    merge: from the previous change of any currency to the next one (`end`
+    exclusive, None when there is none), ignoring changes on `date` itself.
+    Periods outside this range are the same with or without that change.
+    """
+    rates = CurrencyRate.objects.all()
+    start = rates.filter(date__lt=date).aggregate(start=Max('date'))['start'] or FIRST_RATE_PERIOD
+    end = rates.filter(date__gt=date).aggregate(end=Min('date'))['end']
+    return start, end
+
+
+def rate_period_expression(date):
+    """`rate_period` as an SQL expression of `date` (e.g. F('date'))."""
+    changes = CurrencyRate.objects.filter(date__lte=_outer(date)).order_by('-date').values('date')
+    return Coalesce(Subquery(changes[:1]), Value(FIRST_RATE_PERIOD), output_field=models.DateField())
+
+
+def missing_rates(currencies):
+    """The currencies in `currencies` that have no rate and so cannot be converted (logged)."""
+    currencies = set(currencies) - {BASE_CURRENCY}
+    known = set(CurrencyRate.objects.filter(currency__in=currencies).values_list('currency', flat=True))
+    missing = sorted(currencies - known)
+    if missing:
+        logger.warning(f'No exchange rate for {", ".join(missing)}; their amounts are left out of converted totals')
+    return missing
@@ -0,0 +1,22 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class DashboardSnapshot(models.Model):
+    """
+    A precomputed analytics payload (one row per `name`), written by
+    `manage.py refresh_dashboard` and served by `analytics/dashboard/`;
+    it counts as stale once older than ANALYTICS_DASHBOARD_MAX_AGE_SECONDS.
+    """
+    name = models.CharField(_('Name'), max_length=50, unique=True)
+    data = models.JSONField(_('Data'), default=dict, encoder=DjangoJSONEncoder)
+    generated_at = models.DateTimeField(_('Generated At'))
+    duration_ms = models.FloatField(_('Duration (ms)'), default=0)
+
+    class Meta:
+        verbose_name = _('Dashboard Snapshot')
+        verbose_name_plural = _('Dashboard Snapshots')
+
+    def __str__(self):
+        return f"{self.name} @ {self.generated_at:%Y-%m-%d %H:%M:%S}"
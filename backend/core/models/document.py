@@ -6,6 +6,13 @@ class Document(models.Model):
     file_docx = models.FileField(upload_to='documents/docx/', null=True, blank=True)
     file_pdf = models.FileField(upload_to='documents/pdf/', null=True, blank=True)
     zip_file = models.FileField(upload_to='documents/zip/', null=True, blank=True)
+    artifact = models.ForeignKey(
+        'GeneratedArtifact',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='documents'
+    )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
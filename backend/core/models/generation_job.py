@@ -0,0 +1,92 @@
+from django.db import models
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
+
+
+class GenerationJob(models.Model):
+    """Queued act/document rendering, drained by `manage.py run_generation_worker`."""
+    KIND_CHOICES = [
+        ('act', _('Act')),
+        ('document', _('Document')),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', _('Queued')),
+        ('running', _('Running')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    ]
+
+    kind = models.CharField(_('Kind'), max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        db_index=True
+    )
+    act = models.ForeignKey(
+        'Act',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_jobs'
+    )
+    document = models.ForeignKey(
+        'Document',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_jobs'
+    )
+    payload = models.JSONField(
+        _('Payload'),
+        default=dict,
+        blank=True,
+        help_text=_('Template name and context for document jobs')
+    )
+    error = models.TextField(_('Error'), blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_jobs'
+    )
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    started_at = models.DateTimeField(_('Started At'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('Finished At'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Generation Job')
+        verbose_name_plural = _('Generation Jobs')
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} - {self.status}"
+
+    def claim(self):
+        """
+        Atomically move a queued job to running.
+        Returns False when another worker got to it first.
+        """
+        now = timezone.now()
+        claimed = GenerationJob.objects.filter(pk=self.pk, status='queued').update(
+            status='running', started_at=now
+        )
+        if claimed:
+            self.status = 'running'
+            self.started_at = now
+        return bool(claimed)
+
+    def mark_done(self):
+        self.status = 'done'
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'finished_at'])
+
+    def mark_failed(self, error):
+        self.status = 'failed'
+        self.error = str(error)
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
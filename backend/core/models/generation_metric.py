@@ -0,0 +1,75 @@
+import logging
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationMetric(models.Model):
+    """
+    Wall time per stage and output sizes of one act/document render, as
+    collected by `core.utils.timing`. Aggregated per template by the
+    admin-only `generation-metrics/summary/` endpoint.
+    """
+    KIND_CHOICES = [
+        ('act', _('Act')),
+        ('document', _('Document')),
+    ]
+
+    kind = models.CharField(_('Kind'), max_length=20, choices=KIND_CHOICES)
+    template_name = models.CharField(_('Template Name'), max_length=255, db_index=True)
+    renderer = models.CharField(_('Renderer'), max_length=20, blank=True)
+    act = models.ForeignKey(
+        'Act',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_metrics'
+    )
+    document = models.ForeignKey(
+        'Document',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_metrics'
+    )
+    reused = models.BooleanField(
+        _('Reused Artifact'),
+        default=False,
+        help_text=_('The files were taken from a stored artifact instead of rendered')
+    )
+    total_ms = models.FloatField(_('Total (ms)'))
+    stages = models.JSONField(_('Stages (ms)'), default=dict, blank=True)
+    sizes = models.JSONField(_('Output Sizes (bytes)'), default=dict, blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('Generation Metric')
+        verbose_name_plural = _('Generation Metrics')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.template_name} {self.total_ms:.0f} ms"
+
+    @classmethod
+    def record(cls, kind, template_name, timings, owner=None, renderer=None, reused=False):
+        """
+        Store `timings` (a finished StageTimings) for `owner`. Failures are
+        logged and swallowed: metrics must never fail a generation.
+        """
+        try:
+            data = timings.as_dict()
+            return cls.objects.create(
+                kind=kind,
+                template_name=template_name or '',
+                renderer=renderer or '',
+                act=owner if kind == 'act' else None,
+                document=owner if kind == 'document' else None,
+                reused=reused,
+                total_ms=round(timings.total_ms or 0.0, 2),
+                stages=data['stages'],
+                sizes=data['sizes'],
+            )
+        except Exception as e:
+            logger.warning(f'Could not record generation metrics for {template_name}: {str(e)}')
+            return None
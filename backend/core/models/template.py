@@ -38,6 +38,14 @@ class DocumentTemplate(models.Model):
         null=True
     )
     
+    # Placeholder inventory of template_file, see refresh_placeholders()
+    placeholders = models.JSONField(
+        _('Placeholders'),
+        default=dict,
+        blank=True,
+        help_text=_('{{keys}}, numeric markers and their locations in the template file')
+    )
+    
     is_active = models.BooleanField(_('Active'), default=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -56,6 +64,33 @@ class DocumentTemplate(models.Model):
     def __str__(self):
         return f"{self.get_template_type_display()} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        """Recompute the placeholder inventory when a different file is stored"""
+        super().save(*args, **kwargs)
+        if self.placeholders_stale():
+            self.refresh_placeholders()
+
+    def placeholders_stale(self):
+        stored_for = self.placeholders.get('file') if self.placeholders else None
+        return stored_for != (self.template_file.name if self.template_file else None)
+
+    def refresh_placeholders(self):
+        """Parse template_file once and store its placeholder inventory."""
+        from ..utils.template_cache import compile_template_bytes
+
+        if not self.template_file:
+            inventory = {}
+        else:
+            try:
+                with self.template_file.open('rb') as f:
+                    inventory = compile_template_bytes(f.read()).inventory()
+            except Exception as e:
+                inventory = {'keys': [], 'markers': [], 'slots': [], 'error': str(e)}
+            inventory['file'] = self.template_file.name
+        self.placeholders = inventory
+        DocumentTemplate.objects.filter(pk=self.pk).update(placeholders=inventory)
+        return inventory
+
 
 class TextSnippet(models.Model):
     """Reusable text snippets for quick insertion"""
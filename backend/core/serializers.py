@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import (
     Project, Document, Task, Act, UserProfile, PushSubscription, ActivityLog,
-    ProjectBudget, BudgetExpense, DocumentTemplate, TextSnippet, WeatherLog, Reminder
+    ProjectBudget, BudgetExpense, CurrencyRate, DocumentTemplate, TextSnippet, WeatherLog,
+    Reminder, GenerationJob, GenerationMetric
 )
+from .models.budget import is_last_rate_in_use
+from .models.currency import BASE_CURRENCY
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -136,18 +140,14 @@ class ActSerializer(serializers.ModelSerializer):
         read_only_fields = ('docx_file', 'pdf_file', 'zip_file', 'created_at', 'updated_at', 'created_by', 'docx_url', 'pdf_url', 'zip_url')
     
     def get_docx_url(self, obj):
+        request = self.context.get('request')
         if obj.docx_file:
-            request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.docx_file.url)
+        elif obj.pdf_file and request:
+            # DOCX deferred for natively rendered PDFs; rendered on download
+            return request.build_absolute_uri(reverse('act-download', args=[obj.pk]) + '?file=docx')
         return None
-
-
-class PushSubscriptionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = PushSubscription
-        fields = ['id', 'endpoint', 'p256dh', 'auth', 'created_at']
-        read_only_fields = ['id', 'created_at']
     
     def get_pdf_url(self, obj):
         if obj.pdf_file:
@@ -157,13 +157,40 @@ class PushSubscriptionSerializer(serializers.ModelSerializer):
         return None
 
     def get_zip_url(self, obj):
+        request = self.context.get('request')
         if obj.zip_file:
-            request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.zip_file.url)
+        elif obj.pdf_file and request:
+            return request.build_absolute_uri(reverse('act-download', args=[obj.pk]) + '?file=zip')
         return None
 
 
+class PushSubscriptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PushSubscription
+        fields = ['id', 'endpoint', 'p256dh', 'auth', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'kind', 'status', 'status_display', 'act', 'document',
+                  'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+class GenerationMetricSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationMetric
+        fields = ['id', 'kind', 'template_name', 'renderer', 'act', 'document', 'reused',
+                  'total_ms', 'stages', 'sizes', 'created_at']
+        read_only_fields = fields
+
+
 class ActivityLogSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     action_display = serializers.CharField(source='get_action_type_display', read_only=True)
@@ -176,6 +203,14 @@ class ActivityLogSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+def validate_rated_currency(value):
+    """`value` uppercased; rejected unless it is BASE_CURRENCY or has a CurrencyRate."""
+    value = value.upper()
+    if value != BASE_CURRENCY and not CurrencyRate.objects.filter(currency=value).exists():
+        raise serializers.ValidationError(f'Няма валутен курс за {value}')
+    return value
+
+
 class BudgetExpenseSerializer(serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     category_display = serializers.CharField(source='get_category_display', read_only=True)
@@ -187,6 +222,9 @@ class BudgetExpenseSerializer(serializers.ModelSerializer):
                   'created_by', 'created_by_name', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
 
+    def validate_expense_currency(self, value):
+        return validate_rated_currency(value)
+
 
 class ProjectBudgetSerializer(serializers.ModelSerializer):
     expenses = BudgetExpenseSerializer(many=True, read_only=True)
@@ -202,6 +240,9 @@ class ProjectBudgetSerializer(serializers.ModelSerializer):
                   'is_over_budget', 'expenses', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_currency(self, value):
+        return validate_rated_currency(value)
+
     def validate(self, attrs):
         # Prevent creating a second budget for the same project
         project = attrs.get('project')
@@ -214,6 +255,21 @@ class ProjectBudgetSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class CurrencyRateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CurrencyRate
+        fields = ['id', 'currency', 'rate', 'date', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate_currency(self, value):
+        value = value.upper()
+        if self.instance is not None and value != self.instance.currency and is_last_rate_in_use(self.instance):
+            raise serializers.ValidationError(
+                f'Това е последният курс на {self.instance.currency}, а валутата се използва от бюджети или разходи'
+            )
+        return value
+
+
 class DocumentTemplateSerializer(serializers.ModelSerializer):
     template_type_display = serializers.CharField(source='get_template_type_display', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -221,9 +277,9 @@ class DocumentTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentTemplate
         fields = ['id', 'name', 'template_type', 'template_type_display', 
-                  'description', 'default_content', 'template_file', 'is_active',
+                  'description', 'default_content', 'template_file', 'placeholders', 'is_active',
                   'created_by', 'created_by_name', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
+        read_only_fields = ['id', 'placeholders', 'created_at', 'updated_at', 'created_by']
 
 
 class TextSnippetSerializer(serializers.ModelSerializer):
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from decimal import Decimal
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Act, Document, GeneratedArtifact, BudgetExpense, BudgetRollup, CurrencyRate
+from .models.currency import rate_period
 
 
 @receiver(post_save, sender=User)
@@ -18,3 +21,80 @@ def save_user_profile(sender, instance, **kwargs):
         UserProfile.objects.get_or_create(user=instance)
     else:
         instance.profile.save()
+
+
+@receiver(post_delete, sender=Act)
+@receiver(post_delete, sender=Document)
+def release_generated_artifact(sender, instance, **kwargs):
+    """Drop the deleted act/document's reference on its shared generated files"""
+    if instance.artifact_id:
+        GeneratedArtifact.release(instance.artifact_id)
+
+
+@receiver(pre_save, sender=BudgetExpense)
+def remember_expense_rollup_key(sender, instance, raw=False, **kwargs):
+    """Keep the stored budget/category/currency/date/amount of an edited expense for the rollup update"""
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = BudgetExpense.objects.select_for_update().filter(pk=instance.pk).values_list(
+            'budget_id', 'category', 'expense_currency', 'date', 'amount'
+        ).first()
+
+
+def _rollup_key(budget_id, category, currency, date):
+    # `date` may still hold the datetime of the field default
+    date = BudgetExpense._meta.get_field('date').to_python(date)
+    return (budget_id, category, currency, rate_period(date))
+
+
+@receiver(post_save, sender=BudgetExpense)
+def update_budget_rollup_on_save(sender, instance, raw=False, **kwargs):
+    """Move the expense's amount into its (budget, category, currency, rate period) rollup"""
+    if raw:
+        return
+    key = _rollup_key(instance.budget_id, instance.category, instance.expense_currency, instance.date)
+    amount = Decimal(str(instance.amount))
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        previous_key = _rollup_key(*previous[:4])
+        if previous_key == key:
+            BudgetRollup.apply(*key, amount - previous[4], 0)
+            return
+        BudgetRollup.apply(*previous_key, -previous[4], -1)
+    BudgetRollup.apply(*key, amount, 1)
+
+
+@receiver(post_delete, sender=BudgetExpense)
+def update_budget_rollup_on_delete(sender, instance, **kwargs):
+    """Take a deleted expense out of its rollup"""
+    key = _rollup_key(instance.budget_id, instance.category, instance.expense_currency, instance.date)
+    BudgetRollup.apply(*key, -Decimal(str(instance.amount)), -1)
+
+
+@receiver(pre_save, sender=CurrencyRate)
+def remember_rate_date(sender, instance, raw=False, **kwargs):
+    """Keep the stored date of an edited rate, whose period boundary may move"""
+    instance._previous_date = None
+    if instance.pk and not raw:
+        instance._previous_date = CurrencyRate.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=CurrencyRate)
+def regroup_rollups_on_rate_save(sender, instance, created, raw=False, **kwargs):
+    """A new or moved rate can split or merge the periods around its dates; regroup them once committed"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_date', None)
+    if created or previous is None:
+        dates = [instance.date]
+    elif previous != instance.date:
+        dates = [previous, instance.date]
+    else:
+        return
+    transaction.on_commit(lambda: BudgetRollup.regroup(dates))
+
+
+@receiver(post_delete, sender=CurrencyRate)
+def regroup_rollups_on_rate_delete(sender, instance, **kwargs):
+    """A removed rate can merge the periods around its date; regroup them once committed"""
+    transaction.on_commit(lambda: BudgetRollup.regroup([instance.date]))
@@ -1,4 +1,8 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from django.test import TestCase, SimpleTestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
@@ -39,4 +43,943 @@ class DocumentGenerationTests(TestCase):
         response = self.client.post(url, payload, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('docx', response.data)
-        self.assertIn('pdf', response.data)
\ No newline at end of file
+        self.assertIn('pdf', response.data)
+
+class CompiledTemplateCacheTests(SimpleTestCase):
+    def setUp(self):
+        from core.utils.template_cache import clear_template_cache
+        clear_template_cache()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'tpl.docx')
+        self._write_template('Строеж: {{project_name}}', 'Изпълнител *1*')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _write_template(self, *lines):
+        from docx import Document as DocxDocument
+        doc = DocxDocument()
+        for line in lines:
+            doc.add_paragraph(line)
+        table = doc.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = '{{client_name}} {{unknown}}'
+        doc.save(self.path)
+
+    def test_slots_are_recorded_once(self):
+        from core.utils.template_cache import get_compiled_template
+        compiled = get_compiled_template(self.path)
+        self.assertEqual(compiled.keys, ['project_name', 'client_name', 'unknown'])
+        self.assertEqual([s.location for s in compiled.slots], ['body', 'body', 'table'])
+        self.assertEqual(compiled.slots[1].markers, ('1',))
+        self.assertIs(get_compiled_template(self.path), compiled)
+
+    def test_changed_file_is_recompiled(self):
+        from core.utils.template_cache import get_compiled_template
+        first = get_compiled_template(self.path)
+        self._write_template('{{act_date}}')
+        os.utime(self.path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+        second = get_compiled_template(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.keys, ['act_date', 'client_name', 'unknown'])
+
+    def test_native_act_layouts_are_read_from_the_templates(self):
+        from core.utils.act_pdf import NATIVE_ACT_TYPES, build_layout, get_template_name, layout_tokens
+        from core.utils.document_generator import get_template_path
+        from core.utils.template_cache import get_compiled_template
+
+        for act_type in NATIVE_ACT_TYPES:
+            compiled = get_compiled_template(get_template_path(get_template_name(act_type)))
+            placeholders = {f'{{{{{key}}}}}' for key in compiled.keys} | {f'*{m}*' for m in compiled.markers}
+            self.assertEqual(layout_tokens(act_type), placeholders, act_type)
+
+        layout = build_layout(get_compiled_template(self.path))
+        self.assertEqual([kind for kind, _ in layout], ['paragraph', 'paragraph', 'table'])
+        self.assertEqual(layout[0][1][1], 'Строеж: {{project_name}}')
+        self.assertEqual(layout[2][1]['rows'], [['{{client_name}} {{unknown}}']])
+
+
+class SubstitutionEngineTests(SimpleTestCase):
+    def _paragraph(self, *runs):
+        from docx import Document as DocxDocument
+        paragraph = DocxDocument().add_paragraph()
+        for text, bold in runs:
+            paragraph.add_run(text).bold = bold
+        return paragraph
+
+    def test_split_placeholder_keeps_runs(self):
+        from core.utils.substitution import build_token_lookup, substitute_paragraph
+        paragraph = self._paragraph(('Строеж: ', False), ('{{project', True), ('_name}} *2* {{missing}}', True))
+        lookup = build_token_lookup({'project_name': 'Блок 5'}, {'2': 'Иванов'})
+        self.assertTrue(substitute_paragraph(paragraph._p, lookup))
+        self.assertEqual(paragraph.text, 'Строеж: Блок 5 Иванов ')
+        self.assertEqual([r.bold for r in paragraph.runs], [False, True, True])
+        self.assertEqual(paragraph.runs[1].text, 'Блок 5')
+
+    def test_newlines_become_breaks(self):
+        from core.utils.substitution import build_token_lookup, substitute_paragraph
+        paragraph = self._paragraph(('{{notes}}', False))
+        substitute_paragraph(paragraph._p, build_token_lookup({'notes': 'ред 1\nред 2'}, {}))
+        self.assertEqual(paragraph.text, 'ред 1\nред 2')
+        self.assertEqual(len(paragraph.runs), 1)
+
+
+class StreamingRenderTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_stream_matches_dom_for_act_templates(self):
+        import zipfile
+        from lxml import etree
+        from core.utils.document_generator import generate_document
+        context = {'project_name': 'Блок & <5>\nред 2', 'act_date': '01.01.2026', 'representative_builder': 'Иван'}
+        for template_name in ('act7_bg.docx', 'act14_bg.docx', 'act15_bg.docx'):
+            dom_path = os.path.join(self.tmpdir, f'dom_{template_name}')
+            stream_path = os.path.join(self.tmpdir, f'stream_{template_name}')
+            generate_document(template_name, context, dom_path, mode='dom')
+            generate_document(template_name, context, stream_path, mode='stream')
+            with zipfile.ZipFile(dom_path) as a, zipfile.ZipFile(stream_path) as b:
+                canonical = [
+                    etree.tostring(etree.fromstring(z.read('word/document.xml')), method='c14n')
+                    for z in (a, b)
+                ]
+            self.assertEqual(canonical[0], canonical[1], template_name)
+
+
+class PdfConverterTests(SimpleTestCase):
+    def test_python_backend_renders_document_text(self):
+        from pypdf import PdfReader
+        from core.utils.document_generator import generate_document
+        from core.utils.pdf_export import create_converter
+
+        buf = io.BytesIO()
+        generate_document('act7_bg.docx', {'project_name': 'Test Object'}, buf)
+        pdf_bytes = create_converter('python').convert(buf.getvalue())
+
+        self.assertTrue(pdf_bytes.startswith(b'%PDF'))
+        text = ''.join(page.extract_text() for page in PdfReader(io.BytesIO(pdf_bytes)).pages)
+        self.assertIn('Test Object', text)
+
+    def test_office_pool_rejects_work_past_queue_limit(self):
+        from core.utils.pdf_export import LibreOfficeConverter, ConverterBusy
+
+        pool = LibreOfficeConverter(size=1, queue_size=1, queue_timeout=0.1)
+        process = pool._checkout()
+        with self.assertRaises(ConverterBusy):
+            pool._checkout()
+        pool._admission.acquire()
+        with self.assertRaises(ConverterBusy):
+            pool._checkout()
+        pool._admission.release()
+        pool._checkin(process)
+        self.assertIs(pool._checkout(), process)
+
+    def test_pool_workers_stop_their_office_processes_on_exit(self):
+        import sys
+        import stat
+        import time
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        # stands in for unoserver: listens on --port and keeps a child (soffice) running
+        command = os.path.join(tmp, 'fake-unoserver')
+        with open(command, 'w') as f:
+            f.write(f"""#!{sys.executable}
+import socket, subprocess, sys, time
+port = int(sys.argv[sys.argv.index('--port') + 1])
+child = subprocess.Popen(['sleep', '300'])
+with open(sys.argv[0] + '.child', 'w') as f:
+    f.write(str(child.pid))
+server = socket.socket()
+server.bind(('127.0.0.1', port))
+server.listen()
+time.sleep(300)
+""")
+        os.chmod(command, os.stat(command).st_mode | stat.S_IEXEC)
+
+        with self.settings(PDF_CONVERTER='libreoffice', PDF_CONVERTER_COMMAND=command, PDF_CONVERTER_POOL_SIZE=1):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as pool:
+                pids = pool.submit(_start_office_processes).result()
+        with open(command + '.child') as f:
+            pids.append(int(f.read()))
+
+        def alive(pid):
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    return f.read().split(')')[-1].split()[0] != 'Z'
+            except FileNotFoundError:
+                return False
+
+        for _ in range(50):
+            if not any(alive(pid) for pid in pids):
+                break
+            time.sleep(0.1)
+        self.assertEqual([pid for pid in pids if alive(pid)], [])
+
+
+class FontRegistryTests(SimpleTestCase):
+    def test_cached_widths_match_reportlab(self):
+        from reportlab.pdfbase import pdfmetrics
+        from core.utils.fonts import get_default_font, string_width
+
+        font = get_default_font()
+        self.assertIs(get_default_font(), font)
+        for text in ('Строеж: Жилищна сграда', 'level +3.00', ''):
+            self.assertEqual(string_width(text, font, 11), pdfmetrics.stringWidth(text, font, 11))
+
+
+class OverlayWrapTests(SimpleTestCase):
+    def _previous_wrap(self, txt, max_width, font, font_size):
+        from reportlab.pdfbase import pdfmetrics
+        lines, cur = [], ""
+        for w in txt.split():
+            candidate = (cur + " " + w).strip()
+            if pdfmetrics.stringWidth(candidate, font, font_size) <= max_width or not cur:
+                cur = candidate
+            else:
+                lines.append(cur)
+                cur = w
+        if cur:
+            lines.append(cur)
+        return lines
+
+    def test_breaks_match_previous_wrapping(self):
+        import random
+        from core.utils.fonts import get_default_font
+        from core.utils.pdf_overlay import wrap_lines
+
+        rng = random.Random(7)
+        font = get_default_font()
+        for _ in range(200):
+            text = ' '.join('констатация'[:rng.randint(1, 11)] * rng.randint(1, 3) for _ in range(rng.randint(0, 40)))
+            max_width, size = rng.choice([40, 150, 380, 420]), rng.choice([10, 11, 12])
+            self.assertEqual(wrap_lines(text, max_width, font, size), self._previous_wrap(text, max_width, font, size))
+
+    def test_newlines_and_soft_hyphens(self):
+        from core.utils.fonts import get_default_font
+        from core.utils.pdf_overlay import wrap_lines
+
+        font = get_default_font()
+        self.assertEqual(wrap_lines('първи\n\nтрети', 200, font, 10), ['първи', '', 'трети'])
+        lines = wrap_lines('строи\u00adтелство', 40, font, 10)
+        self.assertEqual(lines, ['строи-', 'телство'])
+
+
+class PdfTemplateBatchFillTests(SimpleTestCase):
+    def setUp(self):
+        from reportlab.pdfgen import canvas
+        self.tmp = tempfile.mkdtemp()
+        self.template = os.path.join(self.tmp, 'form.pdf')
+        c = canvas.Canvas(self.template)
+        c.drawString(50, 750, 'FORM')
+        c.showPage()
+        c.save()
+        self.mapping = {'pages': [{'fields': [{'name': 'project_name', 'x': 100, 'y': 700, 'size': 11}]}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_merged_output_has_one_filled_copy_per_record(self):
+        from pypdf import PdfReader
+        from core.utils.pdf_overlay import fill_pdf_template_batch
+
+        merged = os.path.join(self.tmp, 'merged.pdf')
+        contexts = [{'project_name': f'Project {i}'} for i in range(3)]
+        fill_pdf_template_batch(self.template, contexts, self.mapping, merged_output_path=merged)
+
+        texts = [page.extract_text() for page in PdfReader(merged).pages]
+        self.assertEqual(len(texts), 3)
+        for i, text in enumerate(texts):
+            self.assertIn('FORM', text)
+            self.assertIn(f'Project {i}', text)
+            self.assertNotIn(f'Project {(i + 1) % 3}', text)
+
+    def test_separate_outputs_per_record(self):
+        from pypdf import PdfReader
+        from core.utils.pdf_overlay import fill_pdf_template_batch
+
+        outputs = [os.path.join(self.tmp, f'out{i}.pdf') for i in range(2)]
+        fill_pdf_template_batch(self.template, [{'project_name': 'A'}, {'project_name': 'B'}], self.mapping,
+                                output_paths=outputs)
+        self.assertIn('B', PdfReader(outputs[1]).pages[0].extract_text())
+        with self.assertRaises(ValueError):
+            fill_pdf_template_batch(self.template, [{}], self.mapping)
+
+    def test_acroform_fields_are_filled_directly(self):
+        from reportlab.pdfgen import canvas
+        from pypdf import PdfReader
+        from core.utils.pdf_overlay import fill_pdf_template
+
+        form = os.path.join(self.tmp, 'acroform.pdf')
+        c = canvas.Canvas(form)
+        c.acroForm.textfield(name='project_name', x=100, y=700, width=300, height=20)
+        c.acroForm.textfield(name='Client', x=100, y=650, width=300, height=20)
+        c.showPage()
+        c.save()
+        mapping = {'pages': [{'fields': [
+            {'name': 'project_name'},
+            {'name': 'client_name', 'form_field': 'Client'},
+            {'name': 'act_date', 'x': 100, 'y': 600},
+        ]}]}
+        context = {'project_name': 'Обект', 'client_name': 'Client Ltd', 'act_date': '01.02.2026'}
+        output = os.path.join(self.tmp, 'filled.pdf')
+
+        fill_pdf_template(form, output, context, mapping)
+        reader = PdfReader(output)
+        values = {name: field.get('/V') for name, field in reader.get_fields().items()}
+        self.assertEqual(values, {'project_name': 'Обект', 'Client': 'Client Ltd'})
+        self.assertIn('01.02.2026', reader.pages[0].extract_text())
+
+        fill_pdf_template(form, output, context, dict(mapping, flatten=True))
+        reader = PdfReader(output)
+        self.assertFalse(reader.get_fields())
+        text = reader.pages[0].extract_text()
+        self.assertIn('Обект', text)
+        self.assertIn('Client Ltd', text)
+
+
+class SignatureCacheTests(SimpleTestCase):
+    def test_signers_are_drawn_once_and_embedded_once(self):
+        from unittest import mock
+        from docx import Document
+        from core.utils import sign_stub
+
+        sign_stub.clear_signature_cache()
+        signers = [
+            ('Иван Петров', 'Строител', '2026-01-15'),
+            ('Мария Иванова', 'Надзор', '2026-01-15'),
+            ('Георги Димитров', 'Проектант', '2026-01-15'),
+        ]
+        with mock.patch.object(sign_stub, '_draw_signature', wraps=sign_stub._draw_signature) as draw:
+            for _ in range(5):
+                doc = Document()
+                sign_stub.sign_document(doc, signers)
+                sign_stub.sign_document(doc, signers)
+        self.assertEqual(draw.call_count, 3)
+
+        buf = io.BytesIO()
+        doc.save(buf)
+        images = [part for part in Document(buf).part.package.iter_parts() if part.partname.startswith('/word/media/')]
+        self.assertEqual(len(images), 3)
+
+
+class GenerationBenchmarkTests(SimpleTestCase):
+    def test_benchmark_command_writes_comparable_results(self):
+        import json
+        from django.core.management import call_command
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        first, second = os.path.join(tmp, 'first.json'), os.path.join(tmp, 'second.json')
+        args = ['benchmark_generation', '--iterations', '1', '--warmup', '0', '--sizes', 'small', '--acts', 'act14']
+        call_command(*args, '--output', first, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command(*args, '--output', second, '--compare', first, stdout=out)
+
+        with open(second, encoding='utf-8') as f:
+            report = json.load(f)
+        cases = {r['case'] for r in report['results']}
+        self.assertEqual(cases, {'docx', 'native_pdf', 'pdf_overlay', 'zip'})
+        for result in report['results']:
+            self.assertGreater(result['ops_per_sec'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertGreater(result['peak_alloc_mb'], 0)
+        self.assertIn('p50', out.getvalue())
+
+
+class FieldMappingTests(SimpleTestCase):
+    def setUp(self):
+        from core.utils.field_mapping import clear_mapping_cache
+        clear_mapping_cache()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_repo_mappings_compile(self):
+        from core.utils.document_generator import TEMPLATE_DIR
+        from core.utils.field_mapping import find_mapping_files, get_compiled_mapping
+
+        for path in find_mapping_files(TEMPLATE_DIR):
+            mapping = get_compiled_mapping(path)
+            self.assertTrue(all(isinstance(f.x, float) for page in mapping.pages for f in page.fields))
+
+    def test_invalid_mapping_names_the_bad_entry(self):
+        from core.utils.field_mapping import MappingError, compile_mapping
+
+        with self.assertRaisesRegex(MappingError, r'pages\[0\]\.fields\[1\]\.size'):
+            compile_mapping({'pages': [{'fields': [{'name': 'a'}, {'name': 'b', 'size': 'big'}]}]})
+
+    def test_cached_until_file_changes(self):
+        import json
+        from core.utils.field_mapping import get_compiled_mapping
+
+        path = os.path.join(self.tmp, 'form_fields.json')
+        with open(path, 'w') as f:
+            json.dump({'pages': [{'fields': [{'name': 'a', 'x': 10}]}]}, f)
+        first = get_compiled_mapping(path)
+        self.assertIs(get_compiled_mapping(path), first)
+
+        with open(path, 'w') as f:
+            json.dump({'pages': [{'fields': [{'name': 'a', 'x': 20.5}]}]}, f)
+        os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+        self.assertEqual(get_compiled_mapping(path).pages[0].fields[0].x, 20.5)
+
+
+def _start_office_processes():
+    """Pool task: start the worker's converter processes; returns their pids."""
+    from core.utils.pdf_export import get_converter
+    converter = get_converter()
+    converter.warm()
+    return [process.process.pid for process in converter._processes]
+
+
+def _fake_convert_to_pdf_bytes(docx_bytes):
+    return b'%PDF-1.4 test'
+
+
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        from core.models import Project
+        self.media_dir = tempfile.mkdtemp()
+        self.media_override = self.settings(MEDIA_ROOT=self.media_dir)
+        self.media_override.enable()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='worker', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Жилищна сграда', location='София', contractor='Строй ООД')
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_dir, ignore_errors=True)
+
+    def _act_payload(self):
+        return {
+            'project': self.project.id,
+            'act_type': 'act7',
+            'act_date': '2026-01-15',
+            'representative_builder': 'Иван Иванов',
+            'representative_supervision': 'Петър Петров',
+            'representative_designer': 'Мария Георгиева',
+            'level_from': '+0.00',
+            'level_to': '+3.00',
+        }
+
+    def test_async_generate_queues_job_and_worker_renders_it(self):
+        import zipfile
+        from unittest import mock
+        from django.core.management import call_command
+        from core.models import Act, GenerationJob
+
+        response = self.client.post('/api/acts/generate/?async=1', self._act_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = GenerationJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.status, 'queued')
+        self.assertFalse(job.act.docx_file)
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes', _fake_convert_to_pdf_bytes):
+            call_command('run_generation_worker', '--once', '--concurrency', '1', stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        act = Act.objects.get(pk=job.act_id)
+        self.assertTrue(act.docx_file)
+        self.assertTrue(act.pdf_file)
+        with zipfile.ZipFile(act.zip_file.path) as zf:
+            compress_types = {info.filename: info.compress_type for info in zf.infolist()}
+        self.assertEqual(compress_types[f'act7_{act.id}.docx'], zipfile.ZIP_STORED)
+        self.assertEqual(compress_types['context.json'], zipfile.ZIP_DEFLATED)
+
+        poll = self.client.get(f'/api/generation-jobs/{job.id}/')
+        self.assertEqual(poll.data['status'], 'done')
+
+    def test_generate_batch_renders_all_acts_and_zip(self):
+        import zipfile
+        from unittest import mock
+        from core.models import Act
+        from core.utils import generation
+        from core.utils.generation import get_render_pool, shutdown_render_pool
+
+        self.addCleanup(shutdown_render_pool)
+
+        levels = [('+0.00', '+3.00'), ('+3.00', '+6.00'), ('+6.00', '+9.00')]
+        acts = []
+        for level_from, level_to in levels:
+            item = self._act_payload()
+            item.pop('project')
+            item.update(level_from=level_from, level_to=level_to)
+            acts.append(item)
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes', _fake_convert_to_pdf_bytes), \
+                self.settings(GENERATION_PROCESSES=2):
+            response = self.client.post('/api/acts/generate_batch/',
+                                        {'project': self.project.id, 'acts': acts}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['status'] for r in response.data['results']], ['done'] * 3)
+        self.assertEqual(Act.objects.filter(project=self.project).count(), 3)
+        # the pool outlives the request, so later batches reuse its workers
+        pool = generation._render_pool
+        self.assertIsNotNone(pool)
+        self.assertIs(get_render_pool(), pool)
+        zip_rel = response.data['zip_url'].split('/media/', 1)[1]
+        with zipfile.ZipFile(os.path.join(self.media_dir, zip_rel)) as zf:
+            self.assertEqual(len(zf.namelist()), 6)
+
+        for bad in (['act7', 3], {'project': self.project.id, 'acts': [acts[0], None]}):
+            response = self.client.post('/api/acts/generate_batch/', bad, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_identical_act_reuses_artifact_until_last_reference(self):
+        from unittest import mock
+        from core.models import Act, GeneratedArtifact
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes', _fake_convert_to_pdf_bytes):
+            first = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes') as convert:
+            second = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+            convert.assert_not_called()
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        first_act = Act.objects.get(pk=first.data['id'])
+        second_act = Act.objects.get(pk=second.data['id'])
+        self.assertEqual(first_act.pdf_file.name, second_act.pdf_file.name)
+        artifact = GeneratedArtifact.objects.get()
+        self.assertEqual(artifact.ref_count, 2)
+
+        pdf_path = first_act.pdf_file.path
+        first_act.delete()
+        self.assertTrue(os.path.exists(pdf_path))
+        second_act.delete()
+        self.assertFalse(os.path.exists(pdf_path))
+        self.assertFalse(GeneratedArtifact.objects.exists())
+
+    def test_generate_records_stage_metrics_for_admin_summary(self):
+        from unittest import mock
+        from core.models import GenerationMetric
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes', _fake_convert_to_pdf_bytes):
+            response = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+            self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        metric = GenerationMetric.objects.get(act_id=response.data['id'])
+        self.assertFalse(metric.reused)
+        for name in ('template_load', 'substitute', 'save', 'zip', 'storage'):
+            self.assertIn(name, metric.stages)
+        self.assertGreater(metric.sizes['docx'], 0)
+        self.assertGreaterEqual(metric.total_ms, sum(metric.stages.values()) - 1)
+        self.assertEqual(GenerationMetric.objects.filter(reused=True).count(), 1)
+
+        self.assertEqual(self.client.get('/api/generation-metrics/summary/').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        summary = self.client.get('/api/generation-metrics/summary/').data['results']
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]['template_name'], 'act7_bg.docx')
+        self.assertEqual(summary[0]['count'], 1)
+        self.assertIn('p95', summary[0]['stages']['substitute'])
+
+    def test_regenerate_rebuilds_only_changed_outputs(self):
+        import json
+        import zipfile
+        from unittest import mock
+        from core.models import Act
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes', _fake_convert_to_pdf_bytes):
+            created = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+            twin = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+            act = Act.objects.get(pk=created.data['id'])
+            names = (act.docx_file.name, act.pdf_file.name, act.zip_file.name)
+            with act.docx_file.open('rb') as f:
+                docx_before = f.read()
+
+            # concrete_class is not shown in the act 7 template: only the ZIP snapshot changes
+            response = self.client.post(f'/api/acts/{act.id}/regenerate/', {'concrete_class': 'C25/30'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['rebuilt'], ['zip'])
+            act.refresh_from_db()
+            with act.docx_file.open('rb') as f:
+                self.assertEqual(f.read(), docx_before)
+            with zipfile.ZipFile(act.zip_file.path) as zf:
+                self.assertEqual(json.loads(zf.read('context.json'))['concrete_class'], 'C25/30')
+            self.assertNotEqual(act.zip_file.name, names[2])
+
+            # the twin still has the files both acts shared
+            twin_act = Act.objects.get(pk=twin.data['id'])
+            self.assertEqual(twin_act.zip_file.name, names[2])
+            self.assertTrue(twin_act.artifact.zip_file.storage.exists(names[2]))
+
+            own_names = (act.docx_file.name, act.pdf_file.name, act.zip_file.name)
+            response = self.client.post(f'/api/acts/{act.id}/regenerate/',
+                                        {'work_description': 'Кофраж и армировка'}, format='json')
+            self.assertEqual(response.data['rebuilt'], ['docx', 'pdf', 'zip'])
+            act.refresh_from_db()
+            self.assertEqual((act.docx_file.name, act.pdf_file.name, act.zip_file.name), own_names)
+            self.assertEqual(act.artifact.ref_count, 1)
+
+
+            response = self.client.post(f'/api/acts/{act.id}/regenerate/', {}, format='json')
+            self.assertEqual(response.data['rebuilt'], [])
+
+            # a failed in-place write keeps the previous files
+            with act.docx_file.open('rb') as f:
+                docx_before = f.read()
+            with mock.patch('core.utils.generation.os.replace', side_effect=OSError('disk full')):
+                response = self.client.post(f'/api/acts/{act.id}/regenerate/',
+                                            {'work_description': 'Покрив'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            with act.docx_file.open('rb') as f:
+                self.assertEqual(f.read(), docx_before)
+            self.assertFalse([n for n in os.listdir(os.path.dirname(act.docx_file.path)) if n.endswith('.tmp')])
+
+    def test_preview_renders_in_memory_and_caches(self):
+        from django.core.cache import cache
+        from core.models import Act, GenerationMetric
+
+        cache.clear()
+        payload = dict(self._act_payload(), work_description='Кофраж <и> армировка')
+        response = self.client.post('/api/acts/preview/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Кофраж &lt;и&gt; армировка', response.data['html'])
+        self.assertIn('Жилищна сграда', response.data['html'])
+        self.assertFalse(response.data['cached'])
+        self.assertIn('execution', response.data['missing_fields'])
+
+        again = self.client.post('/api/acts/preview/', payload, format='json')
+        self.assertTrue(again.data['cached'])
+        self.assertEqual(again.data['html'], response.data['html'])
+        self.assertFalse(Act.objects.exists())
+        self.assertFalse(GenerationMetric.objects.exists())
+        self.assertEqual(os.listdir(self.media_dir), [])
+
+    def test_preview_emits_nested_tables_once(self):
+        from docx import Document
+        from core.utils.preview import docx_to_html
+
+        doc = Document()
+        outer = doc.add_table(rows=1, cols=2)
+        outer.cell(0, 0).paragraphs[0].add_run('Отвън')
+        inner = outer.cell(0, 1).add_table(rows=2, cols=1)
+        inner.cell(0, 0).paragraphs[0].add_run('Вътре 1')
+        inner.cell(1, 0).paragraphs[0].add_run('Вътре 2')
+        buf = io.BytesIO()
+        doc.save(buf)
+
+        html = docx_to_html(buf.getvalue())
+        self.assertEqual(html.count('Вътре 1'), 1)
+        self.assertEqual(html.count('<tr>'), 3)
+        self.assertIn('<td><p>&nbsp;</p><table><tr><td><p>Вътре 1</p>', html)
+
+    def test_native_pdf_defers_docx_until_download(self):
+        from unittest import mock
+        from core.models import Act
+
+        with mock.patch('core.utils.generation.convert_to_pdf_bytes') as convert, \
+                self.settings(NATIVE_ACT_PDF_TYPES=['act7']):
+            response = self.client.post('/api/acts/generate/', self._act_payload(), format='json')
+            convert.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        act = Act.objects.get(pk=response.data['id'])
+        self.assertFalse(act.docx_file)
+        with act.pdf_file.open('rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+        self.assertIn(f'/api/acts/{act.id}/download/?file=docx', response.data['docx_url'])
+
+        download = self.client.get(f'/api/acts/{act.id}/download/?file=docx')
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'PK'))
+        act.refresh_from_db()
+        self.assertTrue(act.docx_file)
+        self.assertTrue(act.zip_file)
+
+        # an act edited without `regenerate` gets files matching its new fields,
+        # and the artifact it shared keeps the files of the old ones
+        from core.utils.generation import stored_context
+        payload = dict(self._act_payload(), level_to='+6.00')
+        with self.settings(NATIVE_ACT_PDF_TYPES=['act7']):
+            first, edited = (Act.objects.get(pk=self.client.post('/api/acts/generate/', payload, format='json').data['id'])
+                             for _ in range(2))
+            self.assertEqual(first.artifact_id, edited.artifact_id)
+            self.client.patch(f'/api/acts/{edited.id}/', {'level_to': '+9.00'}, format='json')
+            self.assertEqual(self.client.get(f'/api/acts/{edited.id}/download/?file=zip').status_code,
+                             status.HTTP_200_OK)
+            self.assertEqual(self.client.get(f'/api/acts/{first.id}/download/?file=zip').status_code,
+                             status.HTTP_200_OK)
+        first.refresh_from_db()
+        edited.refresh_from_db()
+        self.assertNotEqual(first.artifact_id, edited.artifact_id)
+        self.assertNotEqual(first.pdf_file.name, edited.pdf_file.name)
+        self.assertEqual(stored_context(edited)['level_to'], '+9.00')
+        self.assertEqual(stored_context(first)['level_to'], '+6.00')
+
+    def test_template_upload_records_placeholder_inventory(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from core.models import DocumentTemplate
+
+        with open(os.path.join(os.path.dirname(__file__), '..', 'media', 'templates', 'act7_bg.docx'), 'rb') as f:
+            upload = SimpleUploadedFile('act7_upload.docx', f.read())
+        response = self.client.post('/api/templates/', {
+            'name': 'Act 7', 'template_type': 'act7', 'default_content': '{}', 'is_active': True,
+            'template_file': upload,
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('level_from', response.data['placeholders']['keys'])
+
+        template = DocumentTemplate.objects.get(pk=response.data['id'])
+        fields = self.client.get(f'/api/templates/{template.id}/fields/')
+        self.assertEqual(fields.data['keys'], template.placeholders['keys'])
+        self.assertTrue(all(slot['location'] in ('body', 'table') for slot in fields.data['slots']))
+
+        strict = self.client.post('/api/documents/generate/', {
+            'template_name': 'act7_bg.docx', 'context': {'project_name': 'X'}, 'strict': True
+        }, format='json')
+        self.assertEqual(strict.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('level_from', strict.data['missing_fields'])
+
+    def test_failed_job_records_error(self):
+        from django.core.management import call_command
+        from core.models import GenerationJob
+
+        response = self.client.post('/api/documents/generate/', {
+            'template_name': 'act7_bg.docx', 'context': {}, 'async': True
+        }, format='json')
+        job = GenerationJob.objects.get(pk=response.data['id'])
+        job.payload = {'template_name': 'missing.docx'}
+        job.save()
+
+        call_command('run_generation_worker', '--once', '--concurrency', '1', stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('missing.docx', job.error)
+        self.assertIsNone(job.document_id)
+
+
+class BudgetTotalsTests(TestCase):
+    def setUp(self):
+        from decimal import Decimal
+        from core.models import Project, ProjectBudget, BudgetExpense
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='accountant', password='testpass123'))
+        self.budgets = []
+        for i, currency in enumerate(('EUR', 'BGN')):
+            project = Project.objects.create(name=f'Сграда {i}')
+            budget = ProjectBudget.objects.create(project=project, initial_budget=Decimal('100.00'), currency=currency)
+            for amount, expense_currency, category in (('100.00', 'BGN', 'labor'), ('50.50', 'EUR', 'materials'),
+                                                       ('19.60', 'BGN', 'labor')):
+                BudgetExpense.objects.create(budget=budget, category=category, amount=Decimal(amount),
+                                             expense_currency=expense_currency)
+            self.budgets.append(budget)
+
+    def test_totals_match_per_row_conversion_in_one_query(self):
+        from decimal import Decimal
+        from core.models import ProjectBudget
+
+        rate = Decimal('1.96')
+        expected = {
+            'EUR': Decimal('100.00') / rate + Decimal('50.50') + Decimal('19.60') / rate,
+            'BGN': Decimal('100.00') + Decimal('50.50') * rate + Decimal('19.60'),
+        }
+        for budget in self.budgets:
+            budget = ProjectBudget.objects.get(pk=budget.pk)
+            with self.assertNumQueries(1):
+                total = budget.total_expenses
+                self.assertEqual(budget.remaining_budget, budget.initial_budget - total)
+                self.assertEqual(budget.is_over_budget, total > budget.initial_budget)
+                budget.budget_usage_percentage
+            self.assertAlmostEqual(total, expected[budget.currency], places=6)
+            annotated = ProjectBudget.objects.with_totals().get(pk=budget.pk)
+            self.assertAlmostEqual(annotated.total_expenses, expected[budget.currency], places=6)
+
+    def test_budget_list_query_count_does_not_grow_with_expenses(self):
+        from decimal import Decimal
+        from core.models import BudgetExpense
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/budgets/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for budget in self.budgets:
+            for _ in range(5):
+                BudgetExpense.objects.create(budget=budget, category='other', amount=Decimal('1.00'))
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/budgets/')
+        totals = {b['currency']: Decimal(b['total_expenses']) for b in response.data['results']}
+        self.assertEqual(totals['BGN'], Decimal('223.58'))
+
+        summary = self.client.get(f'/api/budgets/{self.budgets[1].pk}/summary/').data
+        labor = next(c for c in summary['category_breakdown'] if c['category'] == 'labor')
+        self.assertEqual((labor['total'], labor['count']), (119.6, 2))
+
+    def test_rollups_follow_expense_changes_and_rebuild(self):
+        from decimal import Decimal
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from core.models import BudgetExpense, BudgetRollup, ProjectBudget
+
+        budget = self.budgets[1]
+        expense = budget.expenses.get(amount=Decimal('19.60'))
+        expense.category = 'transport'
+        expense.amount = Decimal('20.00')
+        expense.save()
+        budget.expenses.get(amount=Decimal('50.50')).delete()
+        rollups = {(r.category, r.currency): (r.total, r.count) for r in budget.rollups.all()}
+        self.assertEqual(rollups, {('labor', 'BGN'): (Decimal('100.00'), 1),
+                                   ('transport', 'BGN'): (Decimal('20.00'), 1)})
+        self.assertEqual(budget.rollups.count(), 2)
+        self.assertEqual(ProjectBudget.objects.get(pk=budget.pk).total_expenses, Decimal('120.00'))
+        call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+
+        BudgetExpense.objects.filter(budget=budget).update(amount=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+        call_command('rebuild_budget_rollups', '--budget', str(budget.pk), stdout=io.StringIO())
+        call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+        self.assertEqual(ProjectBudget.objects.get(pk=budget.pk).total_expenses, Decimal('2.00'))
+
+        budget.delete()
+        self.assertFalse(BudgetRollup.objects.filter(budget_id=budget.pk).exists())
+
+    def test_conversions_use_the_rate_of_the_expense_date(self):
+        import datetime
+        from decimal import Decimal
+        from django.core.management import call_command
+        from core.models import BudgetExpense, CurrencyRate, ProjectBudget
+        from django.db.models import Sum, Value
+        from core.models.budget import converted_expense_amount
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.create(currency='EUR', rate=Decimal('2.00'), date=datetime.date(2026, 1, 1))
+        budget = self.budgets[1]
+        budget.expenses.all().delete()
+        for day in (datetime.date(2025, 6, 1), datetime.date(2026, 2, 1)):
+            BudgetExpense.objects.create(budget=budget, category='materials', amount=Decimal('10.00'),
+                                         expense_currency='EUR', date=day)
+        for day in (datetime.date(2026, 2, 1), datetime.date(2026, 3, 1)):
+            BudgetExpense.objects.create(budget=budget, category='labor', amount=Decimal('10.00'), date=day)
+        expected = Decimal('10.00') * Decimal('1.96') + Decimal('10.00') * Decimal('2.00') + Decimal('20.00')
+        # one rollup per rate period, not per expense date
+        self.assertEqual(sorted(budget.rollups.values_list('currency', 'period')),
+                         [('BGN', datetime.date(2026, 1, 1)), ('EUR', datetime.date(1999, 1, 1)),
+                          ('EUR', datetime.date(2026, 1, 1))])
+
+        self.assertAlmostEqual(ProjectBudget.objects.get(pk=budget.pk).total_expenses, expected, places=6)
+        self.assertAlmostEqual(ProjectBudget.objects.with_totals().get(pk=budget.pk).total_expenses, expected, places=6)
+        in_sql = budget.expenses.aggregate(total=Sum(converted_expense_amount(Value('BGN'))))['total']
+        self.assertAlmostEqual(in_sql, expected, places=6)
+        call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+
+        with self.assertNumQueries(1):
+            rates = CurrencyRate.table(['EUR'])
+        rows = budget.expenses.values_list('amount', 'expense_currency', 'date')
+        self.assertAlmostEqual(sum(rates.convert_many(rows, 'BGN')), expected, places=6)
+        self.assertAlmostEqual(sum(rates.convert_many(rows, 'EUR')),
+                               Decimal('20.00') + Decimal('20.00') / Decimal('2.00'), places=6)
+        self.assertEqual(rates.rate('EUR', datetime.date(1990, 1, 1)), Decimal('1.96'))
+
+        response = self.client.post('/api/currency-rates/', {'currency': 'EUR', 'rate': '2.10', 'date': '2026-03-01'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(len(self.client.get('/api/currency-rates/?currency=eur').data['results']), 2)
+
+        # a back-dated rate splits a period; only the periods around it are regrouped on commit
+        later = budget.rollups.filter(period__gte=datetime.date(2026, 1, 1))
+        untouched = set(later.values_list('pk', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.create(currency='EUR', rate=Decimal('1.90'), date=datetime.date(2025, 1, 1))
+        call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+        self.assertEqual(set(later.values_list('pk', flat=True)), untouched)
+        self.assertAlmostEqual(ProjectBudget.objects.get(pk=budget.pk).total_expenses,
+                               expected - Decimal('10.00') * Decimal('0.06'), places=6)
+        # removing it merges them again
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.get(date=datetime.date(2025, 1, 1)).delete()
+        call_command('rebuild_budget_rollups', '--verify', stdout=io.StringIO())
+        self.assertEqual(set(later.values_list('pk', flat=True)), untouched)
+        self.assertAlmostEqual(ProjectBudget.objects.get(pk=budget.pk).total_expenses, expected, places=6)
+
+    def test_currencies_without_rates_are_rejected_and_reported(self):
+        from decimal import Decimal
+        from core.models import ProjectBudget, Project
+        from core.models.currency import CurrencyRate, MissingRateError
+
+        response = self.client.post('/api/budgets/', {
+            'project': Project.objects.create(name='Склад').id, 'initial_budget': '10.00', 'currency': 'usd'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('currency', response.data)
+
+        ProjectBudget.objects.filter(pk=self.budgets[0].pk).update(currency='USD')
+        with self.assertLogs('core.models.currency', 'WARNING'):
+            summary = self.client.get(f'/api/budgets/{self.budgets[0].pk}/summary/').data
+        self.assertEqual(summary['missing_rates'], ['USD'])
+        self.assertEqual(summary['category_breakdown'], [])
+        self.assertEqual(ProjectBudget.objects.get(pk=self.budgets[0].pk).total_expenses, Decimal('0'))
+        with self.assertRaises(MissingRateError):
+            CurrencyRate.table().convert(Decimal('1'), 'USD', 'BGN')
+
+        # expenses need a rate too, and the last rate of a currency in use cannot be removed
+        response = self.client.post('/api/expenses/', {
+            'budget': self.budgets[1].pk, 'category': 'labor', 'amount': '1.00', 'expense_currency': 'USD'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expense_currency', response.data)
+        self.client.force_authenticate(user=User.objects.create_user(username='admin', password='x', is_staff=True))
+        eur = CurrencyRate.objects.get(currency='EUR')
+        response = self.client.patch(f'/api/currency-rates/{eur.pk}/', {'currency': 'CHF'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(f'/api/currency-rates/{eur.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(CurrencyRate.objects.filter(pk=eur.pk).exists())
+
+    def test_dashboard_aggregates_into_a_snapshot_served_until_stale(self):
+        from datetime import timedelta
+        from decimal import Decimal
+        from django.core.management import call_command
+        from django.utils import timezone
+        from core.models import BudgetExpense, DashboardSnapshot, Task
+
+        Task.objects.create(project=self.budgets[0].project, title='Кофраж', status='completed')
+        call_command('refresh_dashboard', stdout=io.StringIO())
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/analytics/dashboard/').data
+        rate = Decimal('1.96')
+        spent = 2 * (Decimal('100.00') + Decimal('50.50') * rate + Decimal('19.60'))
+        self.assertAlmostEqual(data['budget']['total_budget'], float(Decimal('100.00') * rate + Decimal('100.00')))
+        self.assertAlmostEqual(data['budget']['total_spent'], float(spent))
+        self.assertEqual(data['budget']['over_budget_projects'], 2)
+        self.assertEqual((data['projects']['total'], data['tasks']['completed']), (2, 1))
+        top = data['top_expense_categories']
+        self.assertEqual(len(top), 4)
+        self.assertEqual(top[0]['category'], 'labor')
+        self.assertAlmostEqual(top[0]['total'], 119.6)
+        self.assertEqual(len(data['projects']['recent']), 2)
+
+        # changes show up with the next refresh; ?fresh=1 is only honoured for admins
+        BudgetExpense.objects.create(budget=self.budgets[1], category='permits', amount=Decimal('5.00'))
+        self.assertEqual(self.client.get('/api/analytics/dashboard/?fresh=1').data, data)
+        admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        fresh = self.client.get('/api/analytics/dashboard/?fresh=1').data
+        self.assertAlmostEqual(fresh['budget']['total_spent'], float(spent + Decimal('5.00')))
+        self.assertGreater(fresh['generated_at'], data['generated_at'])
+
+        self.assertFalse(fresh['stale'])
+
+        # requests never recompute an existing snapshot: an old one is served flagged as stale
+        BudgetExpense.objects.create(budget=self.budgets[1], category='permits', amount=Decimal('1.00'))
+        DashboardSnapshot.objects.update(generated_at=timezone.now() - timedelta(minutes=10))
+        with self.settings(ANALYTICS_DASHBOARD_MAX_AGE_SECONDS=300), self.assertNumQueries(1):
+            old = self.client.get('/api/analytics/dashboard/').data
+        self.assertTrue(old['stale'])
+        self.assertAlmostEqual(old['budget']['total_spent'], float(spent + Decimal('5.00')))
+        call_command('refresh_dashboard', stdout=io.StringIO())
+        refreshed = self.client.get('/api/analytics/dashboard/').data
+        self.assertFalse(refreshed['stale'])
+        self.assertAlmostEqual(refreshed['budget']['total_spent'], float(spent + Decimal('6.00')))
+
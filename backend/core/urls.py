@@ -7,11 +7,14 @@ from .views import (
     TeamViewSet,
     ProjectDocumentViewSet,
     ActViewSet,
+    GenerationJobViewSet,
+    GenerationMetricViewSet,
     ActivityLogViewSet,
     UserViewSet,
     upcoming_tasks_view,
     ProjectBudgetViewSet,
     BudgetExpenseViewSet,
+    CurrencyRateViewSet,
     DocumentTemplateViewSet,
     TextSnippetViewSet,
     WeatherLogViewSet,
@@ -37,9 +40,12 @@ router.register(r'tasks', TaskViewSet, basename='task')
 router.register(r'teams', TeamViewSet, basename='team')
 router.register(r'project-documents', ProjectDocumentViewSet, basename='project-document')
 router.register(r'acts', ActViewSet, basename='act')
+router.register(r'generation-jobs', GenerationJobViewSet, basename='generation-job')
+router.register(r'generation-metrics', GenerationMetricViewSet, basename='generation-metric')
 router.register(r'activity-logs', ActivityLogViewSet, basename='activity-log')
 router.register(r'budgets', ProjectBudgetViewSet, basename='budget')
 router.register(r'expenses', BudgetExpenseViewSet, basename='expense')
+router.register(r'currency-rates', CurrencyRateViewSet, basename='currency-rate')
 router.register(r'templates', DocumentTemplateViewSet, basename='template')
 router.register(r'snippets', TextSnippetViewSet, basename='snippet')
 router.register(r'weather', WeatherLogViewSet, basename='weather')
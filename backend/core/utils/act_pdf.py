@@ -0,0 +1,221 @@
+"""
+Native PDF rendering for Acts 7, 14 and 15.
+
+Each act is laid out with ReportLab flowables straight from its context, so
+no office converter is involved. The layout is read from the act's DOCX
+template (act7/14/15_bg.docx): its paragraphs and tables in document order,
+with their wording, placeholders, alignment, bold and font size. A template
+edit therefore changes the native PDF too. Act types listed in
+NATIVE_ACT_PDF_TYPES use this path (see core.utils.generation).
+"""
+import threading
+from io import BytesIO
+from xml.sax.saxutils import escape
+from django.conf import settings
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph as DocxParagraph
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from .document_generator import enrich_context, get_numeric_map, get_template_path
+from .fonts import get_default_font, get_bold_font
+from .substitution import TOKEN_PATTERN, build_token_lookup, resolve_token
+from .template_cache import get_compiled_template
+
+NATIVE_ACT_TYPES = ('act7', 'act14', 'act15')
+
+# Font size of template text that does not set one
+DEFAULT_FONT_SIZE = 11
+
+LEFT_MARGIN = 2.5 * cm
+RIGHT_MARGIN = 2 * cm
+
+_ALIGNMENTS = {
+    WD_ALIGN_PARAGRAPH.CENTER: TA_CENTER,
+    WD_ALIGN_PARAGRAPH.RIGHT: TA_RIGHT,
+    WD_ALIGN_PARAGRAPH.JUSTIFY: TA_JUSTIFY,
+}
+
+_W_P = qn('w:p')
+_W_TBL = qn('w:tbl')
+_W_TR = qn('w:tr')
+_W_TC = qn('w:tc')
+_W_TC_PR = qn('w:tcPr')
+_W_GRID_SPAN = qn('w:gridSpan')
+_W_GRID_COL = qn('w:gridCol')
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+_styles = {}
+_styles_lock = threading.Lock()
+
+
+def get_template_name(act_type):
+    """The DOCX template of `act_type`, as in Act.get_template_name()."""
+    return f'{act_type}_bg.docx'
+
+
+def _paragraph_block(paragraph):
+    text = paragraph.text.replace('\t', '    ')
+    if not text.strip():
+        return ('space', None)
+    runs = [run for run in paragraph.runs if run.text.strip()]
+    bold = bool(runs) and all(run.bold for run in runs)
+    sizes = [run.font.size.pt for run in runs if run.font.size]
+    style = (_ALIGNMENTS.get(paragraph.alignment, TA_LEFT), bold, max(sizes) if sizes else DEFAULT_FONT_SIZE)
+    return ('paragraph', (style, text.strip()))
+
+
+def _table_block(tbl, doc):
+    """Cell texts on the table's grid, with the grid column widths and merged-cell spans."""
+    widths = [int(col.get(qn('w:w')) or 0) for col in tbl.iter(_W_GRID_COL)]
+    rows, spans = [], []
+    for r, tr in enumerate(tbl.iterchildren(_W_TR)):
+        row, column = [], 0
+        for tc in tr.iterchildren(_W_TC):
+            span = tc.find(f'{_W_TC_PR}/{_W_GRID_SPAN}')
+            span = int(span.get(qn('w:val'))) if span is not None else 1
+            row.append('\n'.join(
+                DocxParagraph(p, doc._body).text.replace('\t', '    ') for p in tc.iter(_W_P)
+            ).strip())
+            row.extend([''] * (span - 1))
+            if span > 1:
+                spans.append(((column, r), (column + span - 1, r)))
+            column += span
+        rows.append(row)
+    width = max([len(widths)] + [len(row) for row in rows])
+    widths += [0] * (width - len(widths))
+    return ('table', {
+        'rows': [row + [''] * (width - len(row)) for row in rows],
+        'widths': widths,
+        'spans': spans,
+    })
+
+
+def build_layout(compiled):
+    """
+    Layout blocks of a compiled DOCX template, in document order:
+    ('paragraph', ((alignment, bold, size), text)), ('space', None) for a
+    run of empty paragraphs and ('table', {'rows', 'widths', 'spans'}).
+    Texts keep the template's `{{key}}`/`*N*` tokens.
+    """
+    doc = compiled.load()
+    blocks = []
+    for child in doc.element.body.iterchildren():
+        if child.tag == _W_P:
+            block = _paragraph_block(DocxParagraph(child, doc._body))
+        elif child.tag == _W_TBL:
+            block = _table_block(child, doc)
+        else:
+            continue
+        if block[0] == 'space' and (not blocks or blocks[-1][0] == 'space'):
+            continue
+        blocks.append(block)
+    return blocks
+
+
+def get_layout(act_type):
+    """`build_layout` of the act's template, cached per template version."""
+    compiled = get_compiled_template(get_template_path(get_template_name(act_type)))
+    with _layouts_lock:
+        cached = _layouts.get(act_type)
+        if cached is None or cached[0] != compiled.sha256:
+            cached = _layouts[act_type] = (compiled.sha256, build_layout(compiled))
+        return cached[1]
+
+
+def get_style(alignment, bold, size):
+    """Paragraph style for template text, built once per process and combination."""
+    key = (alignment, bold, size)
+    with _styles_lock:
+        if key not in _styles:
+            _styles[key] = ParagraphStyle(
+                f'act-{alignment}-{int(bold)}-{size}',
+                fontName=get_bold_font() if bold else get_default_font(),
+                fontSize=size,
+                leading=size * 1.35,
+                spaceAfter=2,
+                alignment=alignment,
+            )
+        return _styles[key]
+
+
+def supports_native_pdf(act_type):
+    """True when `act_type` is configured to skip the DOCX -> PDF converter."""
+    return act_type in NATIVE_ACT_TYPES and act_type in getattr(settings, 'NATIVE_ACT_PDF_TYPES', ())
+
+
+def layout_tokens(act_type):
+    """Every `{{key}}`/`*N*` token the native layout of `act_type` fills in."""
+    tokens = set()
+    for kind, content in get_layout(act_type):
+        if kind == 'paragraph':
+            tokens.update(TOKEN_PATTERN.findall(content[1]))
+        elif kind == 'table':
+            for row in content['rows']:
+                for text in row:
+                    tokens.update(TOKEN_PATTERN.findall(text))
+    return tokens
+
+
+def _column_widths(widths, frame_width):
+    """Template grid widths scaled to `frame_width`; equal columns when the template has none."""
+    total = sum(widths)
+    if not total:
+        return [frame_width / len(widths)] * len(widths) if widths else None
+    return [frame_width * width / total for width in widths]
+
+
+def _fill(text, lookup):
+    return TOKEN_PATTERN.sub(lambda m: resolve_token(m.group(0), lookup), text)
+
+
+def _markup(text):
+    return escape(text).replace('\n', '<br/>')
+
+
+def render_act_pdf(act_type, context):
+    """Lay out the act `act_type` for `context` and return the PDF bytes."""
+    if act_type not in NATIVE_ACT_TYPES:
+        raise ValueError(f'No native PDF layout for {act_type}')
+
+    enriched = enrich_context(context)
+    lookup = build_token_lookup(enriched, get_numeric_map(enriched))
+    cell_style = get_style(TA_LEFT, False, DEFAULT_FONT_SIZE - 1)
+    frame_width = A4[0] - LEFT_MARGIN - RIGHT_MARGIN
+
+    flowables = []
+    for kind, content in get_layout(act_type):
+        if kind == 'space':
+            flowables.append(Spacer(1, 10))
+        elif kind == 'table':
+            table = Table([
+                [Paragraph(_markup(_fill(text, lookup)), cell_style) for text in row]
+                for row in content['rows']
+            ], colWidths=_column_widths(content['widths'], frame_width))
+            table.setStyle(TableStyle(
+                [('VALIGN', (0, 0), (-1, -1), 'TOP'), ('LEFTPADDING', (0, 0), (-1, -1), 2),
+                 ('RIGHTPADDING', (0, 0), (-1, -1), 2)]
+                + [('SPAN', start, end) for start, end in content['spans']]
+            ))
+            flowables.append(table)
+        else:
+            style, text = content
+            text = _fill(text, lookup)
+            if text.strip():
+                flowables.append(Paragraph(_markup(text), get_style(*style)))
+
+    buf = BytesIO()
+    SimpleDocTemplate(
+        buf,
+        pagesize=A4,
+        leftMargin=LEFT_MARGIN,
+        rightMargin=RIGHT_MARGIN,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm,
+        title=act_type,
+    ).build(flowables)
+    return buf.getvalue()
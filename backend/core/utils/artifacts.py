@@ -0,0 +1,45 @@
+"""
+Content keys for generated artifacts, so identical renders are stored once.
+"""
+import os
+import json
+import hashlib
+from .document_generator import get_template_path
+from .template_cache import get_compiled_template
+
+
+def normalize_context(context):
+    """
+    Reduce a context to what affects the rendered output: None and '' render
+    the same, and scalar values are rendered through str().
+    """
+    normalized = {}
+    for key, value in (context or {}).items():
+        if value is None:
+            normalized[key] = ''
+        elif isinstance(value, (dict, list, tuple)):
+            normalized[key] = value
+        else:
+            normalized[key] = str(value)
+    return normalized
+
+
+def compute_artifact_key(template_name, context, signatures=None, renderer=None):
+    """
+    SHA-256 over the template file hash, the normalized context and the
+    signature inputs. `renderer` tells apart PDFs laid out natively from
+    converted ones.
+    """
+    template_path = get_template_path(template_name)
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f'Template {template_name} not found at {template_path}')
+    key_data = {
+        'template': template_name,
+        'template_sha256': get_compiled_template(template_path).sha256,
+        'context': normalize_context(context),
+        'signatures': signatures or None,
+    }
+    if renderer:
+        key_data['renderer'] = renderer
+    payload = json.dumps(key_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
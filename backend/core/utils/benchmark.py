@@ -0,0 +1,191 @@
+"""
+Rendering benchmarks for Acts 7, 14 and 15 (`manage.py benchmark_generation`).
+
+Every case renders one act from media/templates with a synthetic context:
+the DOCX path (`generate_document`), the native PDF layout, the PDF
+overlay path (`fill_pdf_template`, for templates shipped with a `.pdf` and
+a `_fields.json` mapping) and ZIP packaging. Contexts are generated from
+each template's placeholder inventory, with free-text fields scaled by
+size, so results are repeatable between runs. Memory is reported per case
+as the peak of Python allocations during one extra traced run
+(`peak_alloc_mb`); `process_peak_rss_mb` is the process-wide RSS peak so
+far, which only grows from case to case.
+"""
+import os
+import sys
+import time
+import random
+import platform
+import tempfile
+import tracemalloc
+from io import BytesIO
+from django.conf import settings
+from django.utils import timezone
+from .act_pdf import NATIVE_ACT_TYPES, render_act_pdf
+from .document_generator import generate_document, get_template_path
+from .generation import build_act_zip
+from .pdf_overlay import fill_pdf_template
+from .template_cache import get_compiled_template
+from .timing import percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ACT_TYPES = ('act7', 'act14', 'act15')
+CASES = ('docx', 'native_pdf', 'pdf_overlay', 'zip')
+
+# Sentences of free text per long field, by context size.
+CONTEXT_SIZES = {'small': 1, 'medium': 8, 'large': 60}
+
+# Placeholders whose names contain one of these hold free text.
+LONG_FIELD_HINTS = (
+    'description', 'findings', 'condition', 'execution', 'documents', 'documentation',
+    'protocols', 'conclusion', 'notes', 'work', 'projects', 'contracts', 'acts',
+)
+
+WORDS = (
+    'бетон', 'кофраж', 'армировка', 'плоча', 'колона', 'греда', 'фундамент', 'ниво',
+    'изпълнение', 'проект', 'стоманобетонна', 'конструкция', 'съгласно', 'одобрените',
+    'чертежи', 'заповедната', 'книга', 'строителен', 'надзор', 'протокол',
+)
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def synthetic_context(act_type, size='medium', seed=0):
+    """A context filling every placeholder of the act's template; deterministic per seed."""
+    rng = random.Random(f'{act_type}:{size}:{seed}')
+    sentences = CONTEXT_SIZES[size]
+    keys = set(get_compiled_template(get_template_path(f'{act_type}_bg.docx')).keys)
+
+    context = {}
+    for key in sorted(keys):
+        if any(hint in key for hint in LONG_FIELD_HINTS):
+            context[key] = ' '.join(_sentence(rng) for _ in range(sentences))
+        elif 'date' in key:
+            context[key] = f'{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2026'
+        else:
+            context[key] = ' '.join(rng.choice(WORDS) for _ in range(3)).title()
+    return context
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MiB over its whole life, or
+    None where unsupported.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _overlay_files(act_type):
+    pdf_path = get_template_path(f'{act_type}_bg.pdf')
+    mapping_path = get_template_path(f'{act_type}_bg_fields.json')
+    if os.path.exists(pdf_path) and os.path.exists(mapping_path):
+        return pdf_path, mapping_path
+    return None
+
+
+def build_case(case, act_type, context):
+    """A zero-argument callable running `case` once, or None if it does not apply."""
+    template_name = f'{act_type}_bg.docx'
+    if case == 'docx':
+        def run():
+            generate_document(template_name, context, BytesIO())
+        return run
+    if case == 'native_pdf':
+        return (lambda: render_act_pdf(act_type, context)) if act_type in NATIVE_ACT_TYPES else None
+    if case == 'pdf_overlay':
+        files = _overlay_files(act_type)
+        if files is None:
+            return None
+        pdf_path, mapping_path = files
+        output = os.path.join(tempfile.gettempdir(), f'benchmark_{os.getpid()}_{act_type}.pdf')
+        return lambda: fill_pdf_template(pdf_path, output, context, mapping_path)
+    if case == 'zip':
+        buf = BytesIO()
+        generate_document(template_name, context, buf)
+        docx_bytes = buf.getvalue()
+        pdf_bytes = render_act_pdf(act_type, context)
+        return lambda: build_act_zip(f'{act_type}_benchmark', docx_bytes, pdf_bytes, context)
+    raise ValueError(f'Unknown benchmark case: {case}')
+
+
+def time_case(run, iterations, warmup=1):
+    """
+    Run `run` `warmup` times untimed, once traced for memory, then
+    `iterations` times timed; returns the stats dict.
+    """
+    for _ in range(warmup):
+        run()
+    # traced separately: tracemalloc slows down the allocations it records
+    tracemalloc.start()
+    try:
+        run()
+        peak_alloc = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    total = sum(timings) / 1000
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 2) if total else None,
+        'mean_ms': round(sum(timings) / iterations, 3),
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'max_ms': round(timings[-1], 3),
+        'peak_alloc_mb': round(peak_alloc / (1024 * 1024), 2),
+        'process_peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_benchmarks(act_types=ACT_TYPES, sizes=tuple(CONTEXT_SIZES), cases=CASES,
+                   iterations=20, warmup=1, progress=None):
+    """Run every applicable (case, act, size) combination and return the report dict."""
+    results = []
+    for case in cases:
+        for act_type in act_types:
+            for size in sizes:
+                run = build_case(case, act_type, synthetic_context(act_type, size))
+                if run is None:
+                    continue
+                result = {'case': case, 'act_type': act_type, 'size': size}
+                result.update(time_case(run, iterations, warmup))
+                results.append(result)
+                if progress:
+                    progress(result)
+    return {
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'render_mode': getattr(settings, 'DOCUMENT_RENDER_MODE', 'dom'),
+        'results': results,
+    }
+
+
+def compare_reports(previous, current):
+    """
+    (case, act_type, size, previous p50, current p50, change %) for every
+    combination present in both reports.
+    """
+    before = {(r['case'], r['act_type'], r['size']): r for r in previous.get('results', [])}
+    rows = []
+    for r in current['results']:
+        old = before.get((r['case'], r['act_type'], r['size']))
+        if old and old.get('p50_ms'):
+            change = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            rows.append((r['case'], r['act_type'], r['size'], old['p50_ms'], r['p50_ms'], round(change, 1)))
+    return rows
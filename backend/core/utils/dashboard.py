@@ -0,0 +1,141 @@
+"""
+Company-wide analytics for the dashboard (`analytics/dashboard/`).
+
+Everything is computed with grouped aggregate queries (budget figures come
+from the BudgetRollup table and are normalized to BGN in SQL), so the cost
+does not grow with the number of expenses. The payload is stored as a
+DashboardSnapshot, refreshed by `manage.py refresh_dashboard` (a Procfile
+process), and is fresh while it is from today, younger than
+ANALYTICS_DASHBOARD_MAX_AGE_SECONDS. Requests only read it: an older snapshot
+is still served (flagged `stale`), and only a missing one is computed inline.
+"""
+import json
+import logging
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Project, Task, ProjectBudget, BudgetRollup, DashboardSnapshot
+from ..models.budget import converted_rollup_total
+from ..models.currency import AMOUNT_FIELD, converted_amount, missing_rates
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_SNAPSHOT = 'analytics'
+DASHBOARD_CURRENCY = 'BGN'
+
+
+def _sum(expression):
+    return Coalesce(Sum(expression), Value(Decimal('0')), output_field=AMOUNT_FIELD)
+
+
+def build_dashboard():
+    """Compute the dashboard payload."""
+    today = timezone.now().date()
+    currency = Value(DASHBOARD_CURRENCY)
+
+    projects = Project.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(end_date__isnull=True) | Q(end_date__gte=today)),
+    )
+    recent_projects = Project.objects.order_by('-created_at')[:5].values(
+        'id', 'name', 'created_at', 'end_date'
+    )
+
+    tasks = Task.objects.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        overdue=Count('id', filter=Q(status__in=['pending', 'in_progress'], due_date__lt=today)),
+    )
+
+    total_budget = ProjectBudget.objects.aggregate(
+        total=_sum(converted_amount(F('initial_budget'), F('currency'), currency))
+    )['total']
+    total_spent = BudgetRollup.objects.aggregate(total=_sum(converted_rollup_total(currency)))['total']
+    over_budget_count = ProjectBudget.objects.with_totals().filter(
+        total_expenses__gt=F('initial_budget')
+    ).count()
+
+    top_categories = (
+        BudgetRollup.objects
+        .values('category', project=F('budget__project__name'))
+        .annotate(total=Sum(converted_rollup_total(currency)))
+        .filter(total__isnull=False)
+        .order_by('-total')[:10]
+    )
+    currencies = BudgetRollup.objects.values_list('currency', flat=True).union(
+        ProjectBudget.objects.values_list('currency', flat=True)
+    )
+
+    return {
+        'projects': {
+            'total': projects['total'],
+            'active': projects['active'],
+            'recent': list(recent_projects)
+        },
+        'tasks': {
+            'total': tasks['total'],
+            'completed': tasks['completed'],
+            'overdue': tasks['overdue'],
+            'completion_rate': (tasks['completed'] / tasks['total'] * 100) if tasks['total'] > 0 else 0
+        },
+        'budget': {
+            'total_budget': float(total_budget),
+            'total_spent': float(total_spent),
+            'remaining': float(total_budget - total_spent),
+            'over_budget_projects': over_budget_count,
+            # normalized to BGN; amounts in `missing_rates` currencies are left out
+            'currency': DASHBOARD_CURRENCY,
+            'missing_rates': missing_rates(currencies)
+        },
+        'top_expense_categories': [
+            {'project': row['project'], 'category': row['category'], 'total': float(row['total'])}
+            for row in top_categories
+        ]
+    }
+
+
+def refresh_dashboard():
+    """Compute the dashboard and store it as the current snapshot."""
+    start = time.perf_counter()
+    # through the JSON encoder up front, so a new and a stored snapshot look the same
+    data = json.loads(json.dumps(build_dashboard(), cls=DjangoJSONEncoder))
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        name=DASHBOARD_SNAPSHOT,
+        defaults={
+            'data': data,
+            'generated_at': timezone.now(),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+    )
+    return snapshot
+
+
+def is_fresh(snapshot, now=None):
+    """True if `snapshot` is from today and within ANALYTICS_DASHBOARD_MAX_AGE_SECONDS."""
+    now = now or timezone.now()
+    max_age = getattr(settings, 'ANALYTICS_DASHBOARD_MAX_AGE_SECONDS', 300)
+    return (timezone.localdate(snapshot.generated_at) == timezone.localdate(now)
+            and (now - snapshot.generated_at).total_seconds() <= max_age)
+
+
+def get_dashboard(fresh=False):
+    """
+    The dashboard payload with its `generated_at` timestamp and a `stale`
+    flag. The stored snapshot is always served as is, so the request never
+    pays for the aggregation; only a missing snapshot (or `fresh`) is
+    computed here.
+    """
+    snapshot = None
+    if not fresh:
+        snapshot = DashboardSnapshot.objects.filter(name=DASHBOARD_SNAPSHOT).first()
+    if snapshot is None:
+        snapshot = refresh_dashboard()
+    stale = not is_fresh(snapshot)
+    if stale:
+        logger.warning(f'Serving a dashboard snapshot from {snapshot.generated_at:%Y-%m-%d %H:%M:%S}; '
+                       f'is `manage.py refresh_dashboard --interval` running?')
+    return dict(snapshot.data, generated_at=snapshot.generated_at, stale=stale)
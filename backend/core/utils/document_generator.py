@@ -1,15 +1,30 @@
 import os
+import re
+import shutil
 import logging
-from docx import Document
+import zipfile
+import xml.sax
+from xml.sax.saxutils import XMLGenerator
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from io import BytesIO
 from django.conf import settings
 from .sign_stub import sign_document
+from .template_cache import get_compiled_template
+from .substitution import build_token_lookup, substitute_paragraph, substitute_texts, split_breaks
+from .timing import stage
 
 logger = logging.getLogger(__name__)
 
 TEMPLATE_DIR = os.path.join(settings.MEDIA_ROOT, 'templates')
 
+ACT_TEMPLATES = ('act7_bg.docx', 'act14_bg.docx', 'act15_bg.docx')
+EXTRA_SECTION_KEYS = ('quality_control', 'issues', 'materials_delivered', 'next_steps', 'notes')
+
+# Zip members rewritten by the streaming renderer; everything else is copied as is.
+STREAMED_PARTS = re.compile(r'^word/(document|header\d*|footer\d*)\.xml$')
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+
 def ensure_templates_dir():
     """Ensure the templates directory exists"""
     os.makedirs(TEMPLATE_DIR, exist_ok=True)
@@ -19,15 +34,216 @@ def get_template_path(template_name):
     """Get the full path for a template"""
     return os.path.join(TEMPLATE_DIR, template_name)
 
-def generate_document(template_name, context, output_path, signatures=None):
+def enrich_context(context):
+    """
+    Return a copy of `context` with the representative/name aliases filled in,
+    so templates can use either naming for the same person.
+    """
+    enriched_context = dict(context)
+    
+    if 'consultant_name' not in enriched_context and 'representative_supervision' in enriched_context:
+        enriched_context['consultant_name'] = enriched_context['representative_supervision']
+    if 'representative_supervision' not in enriched_context and 'consultant_name' in enriched_context:
+        enriched_context['representative_supervision'] = enriched_context['consultant_name']
+    
+    if 'designer_name' not in enriched_context and 'representative_designer' in enriched_context:
+        enriched_context['designer_name'] = enriched_context['representative_designer']
+    if 'representative_designer' not in enriched_context and 'designer_name' in enriched_context:
+        enriched_context['representative_designer'] = enriched_context['designer_name']
+    
+    if 'contractor_name' not in enriched_context and 'representative_builder' in enriched_context:
+        enriched_context['contractor_name'] = enriched_context['representative_builder']
+    if 'representative_builder' not in enriched_context and 'contractor_name' in enriched_context:
+        enriched_context['representative_builder'] = enriched_context['contractor_name']
+    
+    if 'supervisor_name' in enriched_context:
+        if 'consultant_name' not in enriched_context:
+            enriched_context['consultant_name'] = enriched_context['supervisor_name']
+        if 'representative_supervision' not in enriched_context:
+            enriched_context['representative_supervision'] = enriched_context['supervisor_name']
+    
+    return enriched_context
+
+def missing_placeholders(template_name, context):
+    """Placeholder keys of the template left blank by `context` (after aliasing)."""
+    enriched = enrich_context(context)
+    compiled = get_compiled_template(get_template_path(template_name))
+    return [key for key in compiled.keys if enriched.get(key) in (None, '')]
+
+def get_numeric_map(enriched_context):
+    """Values for the `*1*` (builder), `*2*` (supervision) and `*3*` (designer) markers."""
+    return {
+        '1': enriched_context.get('representative_builder') or enriched_context.get('contractor_name') or '',
+        '2': enriched_context.get('representative_supervision') or enriched_context.get('consultant_name') or '',
+        '3': enriched_context.get('representative_designer') or enriched_context.get('designer_name') or '',
+    }
+
+class _ParagraphRewriter(xml.sax.handler.ContentHandler):
+    """
+    SAX handler that copies a WordprocessingML part to `out` while substituting
+    tokens. Events outside paragraphs are written straight through; the events
+    of one top-level `w:p` are buffered so tokens split across runs can be
+    resolved before the paragraph is written out.
+    """
+
+    def __init__(self, out, lookup):
+        super().__init__()
+        self.gen = XMLGenerator(out, encoding='utf-8', short_empty_elements=True)
+        self.lookup = lookup
+        self.events = None
+        self.p_stack = []
+        self.p_count = 0
+        self.text_nodes = {}
+        self.open_text = None
+
+    def startElement(self, name, attrs):
+        if name == 'w:p':
+            if self.events is None:
+                self.events = []
+                self.text_nodes = {}
+            self.p_count += 1
+            self.p_stack.append(self.p_count)
+        if self.events is None:
+            self.gen.startElement(name, attrs)
+        elif name == 'w:t':
+            self.open_text = ['t', dict(attrs), [], False]
+            self.events.append(self.open_text)
+            self.text_nodes.setdefault(self.p_stack[-1], []).append(self.open_text)
+        else:
+            self.events.append(('start', name, dict(attrs)))
+
+    def endElement(self, name):
+        if self.events is None:
+            self.gen.endElement(name)
+            return
+        if name == 'w:t':
+            self.open_text = None
+        else:
+            self.events.append(('end', name))
+        if name == 'w:p':
+            self.p_stack.pop()
+            if not self.p_stack:
+                self._flush()
+
+    def characters(self, content):
+        if self.events is None:
+            self.gen.characters(content)
+        elif self.open_text is not None:
+            self.open_text[2].append(content)
+        else:
+            self.events.append(('chars', content))
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+    def processingInstruction(self, target, data):
+        if self.events is None:
+            self.gen.processingInstruction(target, data)
+        else:
+            self.events.append(('pi', target, data))
+
+    def endDocument(self):
+        self.gen.endDocument()
+
+    def _flush(self):
+        for nodes in self.text_nodes.values():
+            texts = [''.join(node[2]) for node in nodes]
+            new_texts, changed = substitute_texts(texts, self.lookup)
+            for i in changed:
+                nodes[i][2] = [new_texts[i]]
+                nodes[i][3] = True
+        gen = self.gen
+        for event in self.events:
+            kind = event[0]
+            if kind == 'start':
+                gen.startElement(event[1], event[2])
+            elif kind == 'end':
+                gen.endElement(event[1])
+            elif kind == 'chars':
+                gen.characters(event[1])
+            elif kind == 'pi':
+                gen.processingInstruction(event[1], event[2])
+            else:
+                self._write_text(event)
+        self.events = None
+        self.text_nodes = {}
+
+    def _write_text(self, node):
+        _, attrs, parts, changed = node
+        gen = self.gen
+        if not changed:
+            gen.startElement('w:t', attrs)
+            gen.characters(''.join(parts))
+            gen.endElement('w:t')
+            return
+        attrs = dict(attrs, **{'xml:space': 'preserve'})
+        pieces = split_breaks(parts[0])
+        gen.startElement('w:t', attrs)
+        gen.characters(pieces[0])
+        gen.endElement('w:t')
+        for piece in pieces[1:]:
+            if not piece:
+                continue
+            if piece in ('\n', '\t'):
+                tag = 'w:br' if piece == '\n' else 'w:tab'
+                gen.startElement(tag, {})
+                gen.endElement(tag)
+            else:
+                gen.startElement('w:t', {'xml:space': 'preserve'})
+                gen.characters(piece)
+                gen.endElement('w:t')
+
+
+def render_docx_streaming(compiled, lookup, output_path):
+    """
+    Render `compiled` into `output_path` (a path or a writable binary stream)
+    without building a python-docx DOM.
+
+    The document body, headers and footers are parsed incrementally with SAX and
+    written straight into the output zip with tokens substituted; every other
+    member of the template package is copied unchanged. Memory use is bounded
+    by the largest paragraph rather than by the whole document tree.
+    """
+    with zipfile.ZipFile(BytesIO(compiled.data)) as zin, \
+            zipfile.ZipFile(output_path, 'w') as zout:
+        for info in zin.infolist():
+            with zin.open(info) as src, zout.open(info, 'w') as dst:
+                if STREAMED_PARTS.match(info.filename):
+                    dst.write(XML_DECLARATION)
+                    parser = xml.sax.make_parser()
+                    parser.setContentHandler(_ParagraphRewriter(dst, lookup))
+                    parser.parse(src)
+                else:
+                    shutil.copyfileobj(src, dst)
+
+
+def _ensure_output_dir(output_path):
+    """Create the parent directory for a path output; file-like outputs need nothing."""
+    if not hasattr(output_path, 'write'):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+
+def _can_stream(template_name, context, enriched_context, signatures):
+    """Streaming only substitutes text; signatures and appended sections need the DOM."""
+    if signatures or enriched_context.get('signatures'):
+        return False
+    if template_name in ACT_TEMPLATES:
+        return True
+    return not any(context.get(key) for key in EXTRA_SECTION_KEYS)
+
+
+def generate_document(template_name, context, output_path, signatures=None, mode=None):
     """
     Generate a document from a template and context.
     
     Args:
         template_name (str): Name of the template file (e.g. 'daily_report.docx')
         context (dict): Context data to fill in the template
-        output_path (str): Path where to save the generated document
+        output_path (str or file-like): Path or writable binary stream for the generated document
         signatures (dict, optional): Dictionary of signature placeholders and their values
+        mode (str, optional): 'dom' (python-docx) or 'stream' (incremental XML rewrite).
+            Defaults to settings.DOCUMENT_RENDER_MODE. Streaming falls back to the DOM
+            renderer when signatures or appended sections are requested.
     """
     template_path = get_template_path(template_name)
     logger.info(f'Using template at {template_path}')
@@ -36,94 +252,35 @@ def generate_document(template_name, context, output_path, signatures=None):
         raise FileNotFoundError(f'Template {template_name} not found at {template_path}')
     
     try:
-        doc = Document(template_path)
-        
-        enriched_context = dict(context)
-        
-        if 'consultant_name' not in enriched_context and 'representative_supervision' in enriched_context:
-            enriched_context['consultant_name'] = enriched_context['representative_supervision']
-        if 'representative_supervision' not in enriched_context and 'consultant_name' in enriched_context:
-            enriched_context['representative_supervision'] = enriched_context['consultant_name']
-        
-        if 'designer_name' not in enriched_context and 'representative_designer' in enriched_context:
-            enriched_context['designer_name'] = enriched_context['representative_designer']
-        if 'representative_designer' not in enriched_context and 'designer_name' in enriched_context:
-            enriched_context['representative_designer'] = enriched_context['designer_name']
-        
-        if 'contractor_name' not in enriched_context and 'representative_builder' in enriched_context:
-            enriched_context['contractor_name'] = enriched_context['representative_builder']
-        if 'representative_builder' not in enriched_context and 'contractor_name' in enriched_context:
-            enriched_context['representative_builder'] = enriched_context['contractor_name']
+        with stage('template_load'):
+            compiled = get_compiled_template(template_path)
         
-        if 'supervisor_name' in enriched_context:
-            if 'consultant_name' not in enriched_context:
-                enriched_context['consultant_name'] = enriched_context['supervisor_name']
-            if 'representative_supervision' not in enriched_context:
-                enriched_context['representative_supervision'] = enriched_context['supervisor_name']
-        
-        for paragraph in doc.paragraphs:
-            for key, value in enriched_context.items():
-                placeholder = f'{{{{{key}}}}}'
-                if placeholder in paragraph.text:
-                    if value is not None and str(value).strip():
-                        paragraph.text = paragraph.text.replace(placeholder, str(value))
-                    else:
-                        paragraph.text = paragraph.text.replace(placeholder, '')
-                    
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for key, value in enriched_context.items():
-                            placeholder = f'{{{{{key}}}}}'
-                            if placeholder in paragraph.text:
-                                if value is not None and str(value).strip():
-                                    paragraph.text = paragraph.text.replace(placeholder, str(value))
-                                else:
-                                    paragraph.text = paragraph.text.replace(placeholder, '')
-        
-        numeric_map = {
-            '1': enriched_context.get('representative_builder') or enriched_context.get('contractor_name') or '',
-            '2': enriched_context.get('representative_supervision') or enriched_context.get('consultant_name') or '',
-            '3': enriched_context.get('representative_designer') or enriched_context.get('designer_name') or '',
-        }
-        def replace_numeric_markers(text: str) -> str:
-            for num, val in numeric_map.items():
-                marker = f'*{num}*'
-                if marker in text and val:
-                    text = text.replace(marker, str(val))
-            return text
-        
-        for paragraph in doc.paragraphs:
-            new_text = replace_numeric_markers(paragraph.text)
-            if new_text != paragraph.text:
-                paragraph.text = new_text
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        new_text = replace_numeric_markers(paragraph.text)
-                        if new_text != paragraph.text:
-                            paragraph.text = new_text
+        with stage('context'):
+            enriched_context = enrich_context(context)
+            numeric_map = get_numeric_map(enriched_context)
+            
+            lookup = build_token_lookup(enriched_context, numeric_map)
         
-        import re
-        placeholder_pattern = re.compile(r'\{\{[^}]+\}\}')
+        mode = mode or getattr(settings, 'DOCUMENT_RENDER_MODE', 'dom')
+        if mode == 'stream' and _can_stream(template_name, context, enriched_context, signatures):
+            _ensure_output_dir(output_path)
+            with stage('stream_render'):
+                render_docx_streaming(compiled, lookup, output_path)
+            logger.info(f'Document streamed successfully to {output_path}')
+            return
         
-        for paragraph in doc.paragraphs:
-            if '{{' in paragraph.text:
-                paragraph.text = placeholder_pattern.sub('', paragraph.text)
+        with stage('template_load'):
+            doc = compiled.load()
         
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        if '{{' in paragraph.text:
-                            paragraph.text = placeholder_pattern.sub('', paragraph.text)
+        with stage('substitute'):
+            for slot, paragraph in compiled.iter_slots(doc):
+                substitute_paragraph(paragraph._p, lookup)
         
         if signatures:
-            doc = sign_document(doc, signatures)
+            with stage('sign'):
+                doc = sign_document(doc, signatures)
 
-        if template_name in ['act7_bg.docx', 'act14_bg.docx', 'act15_bg.docx']:
+        if template_name in ACT_TEMPLATES:
             pass
         else:
             if context.get('quality_control'):
@@ -146,13 +303,15 @@ def generate_document(template_name, context, output_path, signatures=None):
                 doc.add_heading('Additional Notes', level=1)
                 doc.add_paragraph(context['notes'])
                     
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        _ensure_output_dir(output_path)
         
         sigs = signatures or enriched_context.get('signatures')
         if sigs:
-            doc = sign_document(doc, sigs)
+            with stage('sign'):
+                doc = sign_document(doc, sigs)
 
-        doc.save(output_path)
+        with stage('save'):
+            doc.save(output_path)
         logger.info(f'Document generated successfully at {output_path}')
 
     except Exception as e:
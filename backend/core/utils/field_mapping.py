@@ -0,0 +1,196 @@
+"""
+Compiled field mappings for PDF templates (the `*_fields.json` files).
+
+A mapping is validated once and turned into plain dataclasses with float
+coordinates and per-page field tuples, so filling a template does no
+parsing or defaulting per page. Mapping files are cached per process and
+reloaded when their mtime or size changes.
+"""
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MappingError(ValueError):
+    """A field mapping does not match the expected schema."""
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    label: Optional[str]
+    x: float
+    y: float
+    size: float
+    max_width: float
+    leading: float
+    hyphenate: bool
+    form_field: Optional[str]
+
+
+@dataclass(frozen=True)
+class PageSpec:
+    width: Optional[float]
+    height: Optional[float]
+    fields: Tuple[FieldSpec, ...]
+
+
+@dataclass(frozen=True)
+class GridSpec:
+    enabled: bool
+    step: float
+
+
+@dataclass(frozen=True)
+class CompiledMapping:
+    source: str
+    pages: Tuple[PageSpec, ...]
+    grid: Optional[GridSpec]
+    debug_names: bool
+    form_fields: str
+    flatten: bool
+    mtime_ns: int = 0
+    size: int = 0
+
+    def page(self, index: int) -> PageSpec:
+        """Spec for template page `index`; pages past the mapping have no fields."""
+        if index < len(self.pages):
+            return self.pages[index]
+        return EMPTY_PAGE
+
+
+EMPTY_PAGE = PageSpec(width=None, height=None, fields=())
+
+
+def _number(value: Any, where: str, default: Optional[float] = None, positive: bool = False) -> Optional[float]:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise MappingError(f'{where}: expected a number, got {value!r}')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise MappingError(f'{where}: expected a number, got {value!r}')
+    if positive and number <= 0:
+        raise MappingError(f'{where}: must be greater than 0')
+    return number
+
+
+def _compile_field(data: Any, where: str) -> FieldSpec:
+    if not isinstance(data, dict):
+        raise MappingError(f'{where}: expected an object')
+    name = data.get('name')
+    if not isinstance(name, str) or not name:
+        raise MappingError(f'{where}.name: required')
+    size = _number(data.get('size'), f'{where}.size', 10.0, positive=True)
+    form_field = data.get('form_field')
+    if form_field is not None and not isinstance(form_field, str):
+        raise MappingError(f'{where}.form_field: expected a string')
+    return FieldSpec(
+        name=name,
+        label=data.get('label'),
+        x=_number(data.get('x'), f'{where}.x', 0.0),
+        y=_number(data.get('y'), f'{where}.y', 0.0),
+        size=size,
+        max_width=_number(data.get('max_width'), f'{where}.max_width', 0.0),
+        leading=_number(data.get('leading'), f'{where}.leading', max(2.0, size * 1.2)),
+        hyphenate=bool(data.get('hyphenate')),
+        form_field=form_field,
+    )
+
+
+def compile_mapping(data: Any, source: str = '<mapping>') -> CompiledMapping:
+    """Validate a mapping dict and compile it. Raises MappingError naming the bad entry."""
+    if isinstance(data, CompiledMapping):
+        return data
+    if not isinstance(data, dict):
+        raise MappingError(f'{source}: expected an object')
+
+    pages_data = data.get('pages', [])
+    if not isinstance(pages_data, list):
+        raise MappingError(f'{source}: pages must be a list')
+    pages: List[PageSpec] = []
+    for i, page in enumerate(pages_data):
+        where = f'{source}: pages[{i}]'
+        if not isinstance(page, dict):
+            raise MappingError(f'{where}: expected an object')
+        fields = page.get('fields', [])
+        if not isinstance(fields, list):
+            raise MappingError(f'{where}.fields: must be a list')
+        pages.append(PageSpec(
+            width=_number(page.get('width'), f'{where}.width', positive=True),
+            height=_number(page.get('height'), f'{where}.height', positive=True),
+            fields=tuple(_compile_field(f, f'{where}.fields[{j}]') for j, f in enumerate(fields)),
+        ))
+
+    grid = None
+    grid_data = data.get('grid')
+    if grid_data is not None:
+        if not isinstance(grid_data, dict):
+            raise MappingError(f'{source}: grid must be an object')
+        grid = GridSpec(
+            enabled=bool(grid_data.get('enabled')),
+            step=_number(grid_data.get('step'), f'{source}: grid.step', 50.0, positive=True),
+        )
+
+    form_fields = data.get('form_fields', 'auto')
+    if form_fields not in ('auto', 'off'):
+        raise MappingError(f'{source}: form_fields must be "auto" or "off"')
+
+    return CompiledMapping(
+        source=source,
+        pages=tuple(pages),
+        grid=grid,
+        debug_names=bool(data.get('debug_names')),
+        form_fields=form_fields,
+        flatten=bool(data.get('flatten')),
+    )
+
+
+_cache: Dict[str, CompiledMapping] = {}
+_lock = threading.Lock()
+
+
+def get_compiled_mapping(path: str) -> CompiledMapping:
+    """
+    Return the compiled mapping stored at `path`, cached per process until
+    the file's mtime or size changes.
+    """
+    stat = os.stat(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise MappingError(f'{path}: invalid JSON ({e})')
+    compiled = compile_mapping(data, path)
+    compiled = replace(compiled, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+    with _lock:
+        _cache[path] = compiled
+    logger.info(f'Compiled field mapping {path}: {sum(len(p.fields) for p in compiled.pages)} fields')
+    return compiled
+
+
+def find_mapping_files(directory: str) -> List[str]:
+    """Every `*_fields.json` mapping in `directory`."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('_fields.json')
+    )
+
+
+def clear_mapping_cache():
+    """Drop every compiled mapping (mainly for tests)."""
+    with _lock:
+        _cache.clear()
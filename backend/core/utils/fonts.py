@@ -0,0 +1,99 @@
+"""
+Process-wide font registry and glyph-width cache for ReportLab output.
+
+Fonts are looked up and registered once per process; text widths come from
+per-font tables of glyph widths (1/1000 em) filled on first use, which gives
+the same result as `pdfmetrics.stringWidth` without going through the font
+object for every measurement.
+"""
+import os
+import threading
+from typing import Dict, Optional
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+DEFAULT_FONT = "DejaVu"
+FALLBACK_FONT = "Helvetica"
+
+
+def _font_candidates():
+    return [
+        os.path.join(os.getcwd(), "backend", "media", "fonts", "DejaVuSans.ttf"),
+        os.path.join(os.getcwd(), "media", "fonts", "DejaVuSans.ttf"),
+        os.path.join(os.getcwd(), "DejaVuSans.ttf"),
+        os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arialuni.ttf"),
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/local/share/fonts/DejaVuSans.ttf",
+    ]
+
+
+_lock = threading.Lock()
+_registered: Dict[str, str] = {}
+_default_font: Optional[str] = None
+_bold_font: Optional[str] = None
+_width_tables: Dict[str, Dict[str, float]] = {}
+
+
+def register_font(name: str, path: str) -> bool:
+    """Register the TTF at `path` as `name` unless it already is. Returns False if it cannot be loaded."""
+    with _lock:
+        if name in _registered:
+            return True
+        try:
+            pdfmetrics.registerFont(TTFont(name, path))
+        except Exception:
+            return False
+        _registered[name] = path
+        return True
+
+
+def get_default_font() -> str:
+    """Name of the Cyrillic-capable default font, resolved on first call."""
+    global _default_font
+    if _default_font is None:
+        font = FALLBACK_FONT
+        for path in _font_candidates():
+            if path and os.path.exists(path) and register_font(DEFAULT_FONT, path):
+                font = DEFAULT_FONT
+                break
+        _default_font = font
+    return _default_font
+
+
+def get_bold_font() -> str:
+    """Bold companion of the default font (DejaVuSans-Bold next to DejaVuSans)."""
+    global _bold_font
+    if _bold_font is None:
+        regular = get_default_font()
+        bold = "Helvetica-Bold" if regular == FALLBACK_FONT else regular
+        if regular == DEFAULT_FONT:
+            path = os.path.join(os.path.dirname(_registered[DEFAULT_FONT]), "DejaVuSans-Bold.ttf")
+            if os.path.exists(path) and register_font(f"{DEFAULT_FONT}-Bold", path):
+                bold = f"{DEFAULT_FONT}-Bold"
+        _bold_font = bold
+    return _bold_font
+
+
+def glyph_widths(font_name: str) -> Dict[str, float]:
+    """The width table of `font_name`, per character, in 1/1000 em."""
+    table = _width_tables.get(font_name)
+    if table is None:
+        table = _width_tables.setdefault(font_name, {})
+    return table
+
+
+def text_units(text: str, font_name: str) -> float:
+    """Width of `text` in 1/1000 em of `font_name`."""
+    table = glyph_widths(font_name)
+    total = 0.0
+    for ch in text:
+        width = table.get(ch)
+        if width is None:
+            width = table[ch] = pdfmetrics.stringWidth(ch, font_name, 1000)
+        total += width
+    return total
+
+
+def string_width(text: str, font_name: str, font_size: float) -> float:
+    """Width of `text` in points; equal to `pdfmetrics.stringWidth`."""
+    return 0.001 * font_size * text_units(text, font_name)
@@ -0,0 +1,562 @@
+"""
+Rendering steps shared by the synchronous generate endpoints and the
+background generation worker.
+"""
+import os
+import json
+import uuid
+import logging
+import threading
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from .document_generator import generate_document, enrich_context, get_numeric_map, get_template_path
+from .pdf_export import convert_to_pdf_bytes
+from .artifacts import compute_artifact_key
+from .act_pdf import supports_native_pdf, render_act_pdf, layout_tokens
+from .substitution import build_token_lookup, resolve_token
+from .template_cache import get_compiled_template
+from .timing import collect_timings, stage, record_size
+from ..models import GeneratedArtifact, GenerationMetric
+
+logger = logging.getLogger(__name__)
+
+STORED_EXTENSIONS = ('.docx', '.pdf', '.zip')
+
+
+def get_act_basename(act):
+    """File name stem shared by an act's DOCX, PDF and ZIP."""
+    return f'{act.act_type}_{act.id}'
+
+
+def build_zip(members):
+    """
+    Build a ZIP archive in memory from (name, bytes) pairs. DOCX, PDF and ZIP
+    payloads are already compressed, so they are stored rather than deflated.
+    """
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for name, data in members:
+            compress_type = zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            zf.writestr(name, data, compress_type=compress_type)
+    return buf.getvalue()
+
+
+def build_act_zip(base_name, docx_bytes, pdf_bytes, context):
+    context_bytes = json.dumps(context, ensure_ascii=False, indent=2).encode('utf-8')
+    return build_zip([
+        (f'{base_name}.docx', docx_bytes),
+        (f'{base_name}.pdf', pdf_bytes),
+        ('context.json', context_bytes),
+    ])
+
+
+def render_act_docx(template_name, context):
+    buf = BytesIO()
+    generate_document(template_name, context, buf)
+    record_size('docx', buf.tell())
+    return buf.getvalue()
+
+
+def render_act_bundle(template_name, context, base_name, act_type=None):
+    """
+    Render one act in memory and return {'docx', 'pdf', 'zip'} as bytes.
+    Also runs inside batch pool processes, so it must not touch the database.
+
+    Act types with a native layout (see core.utils.act_pdf) only get their
+    PDF here; 'docx' and 'zip' are None and are rendered on first download
+    by `ensure_act_docx`.
+    """
+    if act_type and supports_native_pdf(act_type):
+        with stage('native_pdf'):
+            pdf_bytes = render_act_pdf(act_type, context)
+        record_size('pdf', pdf_bytes)
+        return {'docx': None, 'pdf': pdf_bytes, 'zip': None}
+
+    docx_bytes = render_act_docx(template_name, context)
+
+    logger.info(f'Converting {base_name}.docx to PDF')
+    pdf_bytes = convert_to_pdf_bytes(docx_bytes)
+    with stage('zip'):
+        zip_bytes = build_act_zip(base_name, docx_bytes, pdf_bytes, context)
+    record_size('zip', zip_bytes)
+    return {'docx': docx_bytes, 'pdf': pdf_bytes, 'zip': zip_bytes}
+
+
+def _render_act_bundle_timed(template_name, context, base_name, act_type=None):
+    """`render_act_bundle` with its stage timings under 'timings', for pool workers."""
+    with collect_timings() as timings:
+        bundle = render_act_bundle(template_name, context, base_name, act_type)
+    bundle['timings'] = timings.as_dict()
+    return bundle
+
+
+def store_act_bundle(act, bundle):
+    """Hand each rendered buffer to storage once and save the act."""
+    base_name = get_act_basename(act)
+    with stage('storage'):
+        for key, field in (('docx', act.docx_file), ('pdf', act.pdf_file), ('zip', act.zip_file)):
+            if bundle.get(key) is not None:
+                field.save(f'{base_name}.{key}', ContentFile(bundle[key]), save=False)
+        act.save()
+    return act
+
+
+def ensure_act_docx(act):
+    """
+    Make sure `act` has its DOCX and ZIP, rendering them now for acts whose
+    PDF was laid out natively. They are rendered from the context of the
+    stored PDF: an act edited since (e.g. by PATCH, without `regenerate`)
+    no longer matches its artifact key and is regenerated first. A shared
+    artifact gets the files too, so other acts pointing at it do not render
+    them again.
+    """
+    if act.docx_file and act.zip_file:
+        return act
+    template_name = act.get_template_name()
+    context = act.get_context()
+    key = compute_artifact_key(template_name, context, renderer=get_act_renderer(act.act_type))
+    if act.artifact is not None and act.artifact.content_hash != key:
+        logger.info(f'Act {act.act_type} #{act.id} changed since its PDF was rendered; regenerating it')
+        regenerate_act(act)
+        if act.docx_file and act.zip_file:
+            return act
+    artifact = act.artifact
+    if artifact is not None and artifact.docx_file and artifact.zip_file:
+        act.docx_file.name = artifact.docx_file.name
+        act.zip_file.name = artifact.zip_file.name
+        act.save(update_fields=['docx_file', 'zip_file'])
+        return act
+
+    base_name = get_act_basename(act)
+    logger.info(f'Rendering deferred DOCX for act {act.act_type} #{act.id}')
+    docx_bytes = render_act_docx(template_name, context)
+    with act.pdf_file.open('rb') as f:
+        pdf_bytes = f.read()
+    act.docx_file.save(f'{base_name}.docx', ContentFile(docx_bytes), save=False)
+    act.zip_file.save(f'{base_name}.zip', ContentFile(build_act_zip(base_name, docx_bytes, pdf_bytes, context)), save=False)
+    act.save(update_fields=['docx_file', 'zip_file'])
+    if artifact is not None and artifact.content_hash == key:
+        artifact.docx_file.name = act.docx_file.name
+        artifact.zip_file.name = act.zip_file.name
+        artifact.save(update_fields=['docx_file', 'zip_file'])
+    return act
+
+
+def get_act_renderer(act_type):
+    """'native' for act types laid out by core.utils.act_pdf, else None."""
+    return 'native' if supports_native_pdf(act_type) else None
+
+
+def render_act(act):
+    """
+    Render the DOCX, PDF and ZIP for `act` and attach them to its file fields.
+    If an identical act was rendered before, its stored files are reused.
+    Stage timings are stored as a GenerationMetric.
+    """
+    template_name = act.get_template_name()
+    renderer = get_act_renderer(act.act_type)
+    with collect_timings() as timings:
+        context = act.get_context()
+        key = compute_artifact_key(template_name, context, renderer=renderer)
+        artifact = GeneratedArtifact.acquire(key)
+        if artifact:
+            logger.info(f'Reusing artifact {key[:12]} for act {act.act_type} #{act.id}')
+            artifact.attach_to(act)
+        else:
+            logger.info(f'Generating act {act.act_type} #{act.id} with template {template_name}')
+            store_act_bundle(act, render_act_bundle(template_name, context, get_act_basename(act), act.act_type))
+            GeneratedArtifact.register(key, template_name, act)
+    GenerationMetric.record('act', template_name, timings, act, renderer=renderer, reused=bool(artifact))
+    return act
+
+
+def stored_context(act):
+    """The context.json snapshot in the act's ZIP, or None if there is none."""
+    if not act.zip_file:
+        return None
+    try:
+        with act.zip_file.open('rb') as f, zipfile.ZipFile(f) as zf:
+            return json.loads(zf.read('context.json'))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+
+def render_inputs(template_name, act_type, context):
+    """
+    The values the DOCX and the PDF of an act actually consume, as
+    {'docx': {token: text}, 'pdf': {token: text}}. Contexts with equal
+    inputs render the same output, whatever else differs between them.
+    """
+    compiled = get_compiled_template(get_template_path(template_name))
+    enriched = enrich_context(context)
+    lookup = build_token_lookup(enriched, get_numeric_map(enriched))
+    tokens = [f'{{{{{key}}}}}' for key in compiled.keys] + [f'*{marker}*' for marker in compiled.markers]
+    docx = {token: resolve_token(token, lookup) for token in tokens}
+    docx['signatures'] = enriched.get('signatures')
+    if supports_native_pdf(act_type):
+        pdf = {token: resolve_token(token, lookup) for token in sorted(layout_tokens(act_type))}
+    else:
+        pdf = docx
+    return {'docx': docx, 'pdf': pdf}
+
+
+def _read_file(field):
+    if not field:
+        return None
+    with field.open('rb') as f:
+        return f.read()
+
+
+def _write_file(field, name, data, in_place):
+    """
+    Store `data` for `field`, replacing its current file when `in_place`.
+    The old file is only removed once the new one is fully written, so a
+    failed write leaves the act with its previous file: on local storage
+    the new file is written next to it and renamed over it (keeping the
+    name), elsewhere it is saved under a new name before the old one is
+    deleted.
+    """
+    if not (in_place and field):
+        field.save(name, ContentFile(data), save=False)
+        return
+    try:
+        path = field.path
+    except NotImplementedError:
+        old_name = field.name
+        field.save(name, ContentFile(data), save=False)
+        field.storage.delete(old_name)
+        return
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if field.storage.file_permissions_mode is not None:
+            os.chmod(temp_path, field.storage.file_permissions_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def regenerate_act(act):
+    """
+    Bring the files of an already generated `act` up to date with its fields,
+    rebuilding only the outputs whose inputs changed.
+
+    The previous inputs come from the context.json snapshot in the act's ZIP;
+    the template version is checked through the act's artifact key. The DOCX
+    is rendered again only when a value it shows changed, the PDF only when
+    its own inputs changed (for converted PDFs, when the DOCX changed), and
+    the ZIP is rewritten around the current files. Files used by this act
+    alone are overwritten in place; when they are shared with other acts,
+    this act gets its own copies and the shared ones are left untouched.
+    Falls back to a full render when there is nothing to compare against.
+
+    Returns the list of outputs that were rebuilt ('docx', 'pdf', 'zip').
+    """
+    template_name = act.get_template_name()
+    renderer = get_act_renderer(act.act_type)
+    context = act.get_context()
+    key = compute_artifact_key(template_name, context, renderer=renderer)
+    previous = act.artifact
+    if previous is not None and previous.content_hash == key and act.pdf_file:
+        return []
+
+    existing = GeneratedArtifact.acquire(key)
+    if existing:
+        logger.info(f'Reusing artifact {key[:12]} for regenerated act {act.act_type} #{act.id}')
+        existing.attach_to(act)
+        if previous is not None:
+            GeneratedArtifact.release(previous.pk)
+        return ['docx', 'pdf', 'zip']
+
+    old_context = stored_context(act)
+    comparable = (
+        old_context is not None
+        and previous is not None
+        and compute_artifact_key(template_name, old_context, renderer=renderer) == previous.content_hash
+    )
+    if not comparable:
+        logger.info(f'Fully regenerating act {act.act_type} #{act.id}')
+        with collect_timings() as timings:
+            store_act_bundle(act, render_act_bundle(template_name, context, get_act_basename(act), act.act_type))
+            act.artifact = None
+            GeneratedArtifact.register(key, template_name, act)
+        GenerationMetric.record('act', template_name, timings, act, renderer=renderer)
+        if previous is not None:
+            GeneratedArtifact.release(previous.pk)
+        return ['docx', 'pdf', 'zip']
+
+    before = render_inputs(template_name, act.act_type, old_context)
+    after = render_inputs(template_name, act.act_type, context)
+    docx_changed = before['docx'] != after['docx']
+    pdf_changed = before['pdf'] != after['pdf']
+    in_place = GeneratedArtifact.objects.filter(pk=previous.pk, ref_count=1).exists()
+    base_name = get_act_basename(act)
+    rebuilt = []
+
+    with collect_timings() as timings:
+        docx_bytes = _read_file(act.docx_file)
+        if docx_bytes is not None and docx_changed:
+            docx_bytes = render_act_docx(template_name, context)
+            rebuilt.append('docx')
+        if docx_bytes is not None and (docx_changed or not in_place):
+            with stage('storage'):
+                _write_file(act.docx_file, f'{base_name}.docx', docx_bytes, in_place)
+
+        if pdf_changed:
+            if renderer == 'native':
+                with stage('native_pdf'):
+                    pdf_bytes = render_act_pdf(act.act_type, context)
+                record_size('pdf', pdf_bytes)
+            else:
+                pdf_bytes = convert_to_pdf_bytes(docx_bytes)
+            rebuilt.append('pdf')
+        else:
+            pdf_bytes = _read_file(act.pdf_file)
+        if pdf_changed or not in_place:
+            with stage('storage'):
+                _write_file(act.pdf_file, f'{base_name}.pdf', pdf_bytes, in_place)
+
+        if docx_bytes is not None:
+            with stage('zip'):
+                zip_bytes = build_act_zip(base_name, docx_bytes, pdf_bytes, context)
+            record_size('zip', zip_bytes)
+            with stage('storage'):
+                _write_file(act.zip_file, f'{base_name}.zip', zip_bytes, in_place)
+            rebuilt.append('zip')
+
+        if in_place:
+            GeneratedArtifact.objects.filter(pk=previous.pk).update(
+                content_hash=key,
+                docx_file=act.docx_file.name or None,
+                pdf_file=act.pdf_file.name or None,
+                zip_file=act.zip_file.name or None,
+            )
+            act.save()
+        else:
+            act.artifact = None
+            act.save()
+            GeneratedArtifact.register(key, template_name, act)
+    GenerationMetric.record('act', template_name, timings, act, renderer=renderer)
+    if not in_place:
+        GeneratedArtifact.release(previous.pk)
+    logger.info(f'Regenerated {", ".join(rebuilt) or "nothing"} for act {act.act_type} #{act.id}')
+    return rebuilt
+
+
+_render_pool = None
+_render_pool_pid = None
+_render_pool_lock = threading.Lock()
+
+
+def _init_render_process():
+    """Pool initializer: make sure Django is configured in spawned processes."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        django.setup()
+
+
+def get_render_pool():
+    """
+    The process pool shared by every batch render of this process, with
+    GENERATION_PROCESSES workers (the CPU count by default), so concurrent
+    batch requests queue for the same workers instead of each forking their
+    own. Recreated in forked processes and after `shutdown_render_pool`.
+    """
+    global _render_pool, _render_pool_pid
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_pid != os.getpid():
+            processes = getattr(settings, 'GENERATION_PROCESSES', None) or os.cpu_count() or 1
+            _render_pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_render_process)
+            _render_pool_pid = os.getpid()
+        return _render_pool
+
+
+def shutdown_render_pool():
+    """Stop the workers of this process's render pool, if any."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None and _render_pool_pid == os.getpid():
+        pool.shutdown()
+
+
+def _close_connections_before_fork():
+    # Workers are forked on demand while submitting; they must not inherit
+    # this process's open database connections (they never use them).
+    for conn in connections.all():
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+def render_acts_batch(acts, processes=None):
+    """
+    Render many acts, spreading DOCX/PDF rendering over the shared render
+    pool (see `get_render_pool`).
+
+    Contexts are built in this process; acts matching a stored artifact reuse
+    it, the rest are sent to workers, which only receive plain data and
+    return the rendered bytes. Returns (act, error, bundle) triples in input
+    order: `error` is None on success and `bundle` holds the rendered bytes
+    (None for reused artifacts). Acts that failed are deleted, like in the
+    single generate flow.
+    """
+    processes = processes or getattr(settings, 'GENERATION_PROCESSES', None) or os.cpu_count() or 1
+    results = {}
+    work = []
+    for act in acts:
+        template_name = act.get_template_name()
+        context = act.get_context()
+        try:
+            key = compute_artifact_key(template_name, context, renderer=get_act_renderer(act.act_type))
+        except Exception as e:
+            results[act.pk] = (e, None)
+            continue
+        artifact = GeneratedArtifact.acquire(key)
+        if artifact:
+            with collect_timings() as timings:
+                artifact.attach_to(act)
+            GenerationMetric.record('act', template_name, timings, act,
+                                    renderer=get_act_renderer(act.act_type), reused=True)
+            results[act.pk] = (None, None)
+        else:
+            work.append((act, template_name, context, key))
+
+    outcomes = []
+    if processes == 1 or len(work) <= 1:
+        for act, template_name, context, key in work:
+            try:
+                outcomes.append((None, _render_act_bundle_timed(template_name, context, get_act_basename(act), act.act_type)))
+            except Exception as e:
+                outcomes.append((e, None))
+    else:
+        _close_connections_before_fork()
+        pool = get_render_pool()
+        futures = [
+            pool.submit(_render_act_bundle_timed, template_name, context, get_act_basename(act), act.act_type)
+            for act, template_name, context, key in work
+        ]
+        for future in futures:
+            try:
+                outcomes.append((None, future.result()))
+            except Exception as e:
+                outcomes.append((e, None))
+        if any(isinstance(error, BrokenProcessPool) for error, _ in outcomes):
+            # a worker died; the next batch starts a new pool
+            shutdown_render_pool()
+
+    for (act, template_name, context, key), (error, bundle) in zip(work, outcomes):
+        if error is None:
+            try:
+                with collect_timings() as timings:
+                    timings.merge(bundle.pop('timings', None))
+                    store_act_bundle(act, bundle)
+                    GeneratedArtifact.register(key, template_name, act)
+                GenerationMetric.record('act', template_name, timings, act,
+                                        renderer=get_act_renderer(act.act_type))
+            except Exception as e:
+                error = e
+        results[act.pk] = (error, bundle)
+
+    ordered = []
+    for act in acts:
+        error, bundle = results[act.pk]
+        if error is not None:
+            logger.error(f'Act generation failed for {act.act_type} #{act.id}: {str(error)}')
+            act.delete()
+        ordered.append((act, error, bundle))
+    return ordered
+
+
+def build_batch_zip(project, rendered):
+    """
+    Pack the DOCX and PDF of every act into one archive under media/acts/
+    and return its storage name. `rendered` holds (act, bundle) pairs; acts
+    without a bundle (reused artifacts) are read back from storage. Acts
+    whose DOCX is deferred contribute only their PDF.
+    """
+    from django.utils import timezone
+
+    members = []
+    for act, bundle in rendered:
+        base_name = get_act_basename(act)
+        if bundle is None:
+            bundle = {'docx': None, 'pdf': None}
+            for key, field in (('docx', act.docx_file), ('pdf', act.pdf_file)):
+                if field:
+                    with field.open('rb') as f:
+                        bundle[key] = f.read()
+        if bundle['docx'] is not None:
+            members.append((f'{base_name}.docx', bundle['docx']))
+        members.append((f'{base_name}.pdf', bundle['pdf']))
+
+    now = timezone.now()
+    name = f'acts/{now:%Y/%m/%d}/batch_{project.id}_{now:%Y%m%d%H%M%S}.zip'
+    return default_storage.save(name, ContentFile(build_zip(members)))
+
+
+def render_generated_document(document, template_name, context):
+    """
+    Render `template_name` in memory, store it under generated/ and attach it
+    to `document`.
+    If the same template and context were rendered before, the stored file
+    is reused.
+    """
+    with collect_timings() as timings:
+        key = compute_artifact_key(template_name, context)
+        artifact = GeneratedArtifact.acquire(key)
+        if artifact:
+            logger.info(f'Reusing artifact {key[:12]} for {template_name}')
+            artifact.attach_to(document)
+        else:
+            doc_name, ext = os.path.splitext(template_name)
+            buf = BytesIO()
+            generate_document(template_name, context, buf)
+            record_size('docx', buf.tell())
+            with stage('storage'):
+                document.file_docx = default_storage.save(f'generated/{doc_name}_{key[:12]}.docx',
+                                                          ContentFile(buf.getvalue()))
+                document.save(update_fields=['file_docx'])
+            GeneratedArtifact.register(key, template_name, document)
+    GenerationMetric.record('document', template_name, timings, document, reused=bool(artifact))
+    return document
+
+
+def process_job(job):
+    """
+    Run a claimed GenerationJob to completion.
+
+    Mirrors the synchronous endpoints: on failure the act/document row created
+    for the job is deleted and the error is recorded on the job.
+    """
+    from .activity_logger import log_act_created
+
+    try:
+        if job.kind == 'act':
+            render_act(job.act)
+            if job.created_by:
+                log_act_created(job.act, job.created_by)
+        else:
+            payload = job.payload or {}
+            render_generated_document(job.document, payload.get('template_name'), payload.get('context', {}))
+        job.mark_done()
+    except Exception as e:
+        logger.error(f'Generation job #{job.pk} failed: {str(e)}')
+        target = job.act if job.kind == 'act' else job.document
+        if target is not None:
+            target.delete()
+            setattr(job, job.kind, None)
+        job.mark_failed(e)
+    return job
@@ -1,23 +1,397 @@
+"""
+DOCX to PDF conversion.
+
+The backend is chosen with the PDF_CONVERTER setting:
+
+- 'docx2pdf'    Microsoft Word through docx2pdf (Windows/macOS only)
+- 'libreoffice' a pool of long-lived headless LibreOffice processes driven
+                through unoserver, started on first use and kept warm
+- 'python'      ReportLab layout of the DOCX text and tables, for hosts
+                without an office suite
+- 'auto'        docx2pdf on Windows/macOS, LibreOffice when unoserver is
+                installed, otherwise the pure-Python backend
+"""
+import os
 import sys
+import time
+import queue
+import atexit
+import signal
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+import xmlrpc.client
+import multiprocessing.util
+from io import BytesIO
+from django.conf import settings
+from .timing import stage, record_size
+
+logger = logging.getLogger(__name__)
+
+
+class ConverterBusy(RuntimeError):
+    """No converter process became free within the queue timeout."""
+
+
+class Docx2PdfConverter:
+    name = 'docx2pdf'
+
+    def warm(self):
+        pass
+
+    def convert(self, docx_bytes):
+        with tempfile.TemporaryDirectory() as tmp:
+            docx_path = os.path.join(tmp, 'document.docx')
+            pdf_path = os.path.join(tmp, 'document.pdf')
+            with open(docx_path, 'wb') as f:
+                f.write(docx_bytes)
+            self.convert_file(docx_path, pdf_path)
+            with open(pdf_path, 'rb') as f:
+                return f.read()
+
+    def convert_file(self, docx_path, pdf_path):
+        from docx2pdf import convert
+
+        if sys.platform == 'win32':
+            import pythoncom
+            pythoncom.CoInitialize()
+        try:
+            convert(docx_path, pdf_path)
+        finally:
+            if sys.platform == 'win32':
+                pythoncom.CoUninitialize()
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class _OfficeProcess:
+    """
+    One unoserver process (with its soffice child) listening on a local port.
+    It is started in a session of its own so stop() can end both together.
+    """
+
+    def __init__(self, command, timeout, startup_timeout):
+        self.command = command
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.port = None
+        self.owner_pid = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.port = _free_port()
+        uno_port = _free_port()
+        self.process = subprocess.Popen(
+            [self.command, '--interface', '127.0.0.1', '--port', str(self.port), '--uno-port', str(uno_port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=os.name == 'posix',
+        )
+        self.owner_pid = os.getpid()
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                    logger.info(f'Started LibreOffice converter on port {self.port}')
+                    return
+            except OSError:
+                time.sleep(0.25)
+        self.stop()
+        raise RuntimeError(f'LibreOffice converter did not start within {self.startup_timeout}s')
+
+    def stop(self):
+        if self.process is None or self.owner_pid != os.getpid():
+            return
+        self._signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._signal(signal.SIGKILL if os.name == 'posix' else signal.SIGTERM)
+            self.process.wait()
+        self.process = None
+
+    def _signal(self, sig):
+        """Signal unoserver and, on POSIX, the soffice it started (same process group)."""
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, sig)
+            else:
+                self.process.send_signal(sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def convert(self, docx_bytes):
+        if not self.running:
+            self.start()
+        proxy = xmlrpc.client.ServerProxy(
+            f'http://127.0.0.1:{self.port}',
+            allow_none=True,
+            transport=_TimeoutTransport(self.timeout),
+        )
+        result = proxy.convert(None, xmlrpc.client.Binary(docx_bytes), None, 'pdf')
+        return result.data
+
+
+class LibreOfficeConverter:
+    """
+    Fixed-size pool of warm LibreOffice processes.
+
+    Each conversion checks out an idle process. At most `queue_size`
+    conversions wait for one, and only for `queue_timeout` seconds; past that
+    ConverterBusy is raised. A process that fails or times out is restarted
+    on its next use.
+    """
+    name = 'libreoffice'
+
+    def __init__(self, size=2, queue_size=8, timeout=120, queue_timeout=60,
+                 startup_timeout=60, command='unoserver'):
+        self.size = size
+        self.queue_timeout = queue_timeout
+        self._admission = threading.BoundedSemaphore(size + queue_size)
+        self._idle = queue.Queue()
+        self._processes = [_OfficeProcess(command, timeout, startup_timeout) for _ in range(size)]
+        for process in self._processes:
+            self._idle.put(process)
+
+    def warm(self):
+        for process in self._processes:
+            if not process.running:
+                process.start()
+
+    def shutdown(self):
+        for process in self._processes:
+            process.stop()
+
+    def _checkout(self):
+        if not self._admission.acquire(blocking=False):
+            raise ConverterBusy('PDF conversion queue is full')
+        try:
+            return self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self._admission.release()
+            raise ConverterBusy(f'No PDF converter became free within {self.queue_timeout}s')
+
+    def _checkin(self, process):
+        self._idle.put(process)
+        self._admission.release()
 
-if sys.platform == 'win32':
-    import pythoncom
+    def convert(self, docx_bytes):
+        process = self._checkout()
+        try:
+            return process.convert(docx_bytes)
+        except Exception:
+            process.stop()
+            raise
+        finally:
+            self._checkin(process)
+
+
+class PythonConverter:
+    """
+    Lay out the DOCX paragraphs and tables with ReportLab. Layout is an
+    approximation of Word's, but needs no office suite.
+    """
+    name = 'python'
+
+    ALIGNMENTS = {'center': 1, 'right': 2, 'both': 4, 'distribute': 4}
+
+    def warm(self):
+        pass
+
+    def convert(self, docx_bytes):
+        from docx import Document
+        from docx.oxml.ns import qn
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
+        from .fonts import get_default_font
+
+        doc = Document(BytesIO(docx_bytes))
+        section = doc.sections[0]
+
+        def points(length, default):
+            return length.pt if length is not None else default
+
+        page_size = (points(section.page_width, 595.3), points(section.page_height, 841.9))
+        margins = {
+            'leftMargin': points(section.left_margin, inch),
+            'rightMargin': points(section.right_margin, inch),
+            'topMargin': points(section.top_margin, inch),
+            'bottomMargin': points(section.bottom_margin, inch),
+        }
+        frame_width = page_size[0] - margins['leftMargin'] - margins['rightMargin']
+
+        font_name = get_default_font()
+        base = ParagraphStyle('docx', fontName=font_name, fontSize=10, leading=13)
+
+        def paragraph(p):
+            text = ''
+            for node in p.iter(qn('w:t'), qn('w:br'), qn('w:tab')):
+                if node.tag == qn('w:t'):
+                    text += node.text or ''
+                elif node.tag == qn('w:br'):
+                    text += '\n'
+                else:
+                    text += '    '
+            text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            if not text.strip():
+                return Spacer(1, base.leading / 2)
+            jc = p.find(qn('w:pPr') + '/' + qn('w:jc'))
+            alignment = self.ALIGNMENTS.get(jc.get(qn('w:val')) if jc is not None else None, 0)
+            style = ParagraphStyle('p', parent=base, alignment=alignment)
+            return Paragraph(text.replace('\n', '<br/>'), style)
+
+        def table(tbl):
+            rows = []
+            for tr in tbl.iter(qn('w:tr')):
+                rows.append([[paragraph(p) for p in tc.iter(qn('w:p'))] for tc in tr.iter(qn('w:tc'))])
+            width = max((len(r) for r in rows), default=0)
+            rows = [r + [''] * (width - len(r)) for r in rows]
+            if not rows or not width:
+                return Spacer(1, 0)
+            t = Table(rows, colWidths=[frame_width / width] * width)
+            t.setStyle(TableStyle([
+                ('GRID', (0, 0), (-1, -1), 0.5, (0, 0, 0)),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ]))
+            return t
+
+        flowables = []
+        for child in doc.element.body.iterchildren():
+            if child.tag == qn('w:p'):
+                flowables.append(paragraph(child))
+            elif child.tag == qn('w:tbl'):
+                flowables.append(table(child))
+
+        buf = BytesIO()
+        SimpleDocTemplate(
+            buf,
+            pagesize=page_size,
+            **margins
+        ).build(flowables or [Spacer(1, 0)])
+        return buf.getvalue()
+
+
+_converter = None
+_converter_pid = None
+_converter_lock = threading.Lock()
+_finalizer_pid = None
+
+
+def create_converter(backend=None):
+    backend = backend or getattr(settings, 'PDF_CONVERTER', 'auto')
+    if backend == 'auto':
+        if sys.platform in ('win32', 'darwin'):
+            backend = 'docx2pdf'
+        elif shutil.which(getattr(settings, 'PDF_CONVERTER_COMMAND', 'unoserver')):
+            backend = 'libreoffice'
+        else:
+            backend = 'python'
+
+    if backend == 'docx2pdf':
+        return Docx2PdfConverter()
+    if backend == 'libreoffice':
+        return LibreOfficeConverter(
+            size=getattr(settings, 'PDF_CONVERTER_POOL_SIZE', 2),
+            queue_size=getattr(settings, 'PDF_CONVERTER_QUEUE_SIZE', 8),
+            timeout=getattr(settings, 'PDF_CONVERTER_TIMEOUT', 120),
+            queue_timeout=getattr(settings, 'PDF_CONVERTER_QUEUE_TIMEOUT', 60),
+            command=getattr(settings, 'PDF_CONVERTER_COMMAND', 'unoserver'),
+        )
+    if backend == 'python':
+        return PythonConverter()
+    raise ValueError(f'Unknown PDF converter backend: {backend}')
+
+
+def get_converter():
+    """
+    The process-wide converter. Forked processes (batch rendering pools)
+    get their own instead of sharing the parent's office processes; it is
+    shut down when that process exits (see shutdown_converter).
+    """
+    global _converter, _converter_pid, _finalizer_pid
+    with _converter_lock:
+        if _converter is None or _converter_pid != os.getpid():
+            _converter = create_converter()
+            _converter_pid = os.getpid()
+            logger.info(f'Using {_converter.name} PDF converter')
+            if _finalizer_pid != _converter_pid:
+                # multiprocessing workers leave through os._exit and skip atexit,
+                # but run the finalizers registered here
+                multiprocessing.util.Finalize(None, shutdown_converter, exitpriority=10)
+                _finalizer_pid = _converter_pid
+        return _converter
+
+
+def shutdown_converter():
+    """Stop the office processes started by this process's converter, if any."""
+    global _converter
+    with _converter_lock:
+        converter, _converter = _converter, None
+    if converter is not None and _converter_pid == os.getpid() and hasattr(converter, 'shutdown'):
+        converter.shutdown()
+
+
+atexit.register(shutdown_converter)
 
-from docx2pdf import convert
 
 def convert_to_pdf(docx_path, pdf_path):
     """
     Convert a DOCX file to PDF.
-    
+
     Args:
         docx_path (str): Path to the source DOCX file
         pdf_path (str): Path where to save the PDF file
     """
-    if sys.platform == 'win32':
-        pythoncom.CoInitialize()
-    
-    try:
-        convert(docx_path, pdf_path)
-    finally:
-        if sys.platform == 'win32':
-            pythoncom.CoUninitialize()
+    converter = get_converter()
+    with stage('pdf_convert'):
+        if isinstance(converter, Docx2PdfConverter):
+            converter.convert_file(docx_path, pdf_path)
+            pdf_size = os.path.getsize(pdf_path)
+        else:
+            with open(docx_path, 'rb') as f:
+                pdf_bytes = converter.convert(f.read())
+            with open(pdf_path, 'wb') as f:
+                f.write(pdf_bytes)
+            pdf_size = len(pdf_bytes)
+    record_size('pdf', pdf_size)
+
+def convert_to_pdf_bytes(docx_bytes):
+    """
+    Convert DOCX content to PDF content with the configured backend.
+
+    Args:
+        docx_bytes (bytes): DOCX package contents
+
+    Returns:
+        bytes: PDF contents
+    """
+    converter = get_converter()
+    with stage('pdf_convert'):
+        pdf_bytes = converter.convert(docx_bytes)
+    record_size('pdf', pdf_bytes)
+    return pdf_bytes
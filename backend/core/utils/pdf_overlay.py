@@ -1,32 +1,21 @@
 import io
+import os
+import re
 import json
-from typing import Dict, Any, List, Optional
+from dataclasses import replace
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.colors import black, Color
-from pypdf import PdfReader, PdfWriter
-import os
-
+from itertools import repeat
+from pypdf import PdfReader, PdfWriter, PageObject
+from pypdf.generic import RectangleObject
+from .fonts import get_default_font, text_units
+from .field_mapping import CompiledMapping, FieldSpec, compile_mapping, get_compiled_mapping
+from .timing import stage, record_size
 
-def _register_default_fonts():
-    candidates = [
-        os.path.join(os.getcwd(), "backend", "media", "fonts", "DejaVuSans.ttf"),
-        os.path.join(os.getcwd(), "media", "fonts", "DejaVuSans.ttf"),
-        os.path.join(os.getcwd(), "DejaVuSans.ttf"),
-        os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arialuni.ttf"),
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "/usr/local/share/fonts/DejaVuSans.ttf",
-    ]
-    for path in candidates:
-        try:
-            if path and os.path.exists(path):
-                pdfmetrics.registerFont(TTFont("DejaVu", path))
-                return "DejaVu"
-        except Exception:
-            pass
-    return "Helvetica"
+SOFT_HYPHEN = "\u00ad"
+DA_FONT_SIZE = re.compile(r"([\d.]+)\s+Tf")
 
 
 def _as_float(value: Optional[Any], default: float) -> float:
@@ -38,10 +27,88 @@ def _as_float(value: Optional[Any], default: float) -> float:
         return default
 
 
+def _break_word(pieces: List[str], room: float, font_name: str, font_size: float,
+                max_width: float, hyphenate: bool) -> Tuple[Optional[str], List[str]]:
+    """
+    Split a word at the longest break point whose head plus "-" fits in
+    `room` units already used on the line. Break points are the soft hyphens
+    between `pieces`, or every character when `hyphenate` is set.
+    Returns (None, pieces) when no head fits.
+    """
+    if len(pieces) > 1:
+        parts = pieces
+    elif hyphenate:
+        parts = list(pieces[0])
+    else:
+        return None, pieces
+    hyphen = text_units("-", font_name)
+    head_units = 0.0
+    best = None
+    for k in range(1, len(parts)):
+        head_units += text_units(parts[k - 1], font_name)
+        if 0.001 * font_size * (room + head_units + hyphen) > max_width:
+            break
+        best = k
+    if best is None:
+        return None, pieces
+    head = "".join(parts[:best])
+    rest = pieces[best:] if len(pieces) > 1 else ["".join(parts[best:])]
+    return head, rest
+
+
+def wrap_lines(text: str, max_width: float, font_name: str, font_size: float,
+               hyphenate: bool = False) -> List[str]:
+    """
+    Greedy word wrap in one pass: each word is measured once and line widths
+    are accumulated, so long fields wrap in linear time. Newlines in `text`
+    always start a new line. Words too long for the line are split at soft
+    hyphens, and at any character when `hyphenate` is set; otherwise they
+    overflow on a line of their own.
+    """
+    paragraphs = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if not max_width or max_width <= 0:
+        return paragraphs if len(paragraphs) > 1 else [text]
+
+    space = text_units(" ", font_name)
+    lines: List[str] = []
+    for paragraph in paragraphs:
+        cur: List[str] = []
+        cur_units = 0.0
+        for word in paragraph.split():
+            pieces = [piece for piece in word.split(SOFT_HYPHEN) if piece]
+            while pieces:
+                plain = "".join(pieces)
+                units = text_units(plain, font_name)
+                extra = space if cur else 0.0
+                breakable = len(pieces) > 1 or (hyphenate and len(plain) > 1)
+                if 0.001 * font_size * (cur_units + extra + units) <= max_width or not (cur or breakable):
+                    cur.append(plain)
+                    cur_units += extra + units
+                    break
+                if breakable:
+                    head, rest = _break_word(pieces, cur_units + extra, font_name, font_size, max_width, hyphenate)
+                    if head is None and not cur:
+                        # Nothing fits even on an empty line: break after the first piece anyway
+                        head, rest = (pieces[0], pieces[1:]) if len(pieces) > 1 else (plain[0], [plain[1:]])
+                    if head is not None:
+                        cur.append(head + "-")
+                        lines.append(" ".join(cur))
+                        cur, cur_units = [], 0.0
+                        pieces = rest
+                        continue
+                lines.append(" ".join(cur))
+                cur, cur_units = [], 0.0
+        if cur:
+            lines.append(" ".join(cur))
+        elif len(paragraphs) > 1:
+            lines.append("")
+    return lines
+
+
 def build_overlay(page_width: float, page_height: float, entries: List[Dict[str, Any]], grid: Dict[str, Any] | None = None) -> io.BytesIO:
     buf = io.BytesIO()
     c = canvas.Canvas(buf, pagesize=(page_width, page_height))
-    font_name = _register_default_fonts()
+    font_name = get_default_font()
     c.setFillColor(black)
 
     if grid and grid.get("enabled"):
@@ -61,24 +128,6 @@ def build_overlay(page_width: float, page_height: float, entries: List[Dict[str,
             c.drawString(2, y + 2, f"{int(y)}")
             y += step
 
-    def _wrap_lines(txt: str, max_width: float, font: str, font_size: float) -> List[str]:
-        if not max_width or max_width <= 0:
-            return [txt]
-        words = txt.split()
-        lines: List[str] = []
-        cur = ""
-        for w in words:
-            candidate = (cur + " " + w).strip()
-            width = pdfmetrics.stringWidth(candidate, font, font_size)
-            if width <= max_width or not cur:
-                cur = candidate
-            else:
-                lines.append(cur)
-                cur = w
-        if cur:
-            lines.append(cur)
-        return lines
-
     for e in entries:
         text = str(e.get("text", ""))
         x = _as_float(e.get("x", 0), 0.0)
@@ -87,7 +136,7 @@ def build_overlay(page_width: float, page_height: float, entries: List[Dict[str,
         max_width = _as_float(e.get("max_width", 0), 0.0)
         leading = _as_float(e.get("leading", max(2, size * 1.2)), max(2.0, size * 1.2))
         c.setFont(font_name, size)
-        lines = _wrap_lines(text, max_width, font_name, size) if max_width else [text]
+        lines = wrap_lines(text, max_width, font_name, size, hyphenate=bool(e.get("hyphenate")))
         for idx, line in enumerate(lines):
             c.drawString(x, y - idx * leading, line)
 
@@ -97,7 +146,181 @@ def build_overlay(page_width: float, page_height: float, entries: List[Dict[str,
     return buf
 
 
-def fill_pdf_template(template_pdf_path: str, output_pdf_path: str, context: Dict[str, Any], mapping: Dict[str, Any]) -> None:
+def _qualified_name(widget: Any) -> Optional[str]:
+    parts = []
+    node = widget
+    while node is not None:
+        if "/T" in node:
+            parts.append(str(node["/T"]))
+        node = node.get("/Parent")
+        node = node.get_object() if node is not None else None
+    return ".".join(reversed(parts)) or None
+
+
+def form_widgets(reader: PdfReader) -> Dict[str, Dict[str, Any]]:
+    """
+    AcroForm text widgets of the template by field name, with the page they
+    are on and where a value would be drawn if it is not filled as a field.
+    """
+    widgets: Dict[str, Dict[str, Any]] = {}
+    try:
+        default_da = str(reader.trailer["/Root"].get("/AcroForm", {}).get("/DA", ""))
+    except Exception:
+        return widgets
+    for index, page in enumerate(reader.pages):
+        for annot in page.get("/Annots") or []:
+            widget = annot.get_object()
+            if widget.get("/Subtype") != "/Widget":
+                continue
+            name = _qualified_name(widget)
+            if not name or name in widgets:
+                continue
+            parent = widget.get("/Parent")
+            da = widget.get("/DA") or (parent.get_object().get("/DA") if parent is not None else None) or default_da
+            match = DA_FONT_SIZE.search(str(da))
+            size = float(match.group(1)) if match and float(match.group(1)) > 0 else 10.0
+            x1, y1, x2, y2 = [float(v) for v in widget["/Rect"]]
+            widgets[name] = {
+                "page": index,
+                "x": min(x1, x2) + 2,
+                "y": min(y1, y2) + max(0.0, (abs(y2 - y1) - size) / 2) + size * 0.2,
+                "size": size,
+                "max_width": abs(x2 - x1) - 4,
+            }
+    return widgets
+
+
+def _resolve_mapping(mapping: Union[Dict[str, Any], CompiledMapping, str]) -> CompiledMapping:
+    """Accept a mapping file path, a raw mapping dict or an already compiled mapping."""
+    if isinstance(mapping, str):
+        return get_compiled_mapping(mapping)
+    return compile_mapping(mapping)
+
+
+def _page_layouts(reader: PdfReader, mapping: CompiledMapping) -> List[Dict[str, Any]]:
+    """
+    Size and fields of every template page, resolved once per template.
+
+    Mapping fields that target an AcroForm field go to "form_fields" of the
+    page holding the widget, as (field, form field name, widget) triples,
+    and are filled directly; the rest are drawn by the overlay. A field
+    targets `form_field` when it names an existing form field, or a form
+    field called like it when the mapping's "form_fields" is "auto" (the
+    default; "off" always draws).
+    """
+    widgets = form_widgets(reader) if mapping.form_fields != "off" else {}
+    layouts = []
+    for i, base_page in enumerate(reader.pages):
+        page_spec = mapping.page(i)
+        layouts.append({
+            "width": page_spec.width or float(base_page.mediabox.width),
+            "height": page_spec.height or float(base_page.mediabox.height),
+            "fields": [],
+            "form_fields": [],
+        })
+    for i, page_spec in enumerate(mapping.pages[:len(layouts)]):
+        for f in page_spec.fields:
+            target = f.form_field or f.name
+            widget = widgets.get(target)
+            if widget is not None:
+                layouts[widget["page"]]["form_fields"].append((f, target, widget))
+            else:
+                layouts[i]["fields"].append(f)
+    return layouts
+
+
+def _drawn_instead(value: Any, flatten: bool) -> bool:
+    """
+    Flattening renders values with the form's own font, usually a standard
+    Type 1 font without Cyrillic; such values are drawn by the overlay.
+    """
+    if not flatten:
+        return False
+    try:
+        str(value).encode("cp1252")
+        return False
+    except UnicodeEncodeError:
+        return True
+
+
+def _field_value(f: FieldSpec, context: Dict[str, Any], debug_names: bool) -> Optional[Any]:
+    if debug_names:
+        return f.label or f.name
+    value = context.get(f.name)
+    if value in (None, ""):
+        return None
+    return value
+
+
+def render_overlays(layouts: List[Dict[str, Any]], mapping: CompiledMapping, context: Dict[str, Any]) -> List[Optional[bytes]]:
+    """
+    Overlay PDF bytes for each template page (None for pages with nothing to
+    draw). Only takes plain data, so it can run in a worker process.
+    """
+    debug_names = mapping.debug_names
+    flatten = mapping.flatten
+    grid_cfg = {"enabled": True, "step": mapping.grid.step} if mapping.grid and mapping.grid.enabled else None
+
+    overlays: List[Optional[bytes]] = []
+    for layout in layouts:
+        entries = []
+        for f in layout["fields"]:
+            value = _field_value(f, context, debug_names)
+            if value is not None:
+                entries.append({
+                    "text": str(value),
+                    "x": f.x,
+                    "y": f.y,
+                    "size": f.size,
+                    "max_width": f.max_width,
+                    "leading": f.leading,
+                    "hyphenate": f.hyphenate,
+                })
+        for f, target, widget in layout["form_fields"]:
+            value = _field_value(f, context, debug_names)
+            if value is not None and _drawn_instead(value, flatten):
+                entries.append(dict(widget, text=str(value)))
+        if entries or grid_cfg:
+            overlays.append(build_overlay(layout["width"], layout["height"], entries, grid_cfg).getvalue())
+        else:
+            overlays.append(None)
+    return overlays
+
+
+def form_values(layouts: List[Dict[str, Any]], mapping: CompiledMapping, context: Dict[str, Any]) -> Dict[str, str]:
+    """Values for the AcroForm fields targeted by the mapping."""
+    values: Dict[str, str] = {}
+    for layout in layouts:
+        for f, target, widget in layout["form_fields"]:
+            value = _field_value(f, context, mapping.debug_names)
+            if value is not None and not _drawn_instead(value, mapping.flatten):
+                values[target] = str(value)
+    return values
+
+
+def _build_record(reader: PdfReader, overlays: List[Optional[bytes]], values: Dict[str, str], flatten: bool) -> PdfWriter:
+    """One filled copy of the template: overlays merged per page, form fields set."""
+    has_form = bool(values) or (flatten and "/AcroForm" in reader.trailer["/Root"])
+    if has_form:
+        writer = PdfWriter(clone_from=reader)
+        pages = list(writer.pages)
+    else:
+        writer = PdfWriter()
+        # Each writer gets its own copy of the page, so the overlay can be merged in place
+        pages = [writer.add_page(base_page) for base_page in reader.pages]
+    for page, overlay in zip(pages, overlays):
+        if overlay is not None:
+            page.merge_page(PdfReader(io.BytesIO(overlay)).pages[0])
+    if values:
+        writer.update_page_form_field_values(None, values, auto_regenerate=not flatten, flatten=flatten)
+    if has_form and flatten:
+        writer.remove_annotations(subtypes="/Widget")
+        del writer.root_object["/AcroForm"]
+    return writer
+
+
+def fill_pdf_template(template_pdf_path: str, output_pdf_path: str, context: Dict[str, Any],
+                      mapping: Union[Dict[str, Any], CompiledMapping, str]) -> None:
     """
     Overlay text on a PDF template based on a mapping file structure:
     {
@@ -106,64 +329,98 @@ def fill_pdf_template(template_pdf_path: str, output_pdf_path: str, context: Dic
           "width": 595, "height": 842,  # optional; auto-read from template if missing
           "fields": [
             {"name": "project_name", "x": 100, "y": 700, "size": 11},
-            {"name": "act_date", "x": 450, "y": 700, "size": 11}
+            {"name": "act_date", "x": 450, "y": 700, "size": 11},
+            {"name": "client_name", "form_field": "Client"}
           ]
         },
         { "fields": [ ... ] }
-      ]
+      ],
+      "form_fields": "auto",  # optional; "off" draws every field
+      "flatten": false        # optional; burn form values into the page
     }
-    Coordinates are in PDF points from bottom-left.
+    Coordinates are in PDF points from bottom-left. Fields that match an
+    AcroForm field of the template are filled directly instead of drawn.
+    `mapping` may also be the path of a mapping file or a CompiledMapping
+    (see core.utils.field_mapping).
     """
+    with stage("template_load"):
+        mapping = _resolve_mapping(mapping)
+        reader = PdfReader(template_pdf_path)
+        layouts = _page_layouts(reader, mapping)
+    with stage("overlay"):
+        overlays = render_overlays(layouts, mapping, context)
+    with stage("merge"):
+        writer = _build_record(reader, overlays, form_values(layouts, mapping, context), mapping.flatten)
+    with stage("save"):
+        with open(output_pdf_path, "wb") as f:
+            writer.write(f)
+    record_size("pdf", os.path.getsize(output_pdf_path))
+
+
+def _stamped_page(base_page: PageObject, overlay: Optional[bytes]) -> PageObject:
+    """A new page with the template page's content and the overlay on top; `base_page` is left untouched."""
+    page = PageObject.create_blank_page(width=base_page.mediabox.width, height=base_page.mediabox.height)
+    page.mediabox = RectangleObject(base_page.mediabox)
+    page.merge_page(base_page)
+    if overlay is not None:
+        page.merge_page(PdfReader(io.BytesIO(overlay)).pages[0])
+    if base_page.rotation:
+        page.rotation = base_page.rotation
+    return page
+
+
+def fill_pdf_template_batch(
+    template_pdf_path: str,
+    contexts: List[Dict[str, Any]],
+    mapping: Union[Dict[str, Any], CompiledMapping, str],
+    output_paths: Optional[List[str]] = None,
+    merged_output_path: Optional[str] = None,
+    processes: Optional[int] = None,
+) -> None:
+    """
+    Fill one template for many records (mail merge). The template and the
+    mapping are parsed once; overlays are rendered for every context, across
+    `processes` worker processes when more than one is given. Writes one PDF
+    per context to `output_paths`, or all records in order to a single
+    `merged_output_path`. Form fields are always flattened in merged output,
+    since the records would otherwise share field names.
+    """
+    if (output_paths is None) == (merged_output_path is None):
+        raise ValueError("Pass either output_paths or merged_output_path")
+    if output_paths is not None and len(output_paths) != len(contexts):
+        raise ValueError("output_paths must have one path per context")
+
+    mapping = _resolve_mapping(mapping)
     reader = PdfReader(template_pdf_path)
-    writer = PdfWriter()
-
-    pages_map = mapping.get("pages", [])
-    num_pages = len(reader.pages)
-
-    for i in range(num_pages):
-        base_page = reader.pages[i]
-        base_width = float(base_page.mediabox.width)
-        base_height = float(base_page.mediabox.height)
-
-        page_cfg = pages_map[i] if i < len(pages_map) else {"fields": []}
-        page_width = _as_float(page_cfg.get("width", base_width), base_width)
-        page_height = _as_float(page_cfg.get("height", base_height), base_height)
-
-        entries: List[Dict[str, Any]] = []
-        debug_names = False
-        try:
-            if isinstance(mapping, dict):
-                debug_names = bool(mapping.get("debug_names"))
-        except Exception:
-            debug_names = False
-        for f in page_cfg.get("fields", []):
-            name = f.get("name")
-            if not name:
-                continue
-            value = None
-            if debug_names:
-                value = f.get("label") or name
-            else:
-                if name in context and context.get(name) not in (None, ""):
-                    value = context.get(name)
-            if value is not None:
-                entries.append({
-                    "text": str(value),
-                    "x": f.get("x", 0),
-                    "y": f.get("y", 0),
-                    "size": f.get("size", 10),
-                    "max_width": f.get("max_width"),
-                    "leading": f.get("leading"),
-                })
+    layouts = _page_layouts(reader, mapping)
+    has_form = any(layout["form_fields"] for layout in layouts)
+    if merged_output_path is not None and has_form:
+        mapping = replace(mapping, flatten=True)
 
-        grid_cfg = mapping.get("grid") if isinstance(mapping, dict) else None
-        if entries or (grid_cfg and grid_cfg.get("enabled")):
-            overlay_buf = build_overlay(page_width, page_height, entries, grid_cfg)
-            overlay_reader = PdfReader(overlay_buf)
-            overlay_page = overlay_reader.pages[0]
-            base_page.merge_page(overlay_page)
+    if processes and processes > 1 and len(contexts) > 1:
+        from concurrent.futures import ProcessPoolExecutor
 
-        writer.add_page(base_page)
+        with ProcessPoolExecutor(max_workers=min(processes, len(contexts))) as pool:
+            records = list(pool.map(render_overlays, repeat(layouts), repeat(mapping), contexts,
+                                    chunksize=max(1, len(contexts) // (processes * 4))))
+    else:
+        records = [render_overlays(layouts, mapping, context) for context in contexts]
+    values = [form_values(layouts, mapping, context) for context in contexts]
+
+    if merged_output_path is not None:
+        writer = PdfWriter()
+        for overlays, record_values in zip(records, values):
+            if has_form:
+                buf = io.BytesIO()
+                _build_record(reader, overlays, record_values, flatten=True).write(buf)
+                writer.append(PdfReader(buf))
+            else:
+                for base_page, overlay in zip(reader.pages, overlays):
+                    writer.add_page(_stamped_page(base_page, overlay))
+        with open(merged_output_path, "wb") as f:
+            writer.write(f)
+        return
 
-    with open(output_pdf_path, "wb") as f:
-        writer.write(f)
+    for output_pdf_path, overlays, record_values in zip(output_paths, records, values):
+        with open(output_pdf_path, "wb") as f:
+            _build_record(reader, overlays, record_values, mapping.flatten).write(f)
@@ -0,0 +1,108 @@
+"""
+In-memory act previews for `acts/preview/`.
+
+The act's DOCX is rendered into a buffer and turned into a plain HTML
+fragment (paragraphs with their alignment and bold/italic runs, tables);
+nothing is written to the database or to media storage. Previews are cached
+for ACT_PREVIEW_CACHE_SECONDS under the act's artifact key, so an unchanged
+payload is answered from the cache while the user is editing.
+"""
+from io import BytesIO
+from html import escape
+from docx import Document
+from docx.oxml.ns import qn
+from django.conf import settings
+from django.core.cache import cache
+from .artifacts import compute_artifact_key
+from .document_generator import generate_document, missing_placeholders
+
+ALIGNMENTS = {'center': 'center', 'right': 'right', 'both': 'justify', 'distribute': 'justify'}
+
+_W_P = qn('w:p')
+_W_TBL = qn('w:tbl')
+_W_R = qn('w:r')
+_W_T = qn('w:t')
+_W_BR = qn('w:br')
+_W_TAB = qn('w:tab')
+
+
+def _flag(rpr, tag):
+    if rpr is None:
+        return False
+    el = rpr.find(qn(tag))
+    return el is not None and el.get(qn('w:val')) not in ('0', 'false')
+
+
+def _run_html(r):
+    parts = []
+    for node in r:
+        if node.tag == _W_T:
+            parts.append(escape(node.text or ''))
+        elif node.tag == _W_BR:
+            parts.append('<br>')
+        elif node.tag == _W_TAB:
+            parts.append('&emsp;')
+    text = ''.join(parts)
+    if not text:
+        return ''
+    rpr = r.find(qn('w:rPr'))
+    if _flag(rpr, 'w:b'):
+        text = f'<strong>{text}</strong>'
+    if _flag(rpr, 'w:i'):
+        text = f'<em>{text}</em>'
+    return text
+
+
+def _paragraph_html(p):
+    text = ''.join(_run_html(r) for r in p.iter(_W_R))
+    jc = p.find(qn('w:pPr') + '/' + qn('w:jc'))
+    align = ALIGNMENTS.get(jc.get(qn('w:val')) if jc is not None else None)
+    style = f' style="text-align:{align}"' if align else ''
+    return f'<p{style}>{text or "&nbsp;"}</p>'
+
+
+def _table_html(tbl):
+    rows = []
+    for tr in tbl.iterchildren(qn('w:tr')):
+        cells = ''.join(f'<td>{_blocks_html(tc)}</td>' for tc in tr.iterchildren(qn('w:tc')))
+        rows.append(f'<tr>{cells}</tr>')
+    return '<table>' + ''.join(rows) + '</table>'
+
+
+def _blocks_html(parent):
+    """HTML of the paragraphs and tables directly under `parent` (body or cell)."""
+    parts = []
+    for child in parent.iterchildren():
+        if child.tag == _W_P:
+            parts.append(_paragraph_html(child))
+        elif child.tag == _W_TBL:
+            parts.append(_table_html(child))
+    return ''.join(parts)
+
+
+def docx_to_html(docx_bytes):
+    """HTML fragment with the paragraphs and tables of a DOCX body."""
+    body = Document(BytesIO(docx_bytes)).element.body
+    return '<div class="act-preview">' + _blocks_html(body) + '</div>'
+
+
+def render_act_preview(act):
+    """
+    Preview of an unsaved `act` as {'html', 'missing_fields', 'cached'}.
+    Renders in memory only.
+    """
+    template_name = act.get_template_name()
+    context = act.get_context()
+    key = f'act-preview:{compute_artifact_key(template_name, context, renderer="preview")}'
+    preview = cache.get(key)
+    if preview is not None:
+        return dict(preview, cached=True)
+
+    buf = BytesIO()
+    generate_document(template_name, context, buf)
+    preview = {
+        'html': docx_to_html(buf.getvalue()),
+        'missing_fields': missing_placeholders(template_name, context),
+    }
+    cache.set(key, preview, getattr(settings, 'ACT_PREVIEW_CACHE_SECONDS', 300))
+    return dict(preview, cached=False)
@@ -2,29 +2,40 @@ from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 from docx.shared import Inches
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 
-def create_signature(name, role, date=None):
-    """
-    Create a signature image with name, role, and date.
-    
-    Args:
-        name (str): Name of the signer
-        role (str): Role of the signer
-        date (str): Date of signing (defaults to current date)
-    
-    Returns:
-        BytesIO: Signature image in memory buffer
-    """
-    width = 600
-    height = 200
+# Image size and font size per signature style.
+SIGNATURE_STYLES = {
+    'default': {'width': 600, 'height': 200, 'font_size': 32},
+}
+
+# Number of rendered signature PNGs kept per process.
+SIGNATURE_CACHE_SIZE = 256
+
+_signature_cache = OrderedDict()
+_signature_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_signature_font(size):
+    """The signature font at `size`, loaded once per process."""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _draw_signature(name, role, date, style):
+    spec = SIGNATURE_STYLES[style]
+    width = spec['width']
+    height = spec['height']
     image = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(image)
     
-    try:
-        font = ImageFont.truetype("arial.ttf", 32)
-    except:
-        font = ImageFont.load_default()
+    font = get_signature_font(spec['font_size'])
     
     line_y = height - 60
     draw.line([(50, line_y), (width-50, line_y)], fill='black', width=2)
@@ -32,15 +43,60 @@ def create_signature(name, role, date=None):
     draw.text((50, line_y - 40), name, fill='black', font=font)
     draw.text((50, line_y + 10), role, fill='black', font=font)
     
-    if date is None:
-        date = datetime.now().strftime("%Y-%m-%d")
     draw.text((width-150, line_y + 10), date, fill='black', font=font)
     
     img_buffer = BytesIO()
     image.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
+    return img_buffer.getvalue()
+
+
+def get_signature_png(name, role, date=None, style='default'):
+    """
+    PNG bytes of the signature for (name, role, date, style).
+
+    Rendered images are kept in a per-process LRU cache, so the same
+    signer on many documents is drawn once. Identical bytes also let
+    python-docx store the image once per DOCX package.
+    """
+    if date is None:
+        date = datetime.now().strftime("%Y-%m-%d")
+    key = (name, role, date, style)
+    with _signature_lock:
+        png = _signature_cache.get(key)
+        if png is not None:
+            _signature_cache.move_to_end(key)
+            return png
+
+    png = _draw_signature(name, role, date, style)
+
+    with _signature_lock:
+        _signature_cache[key] = png
+        _signature_cache.move_to_end(key)
+        while len(_signature_cache) > SIGNATURE_CACHE_SIZE:
+            _signature_cache.popitem(last=False)
+    return png
+
+
+def clear_signature_cache():
+    """Drop every cached signature image (mainly for tests)."""
+    with _signature_lock:
+        _signature_cache.clear()
+
+
+def create_signature(name, role, date=None, style='default'):
+    """
+    Create a signature image with name, role, and date.
     
-    return img_buffer
+    Args:
+        name (str): Name of the signer
+        role (str): Role of the signer
+        date (str): Date of signing (defaults to current date)
+        style (str): Key of SIGNATURE_STYLES
+    
+    Returns:
+        BytesIO: Signature image in memory buffer
+    """
+    return BytesIO(get_signature_png(name, role, date, style))
 
 def sign_document(doc, signatures):
     """
@@ -0,0 +1,133 @@
+import re
+from typing import Dict, List, Set, Tuple
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+TOKEN_PATTERN = re.compile(r'\{\{[^}]+\}\}|\*[123]\*')
+
+_W_P = qn('w:p')
+_W_T = qn('w:t')
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+_BREAK_PATTERN = re.compile(r'(\n|\t)')
+
+
+def build_token_lookup(enriched_context: Dict, numeric_map: Dict[str, str]) -> Dict[str, str]:
+    """
+    Map every token text to its replacement.
+
+    `{{key}}` resolves to the context value (blank values become ''), `*N*`
+    resolves to the numeric marker value when one is set. Tokens missing from
+    the lookup are handled by `resolve_token`.
+    """
+    lookup = {}
+    for key, value in enriched_context.items():
+        lookup[f'{{{{{key}}}}}'] = str(value) if value is not None and str(value).strip() else ''
+    for num, value in numeric_map.items():
+        if value:
+            lookup[f'*{num}*'] = str(value)
+    return lookup
+
+
+def resolve_token(token: str, lookup: Dict[str, str]) -> str:
+    """Unknown `{{...}}` placeholders are dropped, unset numeric markers are kept."""
+    if token in lookup:
+        return lookup[token]
+    return '' if token.startswith('{{') else token
+
+
+def _own_text_nodes(p) -> List:
+    """`w:t` elements of this paragraph, skipping paragraphs nested in text boxes."""
+    return [t for t in p.iter(_W_T) if next(t.iterancestors(_W_P), None) is p]
+
+
+def split_breaks(text: str) -> List[str]:
+    """Split text into runs of plain text and single '\\n'/'\\t' separators."""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return _BREAK_PATTERN.split(text)
+
+
+def _set_text(t, text: str):
+    """Set the text of a `w:t`, turning newlines and tabs into `w:br`/`w:tab` siblings."""
+    parts = split_breaks(text)
+    t.text = parts[0]
+    t.set(_XML_SPACE, 'preserve')
+    anchor = t
+    for part in parts[1:]:
+        if not part:
+            continue
+        if part == '\n':
+            el = OxmlElement('w:br')
+        elif part == '\t':
+            el = OxmlElement('w:tab')
+        else:
+            el = OxmlElement('w:t')
+            el.text = part
+            el.set(_XML_SPACE, 'preserve')
+        anchor.addnext(el)
+        anchor = el
+
+
+def substitute_texts(texts: List[str], lookup: Dict[str, str]) -> Tuple[List[str], Set[int]]:
+    """
+    Replace every token across the consecutive text pieces of one paragraph.
+
+    `texts` are the contents of the paragraph's text nodes in order. A token
+    split across several pieces is written into the piece where it starts and
+    removed from the following ones. Returns the new pieces and the indexes of
+    the pieces that changed.
+    """
+    full = ''.join(texts)
+    matches = list(TOKEN_PATTERN.finditer(full))
+    if not matches:
+        return list(texts), set()
+
+    offsets = []
+    pos = 0
+    for text in texts:
+        offsets.append(pos)
+        pos += len(text)
+
+    def node_at(char_pos):
+        for i in range(len(offsets) - 1, -1, -1):
+            if offsets[i] <= char_pos and (char_pos < offsets[i] + len(texts[i]) or i == len(offsets) - 1):
+                return i
+        return 0
+
+    new_texts = list(texts)
+    changed = set()
+    for match in reversed(matches):
+        start, end = match.span()
+        replacement = resolve_token(match.group(0), lookup)
+        if replacement == match.group(0):
+            continue
+        first = node_at(start)
+        last = node_at(end - 1)
+        if first == last:
+            off = offsets[first]
+            new_texts[first] = new_texts[first][:start - off] + replacement + new_texts[first][end - off:]
+        else:
+            new_texts[first] = new_texts[first][:start - offsets[first]] + replacement
+            for i in range(first + 1, last):
+                new_texts[i] = ''
+                changed.add(i)
+            new_texts[last] = new_texts[last][end - offsets[last]:]
+            changed.add(last)
+        changed.add(first)
+    return new_texts, changed
+
+
+def substitute_paragraph(p, lookup: Dict[str, str]) -> bool:
+    """
+    Replace every token in the paragraph element `p` in a single pass.
+
+    Works on the `w:t` nodes directly, so run formatting is kept.
+    Returns True when the paragraph changed.
+    """
+    nodes = _own_text_nodes(p)
+    if not nodes:
+        return False
+    new_texts, changed = substitute_texts([t.text or '' for t in nodes], lookup)
+    for i in changed:
+        _set_text(nodes[i], new_texts[i])
+    return bool(changed)
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import threading
+import logging
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Tuple, Iterator
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([^}]+)\}\}')
+NUMERIC_MARKER_PATTERN = re.compile(r'\*([123])\*')
+
+_W_P = qn('w:p')
+_W_TC = qn('w:tc')
+
+
+@dataclass
+class Slot:
+    """A paragraph of the template that contains something to fill in."""
+    index: int
+    location: str
+    keys: Tuple[str, ...] = ()
+    markers: Tuple[str, ...] = ()
+
+
+@dataclass
+class CompiledTemplate:
+    """
+    A DOCX template parsed once per process.
+
+    Holds the raw template bytes (so renders do not touch the disk) and the
+    position of every paragraph carrying a `{{placeholder}}` or a `*1*`/`*2*`/`*3*`
+    numeric marker. `index` is the position of the paragraph among all `w:p`
+    elements of the document body in document order.
+    """
+    path: str
+    sha256: str
+    mtime_ns: int
+    size: int
+    data: bytes
+    slots: List[Slot] = field(default_factory=list)
+
+    @property
+    def keys(self) -> List[str]:
+        """All distinct placeholder names, in order of first appearance."""
+        seen: Dict[str, None] = {}
+        for slot in self.slots:
+            for key in slot.keys:
+                seen.setdefault(key, None)
+        return list(seen)
+
+    @property
+    def markers(self) -> List[str]:
+        """All distinct numeric markers, in order of first appearance."""
+        seen: Dict[str, None] = {}
+        for slot in self.slots:
+            for marker in slot.markers:
+                seen.setdefault(marker, None)
+        return list(seen)
+
+    def inventory(self) -> Dict:
+        """JSON-ready summary of the placeholders, markers and where they occur."""
+        return {
+            'sha256': self.sha256,
+            'keys': self.keys,
+            'markers': self.markers,
+            'slots': [
+                {'index': s.index, 'location': s.location, 'keys': list(s.keys), 'markers': list(s.markers)}
+                for s in self.slots
+            ],
+        }
+
+    def load(self):
+        """Return a fresh python-docx Document built from the cached bytes."""
+        return Document(BytesIO(self.data))
+
+    def iter_slots(self, doc) -> Iterator[Tuple[Slot, Paragraph]]:
+        """Yield (slot, paragraph) pairs for a document produced by `load()`."""
+        elements = list(doc.element.body.iter(_W_P))
+        for slot in self.slots:
+            yield slot, Paragraph(elements[slot.index], doc._body)
+
+
+def _compile(path: str, data: bytes, sha256: str, mtime_ns: int, size: int) -> CompiledTemplate:
+    doc = Document(BytesIO(data))
+    slots: List[Slot] = []
+    for index, p in enumerate(doc.element.body.iter(_W_P)):
+        text = Paragraph(p, doc._body).text
+        if '{{' not in text and '*' not in text:
+            continue
+        keys = tuple(dict.fromkeys(m.group(1) for m in PLACEHOLDER_PATTERN.finditer(text)))
+        markers = tuple(dict.fromkeys(m.group(1) for m in NUMERIC_MARKER_PATTERN.finditer(text)))
+        if not keys and not markers:
+            continue
+        in_table = any(True for _ in p.iterancestors(_W_TC))
+        slots.append(Slot(index=index, location='table' if in_table else 'body', keys=keys, markers=markers))
+    return CompiledTemplate(path=path, sha256=sha256, mtime_ns=mtime_ns, size=size, data=data, slots=slots)
+
+
+def compile_template_bytes(data: bytes, path: str = '') -> CompiledTemplate:
+    """Compile template contents that are not on the local disk (e.g. a fresh upload); not cached."""
+    return _compile(path, data, hashlib.sha256(data).hexdigest(), 0, len(data))
+
+
+_cache: Dict[str, CompiledTemplate] = {}
+_lock = threading.Lock()
+
+
+def get_compiled_template(path: str) -> CompiledTemplate:
+    """
+    Return the compiled form of the template at `path`.
+
+    The result is cached per process. A cached entry is reused while the file's
+    mtime and size are unchanged; otherwise the file is re-read and only
+    recompiled if its SHA-256 differs from the cached one.
+    """
+    stat = os.stat(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached.sha256 == sha256:
+            cached.mtime_ns = stat.st_mtime_ns
+            cached.size = stat.st_size
+            return cached
+        compiled = _compile(path, data, sha256, stat.st_mtime_ns, stat.st_size)
+        _cache[path] = compiled
+        logger.info(f'Compiled template {path}: {len(compiled.slots)} slots, {len(compiled.keys)} keys')
+        return compiled
+
+
+def clear_template_cache():
+    """Drop every compiled template (mainly for tests)."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,112 @@
+"""
+Per-stage wall-time and output-size recording for document generation.
+
+A caller opens `collect_timings()` around a render; code further down the
+call stack wraps its steps in `stage(name)` and reports output sizes with
+`record_size(name, data)`. Both are no-ops when nothing is collecting, so
+the rendering helpers can be instrumented unconditionally.
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+_current = contextvars.ContextVar('generation_timings', default=None)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StageTimings:
+    """Milliseconds per stage and bytes per output collected for one render."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.offset_ms = 0.0
+        self.total_ms: Optional[float] = None
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def merge(self, data: Optional[Dict]):
+        """Add the stages, sizes and total of `data` (from `as_dict`, e.g. a pool worker)."""
+        if not data:
+            return
+        for name, ms in data.get('stages', {}).items():
+            self.add(name, ms)
+        self.sizes.update(data.get('sizes', {}))
+        self.offset_ms += data.get('total_ms') or 0.0
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000 + self.offset_ms
+        return self
+
+    def as_dict(self):
+        return {
+            'stages': {name: round(ms, 2) for name, ms in self.stages.items()},
+            'sizes': dict(self.sizes),
+            'total_ms': self.total_ms,
+        }
+
+
+def current_timings() -> Optional[StageTimings]:
+    return _current.get()
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect stage timings for the enclosed block. Nested calls share the
+    outer collector, so the outermost caller sees every stage.
+    """
+    timings = _current.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        timings.finish()
+
+
+@contextmanager
+def stage(name: str):
+    """Add the wall time of the enclosed block to stage `name`."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+def record_size(name: str, data) -> None:
+    """Record the size of output `name`; `data` is bytes or a byte count."""
+    timings = _current.get()
+    if timings is not None and data is not None:
+        timings.sizes[name] = data if isinstance(data, int) else len(data)
+
+
+def percentile(values, p):
+    """Linearly interpolated `p`th percentile of sorted `values`."""
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 2)
+
+
+def summarize(values):
+    """p50/p90/p95/p99 and max of `values`."""
+    values = sorted(values)
+    summary = {f'p{p}': percentile(values, p) for p in PERCENTILES}
+    summary['max'] = round(values[-1], 2) if values else None
+    return summary
@@ -6,10 +6,12 @@ from .project import (
 )
 from .document import DocumentViewSet, generate_document_view, upload_document_view
 from .act import ActViewSet
+from .generation import GenerationJobViewSet, GenerationMetricViewSet
 from .activity import ActivityLogViewSet, upcoming_tasks_view, UserViewSet
 from .features import (
     ProjectBudgetViewSet,
     BudgetExpenseViewSet,
+    CurrencyRateViewSet,
     DocumentTemplateViewSet,
     TextSnippetViewSet,
     WeatherLogViewSet,
@@ -28,11 +30,14 @@ __all__ = [
     'generate_document_view',
     'upload_document_view',
     'ActViewSet',
+    'GenerationJobViewSet',
+    'GenerationMetricViewSet',
     'ActivityLogViewSet',
     'UserViewSet',
     'upcoming_tasks_view',
     'ProjectBudgetViewSet',
     'BudgetExpenseViewSet',
+    'CurrencyRateViewSet',
     'DocumentTemplateViewSet',
     'TextSnippetViewSet',
     'WeatherLogViewSet',
@@ -1,9 +1,11 @@
+import os
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from ..serializers import ActSerializer
-from ..models import Act
+from ..serializers import ActSerializer, GenerationJobSerializer
+from ..models import Act, GenerationJob
+from .generation import wants_async
 
 
 class ActViewSet(viewsets.ModelViewSet):
@@ -30,12 +32,10 @@ class ActViewSet(viewsets.ModelViewSet):
         """
         Generate act with DOCX and PDF outputs.
         Expects: project, act_type, act_date, and all relevant fields.
+        With `async=1` (query string or body) the act is queued for the
+        generation worker and a 202 with the job is returned instead.
         """
-        from django.core.files import File
-        from django.conf import settings
-        import os
-        from ..utils.document_generator import generate_document
-        from ..utils.pdf_export import convert_to_pdf
+        from ..utils.generation import render_act
         from ..utils.activity_logger import log_act_created
         import logging
         
@@ -43,34 +43,15 @@ class ActViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        act = serializer.save(created_by=request.user if self.request.user.is_authenticated else None)
+        user = request.user if request.user.is_authenticated else None
+        act = serializer.save(created_by=user)
+        
+        if wants_async(request):
+            job = GenerationJob.objects.create(kind='act', act=act, created_by=user)
+            return Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
         
         try:
-            context = act.get_context()
-            template_name = act.get_template_name()
-            
-            docx_filename = f'{act.act_type}_{act.id}.docx'
-            pdf_filename = f'{act.act_type}_{act.id}.pdf'
-            doc_dir = os.path.join(settings.MEDIA_ROOT, 'acts',
-                                   str(act.created_at.year),
-                                   str(act.created_at.month).zfill(2),
-                                   str(act.created_at.day).zfill(2))
-            
-            docx_path = os.path.join(doc_dir, docx_filename)
-            pdf_path = os.path.join(doc_dir, pdf_filename)
-            
-            os.makedirs(doc_dir, exist_ok=True)
-            
-            logger.info(f'Generating act {act.act_type} #{act.id} with template {template_name}')
-            generate_document(template_name, context, docx_path)
-            
-            logger.info(f'Converting {docx_path} to PDF')
-            convert_to_pdf(docx_path, pdf_path)
-            
-            with open(docx_path, 'rb') as f:
-                act.docx_file.save(docx_filename, File(f), save=False)
-            with open(pdf_path, 'rb') as f:
-                act.pdf_file.save(pdf_filename, File(f), save=True)
+            render_act(act)
             
             # Log activity
             if request.user.is_authenticated:
@@ -83,3 +64,132 @@ class ActViewSet(viewsets.ModelViewSet):
             logger.error(f'Act generation failed: {str(e)}')
             act.delete()
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['post'])
+    def generate_batch(self, request):
+        """
+        Generate many acts for one project in a single request.
+        Expects: {"project": id, "acts": [{act fields}, ...]}; `project` may
+        also be given per act, but all acts must share it. Rendering is spread
+        over a process pool and one ZIP with every DOCX/PDF is returned.
+        """
+        from django.core.files.storage import default_storage
+        from django.db import connection, transaction
+        from ..utils.generation import render_acts_batch, build_batch_zip
+        from ..utils.activity_logger import log_act_created
+        
+        items = request.data if isinstance(request.data, list) else request.data.get('acts')
+        if not items or not isinstance(items, list):
+            return Response({'error': 'acts must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(item, dict) for item in items):
+            return Response({'error': 'Every entry in acts must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        shared_project = None if isinstance(request.data, list) else request.data.get('project')
+        if shared_project:
+            items = [dict(item, project=item.get('project', shared_project)) for item in items]
+        
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        projects = {data['project'].id for data in serializer.validated_data}
+        if len(projects) != 1:
+            return Response({'error': 'All acts in a batch must belong to the same project'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user if request.user.is_authenticated else None
+        acts = [Act(created_by=user, **data) for data in serializer.validated_data]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                acts = Act.objects.bulk_create(acts)
+            else:
+                for act in acts:
+                    act.save()
+        
+        results = render_acts_batch(acts)
+        
+        done = [(act, bundle) for act, error, bundle in results if error is None]
+        payload = []
+        for index, (act, error, bundle) in enumerate(results):
+            if error is None:
+                if user:
+                    log_act_created(act, user, request)
+                payload.append({'index': index, 'status': 'done',
+                                'act': self.get_serializer(act, context={'request': request}).data})
+            else:
+                payload.append({'index': index, 'status': 'failed', 'error': str(error)})
+        
+        zip_url = None
+        if done:
+            zip_name = build_batch_zip(done[0][0].project, done)
+            zip_url = request.build_absolute_uri(default_storage.url(zip_name))
+        
+        return Response({'results': payload, 'zip_url': zip_url},
+                        status=status.HTTP_201_CREATED if done else status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['post'])
+    def preview(self, request):
+        """
+        Render the act described by the payload (same fields as `generate`)
+        as an HTML fragment, without saving the act or any file.
+        Returns {'html', 'missing_fields', 'cached'}.
+        """
+        from ..utils.preview import render_act_preview
+        import logging
+
+        logger = logging.getLogger(__name__)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        act = Act(**serializer.validated_data)
+
+        try:
+            return Response(render_act_preview(act))
+        except Exception as e:
+            logger.error(f'Act preview failed: {str(e)}')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=True, methods=['post'])
+    def regenerate(self, request, pk=None):
+        """
+        Update the act's files after its fields changed. Fields sent in the
+        body are applied first (like PATCH); only the outputs whose inputs
+        changed are rendered again. Returns the act and the rebuilt outputs.
+        """
+        from ..utils.generation import regenerate_act
+        import logging
+
+        logger = logging.getLogger(__name__)
+
+        act = self.get_object()
+        if request.data:
+            serializer = self.get_serializer(act, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            act = serializer.save()
+
+        try:
+            rebuilt = regenerate_act(act)
+        except Exception as e:
+            logger.error(f'Act regeneration failed for #{act.id}: {str(e)}')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        data = self.get_serializer(act, context={'request': request}).data
+        return Response({'act': data, 'rebuilt': rebuilt})
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download one of the act's files: ?file=docx|pdf|zip (default pdf).
+        The DOCX and ZIP of natively rendered acts are produced on first request.
+        """
+        from django.http import FileResponse
+        from ..utils.generation import ensure_act_docx
+        
+        act = self.get_object()
+        kind = request.query_params.get('file', 'pdf')
+        if kind not in ('docx', 'pdf', 'zip'):
+            return Response({'error': 'file must be docx, pdf or zip'}, status=status.HTTP_400_BAD_REQUEST)
+        if not act.pdf_file:
+            return Response({'error': 'Act has not been generated'}, status=status.HTTP_404_NOT_FOUND)
+        if kind != 'pdf':
+            ensure_act_docx(act)
+        
+        field = {'docx': act.docx_file, 'pdf': act.pdf_file, 'zip': act.zip_file}[kind]
+        return FileResponse(field.open('rb'), as_attachment=True, filename=os.path.basename(field.name))
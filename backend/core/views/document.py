@@ -3,13 +3,15 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.conf import settings
-from ..models import Document
-from ..serializers import DocumentSerializer
-from ..utils.document_generator import generate_document, ensure_templates_dir, get_template_path
+from ..models import Document, GenerationJob
+from ..serializers import DocumentSerializer, GenerationJobSerializer
+from ..utils.document_generator import generate_document, ensure_templates_dir, get_template_path, missing_placeholders
+from ..utils.generation import render_generated_document
 from ..utils.pdf_overlay import fill_pdf_template
 import json
 from ..utils.pdf_export import convert_to_pdf
 from ..permissions import IsEmployeeOrAdmin
+from .generation import wants_async
 
 class DocumentViewSet(viewsets.ModelViewSet):
     queryset = Document.objects.all()
@@ -27,27 +29,38 @@ def generate_document_view(request):
     if not template_name:
         return Response({'error': 'template_name is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    doc_name, ext = os.path.splitext(template_name)
-    generated_dir = os.path.join(settings.MEDIA_ROOT, 'generated')
-    os.makedirs(generated_dir, exist_ok=True)
+    # With `strict`, refuse contexts that would leave template placeholders blank
+    if str(request.data.get('strict')).lower() in ('1', 'true', 'yes') and os.path.exists(get_template_path(template_name)):
+        missing = missing_placeholders(template_name, context)
+        if missing:
+            return Response({'error': 'Missing template fields', 'missing_fields': missing},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-    request_host = request.get_host()
-    scheme = 'https' if request.is_secure() else 'http'
-    base_url = f'{scheme}://{request_host}'
+    doc_name, ext = os.path.splitext(template_name)
+    doc_title = context.get('project_name', doc_name)
 
-    docx_filename = f'{doc_name}.docx'
-    docx_path = os.path.join(generated_dir, docx_filename)
+    if wants_async(request):
+        if not os.path.exists(get_template_path(template_name)):
+            return Response({'error': f'Template {template_name} not found'}, status=status.HTTP_400_BAD_REQUEST)
+        document = Document.objects.create(title=f"{doc_title} - {doc_name}")
+        job = GenerationJob.objects.create(
+            kind='document',
+            document=document,
+            payload={'template_name': template_name, 'context': context},
+            created_by=request.user,
+        )
+        return Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
+    document = Document.objects.create(title=f"{doc_title} - {doc_name}")
     try:
-        generate_document(template_name, context, docx_path)
+        render_generated_document(document, template_name, context)
     except Exception as e:
+        document.delete()
         return Response({'error': f'DOCX generation failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    doc_title = context.get('project_name', doc_name)
-    document = Document.objects.create(
-        title=f"{doc_title} - {doc_name}",
-        file_docx=f'generated/{docx_filename}'
-    )
+    request_host = request.get_host()
+    scheme = 'https' if request.is_secure() else 'http'
+    base_url = f'{scheme}://{request_host}'
 
     abs_docx = f'{base_url}{settings.MEDIA_URL}{document.file_docx}'
 
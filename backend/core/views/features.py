@@ -1,17 +1,20 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q, Avg
-from decimal import Decimal
+from django.db.models import Sum, Count, Q, Avg, Value
 from django.utils import timezone
 from datetime import timedelta
 from core.models import (
-    ProjectBudget, BudgetExpense, DocumentTemplate, TextSnippet,
-    WeatherLog, Reminder, Project, Task, Act
+    ProjectBudget, BudgetExpense, CurrencyRate, DocumentTemplate, TextSnippet,
+    WeatherLog, Reminder, Project, Act
 )
+from core.models.budget import converted_rollup_total, is_last_rate_in_use
+from core.models.currency import missing_rates
+from core.permissions import IsAdminOrReadOnly
 from core.serializers import (
-    ProjectBudgetSerializer, BudgetExpenseSerializer,
+    ProjectBudgetSerializer, BudgetExpenseSerializer, CurrencyRateSerializer,
     DocumentTemplateSerializer, TextSnippetSerializer,
     WeatherLogSerializer, ReminderSerializer
 )
@@ -24,7 +27,7 @@ class ProjectBudgetViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        queryset = ProjectBudget.objects.all()
+        queryset = ProjectBudget.objects.with_totals().prefetch_related('expenses__created_by')
         project_id = self.request.query_params.get('project')
         if project_id:
             queryset = queryset.filter(project_id=project_id)
@@ -35,31 +38,19 @@ class ProjectBudgetViewSet(viewsets.ModelViewSet):
         """Get budget summary with category breakdown"""
         budget = self.get_object()
         
-        # Category breakdown with currency conversion into budget currency
-        rate = Decimal('1.96')  # 1 EUR = 1.96 BGN
-        cat_totals = {}
-        for exp in budget.expenses.all():
-            amt = Decimal(exp.amount)
-            # convert to budget currency
-            if exp.expense_currency == budget.currency:
-                conv = amt
-            else:
-                if budget.currency == 'BGN' and exp.expense_currency == 'EUR':
-                    conv = amt * rate
-                elif budget.currency == 'EUR' and exp.expense_currency == 'BGN':
-                    conv = amt / rate
-                else:
-                    conv = amt
-            entry = cat_totals.get(exp.category, {'category': exp.category, 'total': Decimal('0'), 'count': 0})
-            entry['total'] += conv
-            entry['count'] += 1
-            cat_totals[exp.category] = entry
+        # Category breakdown with currency conversion into budget currency;
+        # amounts in currencies without a rate are left out and reported
+        cat_totals = budget.rollups.values('category').annotate(
+            total=Sum(converted_rollup_total(Value(budget.currency))),
+            count=Sum('count'),
+        ).filter(total__isnull=False)
+        currencies = set(budget.rollups.values_list('currency', flat=True)) | {budget.currency}
         category_breakdown = sorted([
             {
-                'category': k,
-                'total': float(v['total']),
-                'count': v['count']
-            } for k, v in cat_totals.items()
+                'category': row['category'],
+                'total': float(row['total']),
+                'count': row['count']
+            } for row in cat_totals
         ], key=lambda x: x['total'], reverse=True)
         
         return Response({
@@ -69,7 +60,8 @@ class ProjectBudgetViewSet(viewsets.ModelViewSet):
             'usage_percentage': budget.budget_usage_percentage,
             'is_over_budget': budget.is_over_budget,
             'category_breakdown': category_breakdown,
-            'currency': budget.currency
+            'currency': budget.currency,
+            'missing_rates': missing_rates(currencies)
         })
 
 
@@ -98,6 +90,28 @@ class BudgetExpenseViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
+class CurrencyRateViewSet(viewsets.ModelViewSet):
+    """Dated exchange rates used for budget conversions; editable by admins"""
+    queryset = CurrencyRate.objects.all()
+    serializer_class = CurrencyRateSerializer
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    
+    def get_queryset(self):
+        queryset = CurrencyRate.objects.all()
+        currency = self.request.query_params.get('currency')
+        if currency:
+            queryset = queryset.filter(currency=currency.upper())
+        return queryset
+
+    def perform_destroy(self, instance):
+        # amounts in a currency without any rate would drop out of every total
+        if is_last_rate_in_use(instance):
+            raise ValidationError({'currency': (
+                f'Това е последният курс на {instance.currency}, а валутата се използва от бюджети или разходи'
+            )})
+        instance.delete()
+
+
 class DocumentTemplateViewSet(viewsets.ModelViewSet):
     """Document template management"""
     queryset = DocumentTemplate.objects.filter(is_active=True)
@@ -113,6 +127,27 @@ class DocumentTemplateViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def fields(self, request, pk=None):
+        """Placeholder inventory of the template file, computed when it was uploaded"""
+        template = self.get_object()
+        if template.placeholders_stale():
+            template.refresh_placeholders()
+        return Response(template.placeholders)
+    
+    @action(detail=False, methods=['get'], url_path='file-fields')
+    def file_fields(self, request):
+        """Placeholder inventory of a built-in template in media/templates: ?name=act14_bg.docx"""
+        import os
+        from ..utils.document_generator import get_template_path
+        from ..utils.template_cache import get_compiled_template
+        
+        name = os.path.basename(request.query_params.get('name', ''))
+        path = get_template_path(name)
+        if not name.endswith('.docx') or not os.path.exists(path):
+            return Response({'error': f'Template {name} not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(dict(get_compiled_template(path).inventory(), file=name))
 
 
 class TextSnippetViewSet(viewsets.ModelViewSet):
@@ -222,95 +257,13 @@ class ReminderViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def analytics_dashboard_view(request):
-    """Get analytics data for dashboard"""
-    
-    # Project stats
-    total_projects = Project.objects.count()
-    active_projects = Project.objects.filter(
-        Q(end_date__isnull=True) | Q(end_date__gte=timezone.now().date())
-    ).count()
-    
-    # Task stats
-    total_tasks = Task.objects.count()
-    completed_tasks = Task.objects.filter(status='completed').count()
-    overdue_tasks = Task.objects.filter(
-        status__in=['pending', 'in_progress'],
-        due_date__lt=timezone.now().date()
-    ).count()
-    
-    # Budget stats
-    budgets = ProjectBudget.objects.all()
-    rate = Decimal('1.96')
-    # Normalize analytics to BGN
-    total_budget = Decimal('0')
-    for b in budgets:
-        ib = Decimal(b.initial_budget)
-        if b.currency == 'EUR':
-            total_budget += (ib * rate)
-        else:
-            total_budget += ib
-    # Sum all expenses converted to BGN based on their own currency
-    total_spent = Decimal('0')
-    for e in BudgetExpense.objects.all():
-        amt = Decimal(e.amount)
-        if e.expense_currency == 'EUR':
-            total_spent += (amt * rate)
-        else:
-            total_spent += amt
-    over_budget_count = sum(1 for b in budgets if b.is_over_budget)
-    
-    # Recent activity
-    recent_projects = Project.objects.order_by('-created_at')[:5].values(
-        'id', 'name', 'created_at', 'end_date'
-    )
-    
-    # Top expense categories by project
-    # Group expenses by project and category
-    project_expenses = {}
-    for e in BudgetExpense.objects.select_related('budget__project').all():
-        amt = Decimal(e.amount)
-        amt_bgn = (amt * rate) if e.expense_currency == 'EUR' else amt
-        project_name = e.budget.project.name
-        key = (project_name, e.category)
-        if key not in project_expenses:
-            project_expenses[key] = {
-                'project': project_name,
-                'category': e.category,
-                'total': Decimal('0')
-            }
-        project_expenses[key]['total'] += amt_bgn
-    
-    top_categories = sorted(
-        (
-            {'project': v['project'], 'category': v['category'], 'total': float(v['total'])}
-            for v in project_expenses.values()
-        ),
-        key=lambda x: x['total'],
-        reverse=True
-    )[:10]
-    
-    return Response({
-        'projects': {
-            'total': total_projects,
-            'active': active_projects,
-            'recent': list(recent_projects)
-        },
-        'tasks': {
-            'total': total_tasks,
-            'completed': completed_tasks,
-            'overdue': overdue_tasks,
-            'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        },
-        'budget': {
-            'total_budget': float(total_budget),
-            'total_spent': float(total_spent),
-            'remaining': float(total_budget - total_spent),
-            'over_budget_projects': over_budget_count,
-            # normalized to BGN
-            'currency': 'BGN'
-        },
-        'top_expense_categories': list(top_categories)
-    })
+    """
+    Get analytics data for dashboard from the precomputed snapshot (see
+    core.utils.dashboard); admins can bypass it with ?fresh=1
+    """
+    from core.utils.dashboard import get_dashboard
+    fresh = str(request.query_params.get('fresh')).lower() in ('1', 'true', 'yes') and request.user.is_staff
+    return Response(get_dashboard(fresh=fresh))
 
 
 @api_view(['POST'])
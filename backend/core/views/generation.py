@@ -0,0 +1,83 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from core.models import GenerationJob, GenerationMetric
+from core.serializers import GenerationJobSerializer, GenerationMetricSerializer
+from core.utils.timing import summarize
+
+
+def wants_async(request):
+    """True when the client asked for queued generation via `async`."""
+    value = request.query_params.get('async', request.data.get('async'))
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+class GenerationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of queued act/document generation jobs, for polling."""
+    serializer_class = GenerationJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = GenerationJob.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset.order_by('-created_at')
+
+
+class GenerationMetricViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Per-stage timings of act/document generation (admin only).
+    Filters: ?template=, ?kind=act|document, ?days= (default 30),
+    ?include_reused=1 to count renders served from stored artifacts.
+    """
+    serializer_class = GenerationMetricSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            days = int(params.get('days', 30))
+        except ValueError:
+            days = 30
+        queryset = GenerationMetric.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        if params.get('template'):
+            queryset = queryset.filter(template_name=params['template'])
+        if params.get('kind'):
+            queryset = queryset.filter(kind=params['kind'])
+        if str(params.get('include_reused')).lower() not in ('1', 'true', 'yes'):
+            queryset = queryset.filter(reused=False)
+        return queryset.order_by('-created_at')
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Percentiles (p50/p90/p95/p99/max, in ms) of the total and of every
+        stage, and of output sizes in bytes, per template and renderer.
+        """
+        groups = {}
+        for metric in self.get_queryset().values_list('template_name', 'renderer', 'total_ms', 'stages', 'sizes'):
+            template_name, renderer, total_ms, stages, sizes = metric
+            group = groups.setdefault((template_name, renderer), {'total': [], 'stages': {}, 'sizes': {}})
+            group['total'].append(total_ms)
+            for name, ms in (stages or {}).items():
+                group['stages'].setdefault(name, []).append(ms)
+            for name, size in (sizes or {}).items():
+                group['sizes'].setdefault(name, []).append(size)
+
+        results = []
+        for (template_name, renderer), group in sorted(groups.items()):
+            results.append({
+                'template_name': template_name,
+                'renderer': renderer,
+                'count': len(group['total']),
+                'total_ms': summarize(group['total']),
+                'stages': {name: summarize(values) for name, values in sorted(group['stages'].items())},
+                'sizes': {name: summarize(values) for name, values in sorted(group['sizes'].items())},
+            })
+        return Response({'results': results})